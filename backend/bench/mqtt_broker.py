@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Minimal MQTT 3.1.1 broker stand-in for offline benchmarking.
+Handles CONNECT, PUBLISH (QoS 0/1/2), SUBSCRIBE, UNSUBSCRIBE, PINGREQ and
+DISCONNECT and counts the traffic it sees. Subscribers receive QoS 0 copies.
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """Match an MQTT topic against a subscription filter with + and # wildcards"""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[i]:
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def encode_length(length: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+class MqttBroker:
+    """Single-process broker that keeps subscriptions in memory"""
+
+    def __init__(self):
+        self.subscriptions: Dict[asyncio.StreamWriter, Set[str]] = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.stats = {'connections': 0, 'publishes': 0, 'bytes_in': 0, 'forwarded': 0}
+        self.topic_counts: Dict[str, int] = {}
+        self.topic_bytes: Dict[str, int] = {}
+
+    async def start(self, host: str = '127.0.0.1', port: int = 1883):
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        logger.info(f"MQTT broker stand-in listening on {host}:{port}")
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in list(self.subscriptions):
+            writer.close()
+
+    async def read_packet(self, reader: asyncio.StreamReader):
+        header = await reader.readexactly(1)
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b''
+        self.stats['bytes_in'] += 2 + length
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.stats['connections'] += 1
+        self.subscriptions[writer] = set()
+        try:
+            while True:
+                packet_type, flags, body = await self.read_packet(reader)
+
+                if packet_type == CONNECT:
+                    writer.write(bytes([CONNACK << 4, 2, 0, 0]))
+
+                elif packet_type == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    topic_len = int.from_bytes(body[0:2], 'big')
+                    topic = body[2:2 + topic_len].decode('utf-8', 'replace')
+                    offset = 2 + topic_len
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        ack = PUBACK if qos == 1 else PUBREC
+                        writer.write(bytes([ack << 4, 2]) + packet_id)
+                    self.stats['publishes'] += 1
+                    self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+                    self.topic_bytes[topic] = self.topic_bytes.get(topic, 0) + len(body) - offset
+                    self.forward(topic, body[offset:])
+
+                elif packet_type == PUBREL:
+                    writer.write(bytes([PUBCOMP << 4, 2]) + body[0:2])
+
+                elif packet_type == SUBSCRIBE:
+                    packet_id, offset, granted = body[0:2], 2, bytearray()
+                    while offset < len(body):
+                        topic_len = int.from_bytes(body[offset:offset + 2], 'big')
+                        pattern = body[offset + 2:offset + 2 + topic_len].decode('utf-8', 'replace')
+                        offset += 2 + topic_len + 1
+                        self.subscriptions[writer].add(pattern)
+                        granted.append(0)
+                    writer.write(bytes([SUBACK << 4]) + encode_length(2 + len(granted)) + packet_id + bytes(granted))
+
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id, offset = body[0:2], 2
+                    while offset < len(body):
+                        topic_len = int.from_bytes(body[offset:offset + 2], 'big')
+                        self.subscriptions[writer].discard(body[offset + 2:offset + 2 + topic_len].decode())
+                        offset += 2 + topic_len
+                    writer.write(bytes([UNSUBACK << 4, 2]) + packet_id)
+
+                elif packet_type == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+
+                elif packet_type == DISCONNECT:
+                    break
+
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self.subscriptions.pop(writer, None)
+            writer.close()
+
+    def forward(self, topic: str, payload: bytes):
+        """Deliver a message to every matching subscriber at QoS 0"""
+        packet = None
+        for writer, patterns in self.subscriptions.items():
+            if any(topic_matches(p, topic) for p in patterns):
+                if packet is None:
+                    encoded = topic.encode()
+                    variable = len(encoded).to_bytes(2, 'big') + encoded + payload
+                    packet = bytes([PUBLISH << 4]) + encode_length(len(variable)) + variable
+                writer.write(packet)
+                self.stats['forwarded'] += 1
+
+    def snapshot(self) -> Dict:
+        return {'stats': dict(self.stats), 'topics': dict(self.topic_counts), 'topic_bytes': dict(self.topic_bytes)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the MQTT broker stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    broker = MqttBroker()
+    await broker.start(args.host, args.port)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Offline replay benchmark.
+
+Replays a session recording (see RECORD_SESSION / bench.run --record-dir)
+through the backend's ingest pipeline in-process, without hardware or a
+broker, and reports replay throughput and the alarms the recording raised.
+HTR-A/HTR-B are pointed at the first two sensors found in the recording.
+
+Run from the backend directory:
+    python -m bench.replay /tmp/iot-recordings/session-20250101-120000.iotrec --speed max
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from src.recorder import IOLINK, read_session  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def recorded_sensors(path: str, limit: int = 2) -> List[str]:
+    """First distinct sensor keys (ip:port) in a recording"""
+    keys: List[str] = []
+    for _, kind, fields in read_session(path):
+        if kind == IOLINK and fields[0] not in keys:
+            keys.append(fields[0])
+            if len(keys) == limit:
+                break
+    return keys
+
+
+async def replay(args) -> Dict:
+    path = os.path.abspath(args.recording)
+    sensors = recorded_sensors(path)
+    if not sensors:
+        raise SystemExit(f"No IO-Link readings in {path}")
+    for prefix, key in zip(('HTR_A', 'HTR_B'), sensors + sensors[:1]):
+        ip, port = key.rsplit(':', 1)
+        os.environ[f'{prefix}_IP'], os.environ[f'{prefix}_TEMP_PORT'] = ip, port
+    os.environ['RECORDER_DIR'] = os.path.dirname(path)
+    os.environ['MQTT_HOST'] = '127.0.0.1'
+    os.environ['MQTT_PORT'] = str(args.mqtt_port)
+    os.environ.setdefault('HISTORY_ENABLED', 'false')
+
+    from src import main as backend
+    logging.getLogger(backend.__name__).setLevel(args.backend_log_level)
+    started = time.perf_counter()
+    await backend.replay_recording(path, backend.parse_speed(args.speed))
+    elapsed = time.perf_counter() - started
+    progress = dict(backend.replay_progress or {})
+    return {
+        'recording': os.path.basename(path),
+        'sensors': sensors,
+        'speed': args.speed,
+        'elapsed_s': round(elapsed, 3),
+        'replay': progress,
+        'alarms': progress.get('alarm_transitions'),
+        'alarms_active': progress.get('alarms_active'),
+    }
+
+
+def print_report(report: Dict):
+    progress = report['replay']
+    print("=" * 60)
+    print("⏪ SESSION REPLAY")
+    print("=" * 60)
+    speed = 'full speed' if report['speed'] == 'max' else f"{report['speed']}x"
+    print(f"{report['recording']} at {speed}, sensors {', '.join(report['sensors'])}")
+    print(f"records : {progress.get('records')} ({progress.get('recorded_seconds')}s recorded) in "
+          f"{report['elapsed_s']}s, {progress.get('records_per_second')} records/s")
+    print(f"kinds   : iolink {progress.get('iolink')}, errors {progress.get('iolink_error')}, "
+          f"events {progress.get('event')}, mqtt {progress.get('mqtt')}, commands {progress.get('command')}")
+    print(f"alarms  : {report['alarms']} transitions, {report['alarms_active']} active at the end")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a session recording through the backend pipeline")
+    parser.add_argument('recording')
+    parser.add_argument('--speed', default='max', help="1, 100, ... or max")
+    parser.add_argument('--mqtt-port', type=int, default=18831, help="broker port (nothing needs to listen)")
+    parser.add_argument('--backend-log-level', default='WARNING')
+    parser.add_argument('--json', help="write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(replay(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Backend load benchmark.
+
+Starts N simulated IO-Link masters (M ports each) and an MQTT broker
+stand-in in a child process, runs the backend in-process under uvicorn and
+drives poll_temperature, the IO-Link relay endpoints and /ws with K clients.
+Reports throughput, p50/p99 latency and memory.
+
+Run from the backend directory:
+    python -m bench.run --masters 4 --ports 8 --clients 50 --duration 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import aiohttp
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from bench.mqtt_broker import MqttBroker  # noqa: E402
+from bench.sim_master import start_masters  # noqa: E402
+from bench.thermal import ThermalPlant  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty sample"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict:
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'max_ms': round(max(samples), 3) if samples else 0.0,
+    }
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+# Simulator process ---------------------------------------------------------
+
+def simulator_process(conn, args_dict: Dict):
+    """Child process entry point hosting the masters and the broker"""
+    async def serve():
+        broker = MqttBroker()
+        await broker.start('127.0.0.1', args_dict['mqtt_port'])
+        plant = ThermalPlant(args_dict['masters'], time_scale=args_dict['time_scale'], seed=args_dict['seed']) \
+            if args_dict['thermal'] else None
+        masters = await start_masters(
+            args_dict['masters'], args_dict['base_port'],
+            ports=args_dict['ports'], latency_ms=args_dict['latency_ms'],
+            jitter_ms=args_dict['jitter_ms'], fault_rate=args_dict['fault_rate'],
+            timeout_rate=args_dict['timeout_rate'], seed=args_dict['seed'], plant=plant,
+        )
+        if plant is not None:
+            plant.start()
+        conn.send('ready')
+
+        loop = asyncio.get_running_loop()
+        while True:
+            command = await loop.run_in_executor(None, conn.recv)
+            if command == 'stats':
+                conn.send({
+                    'masters': [m.snapshot() for m, _ in masters],
+                    'broker': broker.snapshot(),
+                    'plant': plant.snapshot() if plant is not None else None,
+                })
+            elif command == 'stop':
+                if plant is not None:
+                    await plant.stop()
+                for master, runner in masters:
+                    await master.close()
+                    await runner.cleanup()
+                await broker.stop()
+                conn.send('stopped')
+                return
+
+    asyncio.run(serve())
+
+
+class Simulators:
+    """Handle on the simulator child process"""
+
+    def __init__(self, args):
+        self.parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=simulator_process, args=(child, vars(args)), daemon=True)
+
+    def start(self):
+        self.process.start()
+        if self.parent.recv() != 'ready':
+            raise RuntimeError("Simulator process failed to start")
+
+    def stats(self) -> Dict:
+        self.parent.send('stats')
+        return self.parent.recv()
+
+    def stop(self):
+        self.parent.send('stop')
+        self.parent.recv()
+        self.process.join(timeout=5)
+
+
+# Scenarios -----------------------------------------------------------------
+
+def master_address(args, index: int) -> str:
+    return f"127.0.0.1:{args.base_port + index}"
+
+
+def poll_targets(args) -> List[Tuple[str, int]]:
+    return [(master_address(args, m), p) for m in range(args.masters) for p in range(1, args.ports + 1)]
+
+
+def sim_device_id(args, address: str) -> str:
+    """Device ID a simulated master reports in its event srcurl"""
+    index = int(address.rsplit(':', 1)[1]) - args.base_port
+    return f"00-02-01-00-{index >> 8 & 0xFF:02X}-{index & 0xFF:02X}"
+
+
+def configure_poller(args, target_a: Tuple[str, int], target_b: Tuple[str, int]):
+    """Point the backend's HTR-A/HTR-B environment at two simulated ports"""
+    os.environ['HTR_A_IP'], os.environ['HTR_A_TEMP_PORT'] = target_a[0], str(target_a[1])
+    os.environ['HTR_B_IP'], os.environ['HTR_B_TEMP_PORT'] = target_b[0], str(target_b[1])
+    os.environ['HTR_A_DEVICE_ID'] = sim_device_id(args, target_a[0])
+    os.environ['HTR_B_DEVICE_ID'] = sim_device_id(args, target_b[0])
+
+
+async def start_extra_pollers(args, backend, targets: List[Tuple[str, int]]) -> List[asyncio.Task]:
+    """Spawn one poll_temperature task per remaining pair of targets.
+
+    The first pair is polled by the task the backend starts itself.
+    """
+    tasks = []
+    pairs = [targets[i:i + 2] for i in range(0, len(targets), 2)]
+    for pair in pairs[1:]:
+        configure_poller(args, pair[0], pair[-1])
+        tasks.append(asyncio.create_task(backend.poll_temperature()))
+        # Let the poller read its configuration before the environment changes
+        await asyncio.sleep(0)
+    return tasks
+
+
+async def relay_client(args, api: str, session: aiohttp.ClientSession, deadline: float,
+                       latencies: List[float], errors: List[int], rng: random.Random):
+    while time.monotonic() < deadline:
+        master = master_address(args, rng.randrange(args.masters))
+        port = rng.randint(1, min(args.ports, 4))
+        if rng.random() < 0.5:
+            url, body = f"{api}/api/iolink/port/{port}/setdata", {'state': rng.random() < 0.5, 'ioLinkIp': master}
+        else:
+            url, body = f"{api}/api/iolink/port/{port}/getdata", {'ioLinkIp': master}
+        started = time.perf_counter()
+        try:
+            async with session.post(url, json=body) as resp:
+                data = await resp.json()
+                if resp.status != 200 or data.get('status') != 'ok':
+                    errors[0] += 1
+        except Exception:
+            errors[0] += 1
+        latencies.append((time.perf_counter() - started) * 1000.0)
+        if args.think_ms:
+            await asyncio.sleep(args.think_ms / 1000.0)
+
+
+async def ws_client(api: str, session: aiohttp.ClientSession, deadline: float, telemetry: str,
+                    connect_ms: List[float], received: List[int], errors: List[int]):
+    started = time.perf_counter()
+    query = '?format=compact' if telemetry == 'compact' else ''
+    try:
+        async with session.ws_connect(api.replace('http://', 'ws://') + '/ws' + query) as ws:
+            connect_ms.append((time.perf_counter() - started) * 1000.0)
+            while time.monotonic() < deadline:
+                try:
+                    message = await ws.receive(timeout=max(0.01, deadline - time.monotonic()))
+                    if message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED):
+                        break
+                    received[0] += 1
+                    received[1] += len(message.data)
+                except asyncio.TimeoutError:
+                    break
+    except Exception:
+        errors[0] += 1
+
+
+async def run_benchmark(args) -> Dict:
+    os.environ['MQTT_HOST'] = '127.0.0.1'
+    os.environ['MQTT_PORT'] = str(args.mqtt_port)
+    os.environ.setdefault('UNIT_NAME', 'bench')
+    os.environ.setdefault('HISTORY_DATABASE_URL', f"sqlite:///{os.path.join(tempfile.gettempdir(), 'iot-bench-history.db')}")
+    targets = poll_targets(args)
+    configure_poller(args, targets[0], targets[1] if len(targets) > 1 else targets[0])
+    os.environ['INGEST_MODE'] = args.ingest
+    os.environ['IOLINK_EVENT_CALLBACK'] = f"http://127.0.0.1:{args.api_port}/api/iolink/events"
+    os.environ['IOLINK_EVENT_SOURCE'] = 'datachanged'
+    # All bench clients share one address; measure the backend, not the rate limits
+    os.environ.setdefault('API_RATE_LIMIT', '0')
+    os.environ.setdefault('MASTER_RATE_LIMIT', '0')
+    if args.telemetry == 'compact':
+        os.environ['TELEMETRY_COMPACT'] = 'true'
+    if args.record_dir:
+        os.environ['RECORD_SESSION'] = 'true'
+        os.environ['RECORDER_DIR'] = args.record_dir
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before_import = rss_mb()
+
+    import uvicorn
+    from src import main as backend
+    logging.getLogger(backend.__name__).setLevel(args.backend_log_level)
+
+    scenarios = set(args.scenario.split(','))
+    if 'all' in scenarios:
+        scenarios = {'poll', 'relay', 'ws'}
+
+    if 'poll' not in scenarios:
+        # The relay and ws scenarios do not need the background poller
+        backend.poll_temperature = _idle
+
+    config = uvicorn.Config(backend.app, host='127.0.0.1', port=args.api_port,
+                            log_level='warning', lifespan='on', access_log=False,
+                            timeout_graceful_shutdown=2)
+    server = uvicorn.Server(config)
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    api = f"http://127.0.0.1:{args.api_port}"
+    poll_tasks = await start_extra_pollers(args, backend, targets) if 'poll' in scenarios else []
+
+    rss_start = rss_mb()
+    rss_samples = [rss_start]
+    started = time.monotonic()
+    deadline = started + args.duration
+    rng = random.Random(args.seed)
+
+    relay_latencies: List[float] = []
+    relay_errors = [0]
+    ws_connect: List[float] = []
+    ws_received = [0, 0]
+    ws_errors = [0]
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        clients = []
+        if 'relay' in scenarios:
+            clients += [relay_client(args, api, session, deadline, relay_latencies, relay_errors, rng)
+                        for _ in range(args.clients)]
+        if 'ws' in scenarios:
+            clients += [ws_client(api, session, deadline, args.telemetry, ws_connect, ws_received, ws_errors)
+                        for _ in range(args.clients)]
+
+        async def sample_memory():
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+                rss_samples.append(rss_mb())
+
+        await asyncio.gather(sample_memory(), *clients)
+    elapsed = time.monotonic() - started
+
+    for task in poll_tasks:
+        task.cancel()
+    backend.mqtt_client.disconnect()
+    backend.mqtt_client.loop_stop()
+    server.should_exit = True
+    try:
+        await asyncio.wait_for(server_task, timeout=10)
+    except asyncio.TimeoutError:
+        logger.warning("Backend did not shut down cleanly")
+
+    report = {
+        'config': {k: getattr(args, k) for k in ('masters', 'ports', 'clients', 'duration', 'ingest',
+                                                  'latency_ms', 'jitter_ms', 'fault_rate', 'timeout_rate')},
+        'scenarios': sorted(scenarios),
+        'elapsed_s': round(elapsed, 2),
+        'memory': {
+            'rss_before_import_mb': round(rss_before_import, 1),
+            'rss_start_mb': round(rss_start, 1),
+            'rss_end_mb': round(rss_samples[-1], 1),
+            'rss_peak_mb': round(max(rss_samples), 1),
+            'rss_growth_mb': round(rss_samples[-1] - rss_start, 1),
+        },
+    }
+    if args.tracemalloc:
+        current, peak = tracemalloc.get_traced_memory()
+        report['memory']['traced_current_mb'] = round(current / 1e6, 2)
+        report['memory']['traced_peak_mb'] = round(peak / 1e6, 2)
+    if 'relay' in scenarios:
+        report['relay'] = {**summarize(relay_latencies), 'errors': relay_errors[0],
+                           'throughput_rps': round(len(relay_latencies) / elapsed, 1)}
+    if 'ws' in scenarios:
+        report['ws'] = {'connect': summarize(ws_connect), 'messages': ws_received[0],
+                        'messages_per_s': round(ws_received[0] / elapsed, 1),
+                        'bytes_per_s': round(ws_received[1] / elapsed, 1), 'errors': ws_errors[0]}
+    return report
+
+
+async def _idle():
+    await asyncio.Event().wait()
+
+
+def add_simulator_report(report: Dict, sim: Dict):
+    """Fold the hardware-side view of the run into the report"""
+    elapsed = report['elapsed_s'] or 1.0
+    totals: Dict[str, int] = {}
+    service: List[float] = []
+    intervals: List[float] = []
+    for master in sim['masters']:
+        for key, value in master['stats'].items():
+            totals[key] = totals.get(key, 0) + value
+        service.extend(master['service_ms'])
+        intervals.extend(master['read_intervals_ms'])
+
+    report['masters'] = {**totals, 'requests_per_s': round(totals.get('requests', 0) / elapsed, 1),
+                         'service': summarize(service)}
+    if 'poll' in report['scenarios']:
+        report['poll'] = {
+            'targets': report['config']['masters'] * report['config']['ports'],
+            'events': totals.get('events_sent', 0),
+            'reads': totals.get('pdin_reads', 0),
+            'reads_per_s': round(totals.get('pdin_reads', 0) / elapsed, 1),
+            'read_interval': summarize(intervals),
+        }
+    broker = sim['broker']['stats']
+    topic_bytes = sim['broker'].get('topic_bytes', {})
+    compact_bytes = sum(n for topic, n in topic_bytes.items() if topic.startswith('telemetry/'))
+    report['mqtt'] = {**broker, 'publishes_per_s': round(broker['publishes'] / elapsed, 1),
+                      'json_bytes_per_s': round((sum(topic_bytes.values()) - compact_bytes) / elapsed, 1),
+                      'compact_bytes_per_s': round(compact_bytes / elapsed, 1)}
+    if sim.get('plant'):
+        report['plant'] = sim['plant']
+
+
+def print_report(report: Dict):
+    print("=" * 60)
+    print("📊 BACKEND BENCHMARK")
+    print("=" * 60)
+    cfg = report['config']
+    print(f"{cfg['masters']} masters × {cfg['ports']} ports × {cfg['clients']} clients, "
+          f"{report['elapsed_s']}s, scenarios: {', '.join(report['scenarios'])}")
+    if 'poll' in report:
+        p = report['poll']
+        print(f"poll   : {p['reads_per_s']} reads/s over {p['targets']} ports, "
+              f"interval p50 {p['read_interval']['p50_ms']} ms / p99 {p['read_interval']['p99_ms']} ms, "
+              f"{p['events']} pushed events")
+    if 'relay' in report:
+        r = report['relay']
+        print(f"relay  : {r['throughput_rps']} req/s, p50 {r['p50_ms']} ms / p99 {r['p99_ms']} ms, "
+              f"{r['errors']} errors")
+    if 'ws' in report:
+        w = report['ws']
+        print(f"ws     : {w['connect']['count']} connected, connect p50 {w['connect']['p50_ms']} ms / "
+              f"p99 {w['connect']['p99_ms']} ms, {w['messages_per_s']} msg/s ({w['bytes_per_s']} B/s), {w['errors']} errors")
+    m = report['masters']
+    print(f"master : {m['requests_per_s']} req/s, service p50 {m['service']['p50_ms']} ms / "
+          f"p99 {m['service']['p99_ms']} ms, {m['faults']} faults, {m['timeouts']} timeouts")
+    mqtt = report['mqtt']
+    print(f"mqtt   : {mqtt['publishes_per_s']} publishes/s, payloads {mqtt['json_bytes_per_s']} B/s JSON"
+          + (f", {mqtt['compact_bytes_per_s']} B/s compact" if mqtt['compact_bytes_per_s'] else ""))
+    if 'plant' in report:
+        plant = report['plant']
+        print(f"plant  : {plant['heaters']} heaters, {plant['sim_seconds']} s simulated, step p50 "
+              f"{plant['step_ms_p50']} ms, {plant['temperature_f']['min']}-{plant['temperature_f']['max']} °F")
+    mem = report['memory']
+    print(f"memory : start {mem['rss_start_mb']} MB, peak {mem['rss_peak_mb']} MB, "
+          f"growth {mem['rss_growth_mb']} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend against simulated hardware")
+    parser.add_argument('--masters', type=int, default=2, help="number of simulated IO-Link masters (N)")
+    parser.add_argument('--ports', type=int, default=8, help="ports per master (M)")
+    parser.add_argument('--clients', type=int, default=10, help="concurrent HTTP/WS clients (K)")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to run")
+    parser.add_argument('--scenario', default='all', help="comma list of poll, relay, ws or all")
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.5)
+    parser.add_argument('--fault-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--ingest', choices=['poll', 'event'], default='poll',
+                        help="backend INGEST_MODE: HTTP polling or pushed master events")
+    parser.add_argument('--telemetry', choices=['json', 'compact'], default='json',
+                        help="compact: also publish telemetry/<unit>/* frames and open /ws?format=compact")
+    parser.add_argument('--thermal', action='store_true',
+                        help="back each master with a simulated heater (bench/thermal.py) driven by pdout")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="simulated heater seconds per second")
+    parser.add_argument('--think-ms', type=float, default=0.0, help="pause between relay requests per client")
+    parser.add_argument('--base-port', type=int, default=20000)
+    parser.add_argument('--mqtt-port', type=int, default=18830)
+    parser.add_argument('--api-port', type=int, default=18000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--backend-log-level', default='WARNING')
+    parser.add_argument('--tracemalloc', action='store_true', help="also report Python heap usage")
+    parser.add_argument('--record-dir', help="record the session into this directory (replay with bench.replay)")
+    parser.add_argument('--json', help="write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    simulators = Simulators(args)
+    simulators.start()
+    try:
+        # The backend prints every relayed command; keep the report readable
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            report = asyncio.run(run_benchmark(args))
+        add_simulator_report(report, simulators.stats())
+    finally:
+        simulators.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Simulated IO-Link master for offline benchmarking.
+Serves the pdin/pdout endpoints the backend talks to, with configurable
+latency, jitter and fault injection, and pushes timer events to subscribers.
+
+With a ThermalPlant (bench/thermal.py) master i is heater i of the plant:
+pdout on ports 1..sections switches its sections and pdin on any port reads
+its temperature. Otherwise temperatures are a random walk.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from bench.thermal import ThermalPlant
+
+logger = logging.getLogger(__name__)
+
+PORT_PATH = re.compile(r'^/iolinkmaster/port\[(\d+)\]/iolinkdevice/(pdin|pdout)/(getdata|setdata)$')
+PDIN_ADR = re.compile(r'^/?iolinkmaster/port\[(\d+)\]/iolinkdevice/pdin$')
+IDENTITY_ADR = re.compile(r'^/?iolinkmaster/port\[(\d+)\]/iolinkdevice/(vendorid|deviceid|productname|serial|status)(/getdata)?$')
+ISDU_ADR = re.compile(r'^/?iolinkmaster/port\[(\d+)\]/iolinkdevice/iolreadacyclic$')
+
+
+class SimulatedMaster:
+    """In-process stand-in for one IO-Link master"""
+
+    def __init__(self, ports: int = 8, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 fault_rate: float = 0.0, timeout_rate: float = 0.0, timeout_s: float = 10.0,
+                 base_temp_f: float = 200.0, mac: str = "00:02:01:00:00:00", seed: Optional[int] = None,
+                 plant: Optional[ThermalPlant] = None, heater: int = 0):
+        self.ports = ports
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fault_rate = fault_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_s = timeout_s
+        self.mac = mac
+        self.plant = plant
+        self.heater = heater
+        self.rng = random.Random(seed)
+        self.temperatures = {p: base_temp_f + self.rng.uniform(-5, 5) for p in range(1, ports + 1)}
+        self.outputs = {p: "00" for p in range(1, ports + 1)}
+        self.device_id = mac.replace(':', '-').upper()
+        self.devices = {p: self.new_device(p) for p in range(1, ports + 1)}
+        self.stats = {'requests': 0, 'pdin_reads': 0, 'pdout_reads': 0, 'pdout_writes': 0,
+                      'faults': 0, 'timeouts': 0, 'subscriptions': 0, 'events_sent': 0, 'event_errors': 0,
+                      'identity_reads': 0, 'isdu_reads': 0}
+        self.subscriptions: Dict[tuple, Dict] = {}
+        self.timer_interval_ms = 1000
+        self.event_counter = 0
+        self._push_task: Optional[asyncio.Task] = None
+        self._push_session = None
+        self.service_ms: deque = deque(maxlen=100000)
+        self.read_intervals_ms: deque = deque(maxlen=100000)
+        self._last_read: Dict[int, float] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        return app
+
+    def new_device(self, port: int) -> Dict:
+        """Identification of a (simulated ifm TV7105) temperature sensor on a port"""
+        return {'vendorid': 310, 'deviceid': 1063, 'productname': 'TV7105', 'status': 2,
+                'serial': f"{self.mac.replace(':', '')[-6:]}{port:02d}{self.rng.randrange(10000):04d}"}
+
+    def swap_device(self, port: int):
+        """Replace the device on a port (new serial number)"""
+        self.devices[port] = self.new_device(port)
+
+    def isdu_value(self, port: int, index: int) -> Optional[str]:
+        device = self.devices[port]
+        text = {0x10: 'ifm electronic gmbh', 0x12: device['productname'], 0x13: device['productname'],
+                0x14: 'Temperature transmitter', 0x15: device['serial'], 0x16: 'AA', 0x17: '1.2.3'}.get(index)
+        return text.encode().hex().upper() if text is not None else None
+
+    def pdin_value(self, port: int) -> str:
+        """Return the process data for a port as the master's hex string"""
+        if self.plant is not None:
+            temp = self.plant.read(self.heater)
+        else:
+            temp = self.temperatures.get(port, 0.0) + self.rng.uniform(-0.5, 0.5)
+            self.temperatures[port] = temp
+        return f"{max(0, int(round(temp * 10))) & 0xFFFF:04X}"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        self.stats['requests'] += 1
+
+        delay_ms = self.latency_ms
+        if self.jitter_ms:
+            delay_ms += self.rng.gauss(0, self.jitter_ms)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000.0)
+
+        if self.timeout_rate and self.rng.random() < self.timeout_rate:
+            self.stats['timeouts'] += 1
+            await asyncio.sleep(self.timeout_s)
+        if self.fault_rate and self.rng.random() < self.fault_rate:
+            self.stats['faults'] += 1
+            return web.json_response({'code': 500, 'error': 'simulated fault'}, status=500)
+
+        try:
+            return await self.dispatch(request)
+        finally:
+            self.service_ms.append((time.perf_counter() - started) * 1000.0)
+
+    async def dispatch(self, request: web.Request) -> web.Response:
+        path = request.path
+        if path == '/' and request.method == 'POST':
+            return await self.handle_service(await request.json())
+        if path == '/iolinkmaster/deviceinfo':
+            return web.json_response({'mac': self.mac, 'ports': self.ports})
+
+        identity = IDENTITY_ADR.match(path)
+        if identity and int(identity.group(1)) in self.devices:
+            self.stats['identity_reads'] += 1
+            return web.json_response({'cid': 4711, 'code': 200,
+                                      'data': {'value': self.devices[int(identity.group(1))][identity.group(2)]}})
+
+        match = PORT_PATH.match(path)
+        if not match:
+            return web.json_response({'code': 404}, status=404)
+
+        port = int(match.group(1))
+        if port not in self.outputs:
+            return web.json_response({'code': 404}, status=404)
+
+        direction, service = match.group(2), match.group(3)
+        cid = 4711
+        if request.can_read_body:
+            try:
+                body = await request.json()
+                cid = body.get('cid', cid)
+            except Exception:
+                body = {}
+        else:
+            body = {}
+
+        if direction == 'pdin' and service == 'getdata':
+            self.count_pdin_read(port)
+            return web.json_response({'cid': cid, 'data': {'value': self.pdin_value(port)}, 'code': 200})
+
+        if direction == 'pdout' and service == 'getdata':
+            self.stats['pdout_reads'] += 1
+            return web.json_response({'cid': cid, 'data': {'value': self.outputs[port]}, 'code': 200})
+
+        if direction == 'pdout' and service == 'setdata':
+            self.stats['pdout_writes'] += 1
+            self.outputs[port] = str(body.get('data', {}).get('newvalue', '00'))
+            if self.plant is not None and port <= self.plant.sections:
+                self.plant.set_section(self.heater, port - 1, self.outputs[port].strip('0') != '')
+            return web.json_response({'cid': cid, 'code': 200})
+
+        return web.json_response({'code': 405}, status=405)
+
+    def count_pdin_read(self, port: int):
+        now = time.monotonic()
+        last = self._last_read.get(port)
+        if last is not None:
+            self.read_intervals_ms.append((now - last) * 1000.0)
+        self._last_read[port] = now
+        self.stats['pdin_reads'] += 1
+
+    async def handle_service(self, body: Dict) -> web.Response:
+        """JSON request API posted to the master root (subscriptions and timer)"""
+        cid = body.get('cid', 4711)
+        adr = str(body.get('adr', ''))
+        data = body.get('data') or {}
+
+        if adr.endswith('/subscribe'):
+            callback = data.get('callback', '')
+            if not callback.startswith('http://'):
+                return web.json_response({'cid': cid, 'code': 530})
+            self.subscriptions[(adr[:-len('/subscribe')], callback)] = {
+                'callback': callback, 'datatosend': list(data.get('datatosend') or []),
+                'srcurl': adr[:-len('/subscribe')].lstrip('/'),
+            }
+            self.stats['subscriptions'] += 1
+            if self._push_task is None:
+                self._push_task = asyncio.create_task(self.push_events())
+            return web.json_response({'cid': cid, 'code': 200})
+
+        if adr.endswith('/unsubscribe'):
+            self.subscriptions.pop((adr[:-len('/unsubscribe')], data.get('callback', '')), None)
+            return web.json_response({'cid': cid, 'code': 200})
+
+        if adr == '/getdatamulti':
+            values = {}
+            for address in data.get('datatosend') or []:
+                match = PDIN_ADR.match(address)
+                identity = IDENTITY_ADR.match(address)
+                if match and int(match.group(1)) in self.outputs:
+                    self.count_pdin_read(int(match.group(1)))
+                    values[address] = {'code': 200, 'data': self.pdin_value(int(match.group(1)))}
+                elif identity and int(identity.group(1)) in self.devices:
+                    self.stats['identity_reads'] += 1
+                    values[address] = {'code': 200, 'data': self.devices[int(identity.group(1))][identity.group(2)]}
+                else:
+                    values[address] = {'code': 404}
+            return web.json_response({'cid': cid, 'data': values, 'code': 200})
+
+        match = ISDU_ADR.match(adr)
+        if match and int(match.group(1)) in self.devices:
+            self.stats['isdu_reads'] += 1
+            value = self.isdu_value(int(match.group(1)), int(data.get('index', -1)))
+            if value is None:
+                return web.json_response({'cid': cid, 'code': 530})
+            return web.json_response({'cid': cid, 'data': {'value': value}, 'code': 200})
+
+        if adr == '/timer[1]/interval/setdata':
+            self.timer_interval_ms = max(10, int(data.get('newvalue', 1000)))
+            return web.json_response({'cid': cid, 'code': 200})
+
+        return web.json_response({'cid': cid, 'code': 404})
+
+    async def push_events(self):
+        """Post an event to every subscriber once per timer interval"""
+        self._push_session = aiohttp.ClientSession()
+        try:
+            while True:
+                await asyncio.sleep(self.timer_interval_ms / 1000.0)
+                self.event_counter += 1
+                for subscription in list(self.subscriptions.values()):
+                    payload = {'/timer[1]/counter': {'code': 200, 'data': self.event_counter}}
+                    for address in subscription['datatosend']:
+                        match = PDIN_ADR.match(address)
+                        if match and int(match.group(1)) in self.outputs:
+                            payload[address] = {'code': 200, 'data': self.pdin_value(int(match.group(1)))}
+                    event = {'code': 'event', 'cid': -1, 'adr': '', 'data': {
+                        'eventno': str(self.event_counter),
+                        'srcurl': f"{self.device_id}/{subscription['srcurl']}",
+                        'payload': payload,
+                    }}
+                    try:
+                        async with self._push_session.post(subscription['callback'], json=event) as resp:
+                            await resp.read()
+                        self.stats['events_sent'] += 1
+                    except Exception:
+                        self.stats['event_errors'] += 1
+        finally:
+            await self._push_session.close()
+
+    async def close(self):
+        if self._push_task:
+            self._push_task.cancel()
+            try:
+                await self._push_task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> Dict:
+        """Return counters and raw timing samples for reporting"""
+        return {
+            'stats': dict(self.stats),
+            'service_ms': list(self.service_ms),
+            'read_intervals_ms': list(self.read_intervals_ms),
+        }
+
+
+async def start_masters(count: int, base_port: int, host: str = '127.0.0.1',
+                        plant: Optional[ThermalPlant] = None, **options) -> List:
+    """Start `count` simulated masters on consecutive TCP ports (master i drives heater i of `plant`)"""
+    if plant is not None and plant.heaters < count:
+        raise ValueError(f"The plant has {plant.heaters} heaters for {count} masters")
+    masters = []
+    for i in range(count):
+        master = SimulatedMaster(mac=f"00:02:01:00:{i >> 8 & 0xFF:02X}:{i & 0xFF:02X}",
+                                 plant=plant, heater=i, **options)
+        runner = web.AppRunner(master.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, base_port + i)
+        await site.start()
+        masters.append((master, runner))
+    logger.info(f"Started {count} simulated IO-Link masters on {host}:{base_port}-{base_port + count - 1}")
+    return masters
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run simulated IO-Link masters")
+    parser.add_argument('--count', type=int, default=2)
+    parser.add_argument('--base-port', type=int, default=20000)
+    parser.add_argument('--ports', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--fault-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--thermal', action='store_true', help="back the masters with the heater model")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="simulated seconds per second")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    plant = ThermalPlant(args.count, time_scale=args.time_scale) if args.thermal else None
+    await start_masters(args.count, args.base_port, ports=args.ports, latency_ms=args.latency_ms,
+                        jitter_ms=args.jitter_ms, fault_rate=args.fault_rate,
+                        timeout_rate=args.timeout_rate, plant=plant)
+    if plant is not None:
+        plant.start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
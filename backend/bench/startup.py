@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Backend cold-start benchmark.
+
+Starts the backend as a fresh uvicorn process, the way a pod restart does,
+against simulated IO-Link masters and measures the time until it answers
+HTTP and until the first temperature reading is available. Exits non-zero
+when the median time to serve misses --target-ms.
+
+Run from the backend directory:
+    python -m bench.startup --runs 5 --target-ms 1500
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from bench.run import Simulators, master_address, sim_device_id, summarize  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def get_json(url: str) -> Optional[Dict]:
+    try:
+        with urllib.request.urlopen(url, timeout=0.5) as resp:
+            return json.loads(resp.read())
+    except Exception:
+        return None
+
+
+def measure_start(args, history_db: str) -> Dict:
+    """Start one backend process and time it to first response and first reading"""
+    api = f"http://127.0.0.1:{args.api_port}"
+    env = dict(os.environ,
+               PYTHONPATH=BACKEND_DIR,
+               MQTT_HOST='127.0.0.1',
+               # An unused port simulates a broker that is not up yet
+               MQTT_PORT=str(args.mqtt_port + 1 if args.broker_down else args.mqtt_port),
+               HTR_A_IP=master_address(args, 0), HTR_A_TEMP_PORT='1',
+               HTR_B_IP=master_address(args, 0), HTR_B_TEMP_PORT='2',
+               HTR_A_DEVICE_ID=sim_device_id(args, master_address(args, 0)),
+               HTR_B_DEVICE_ID=sim_device_id(args, master_address(args, 0)),
+               HISTORY_DATABASE_URL=f"sqlite:///{history_db}")
+
+    started = time.perf_counter()
+    # Run from the repository root so config/iolink_config.yml resolves as in the container
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'src.main:app', '--host', '127.0.0.1',
+         '--port', str(args.api_port), '--log-level', 'warning'],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {'serve_ms': None, 'first_reading_ms': None}
+    try:
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline and result['serve_ms'] is None:
+            if get_json(f"{api}/api/status"):
+                result['serve_ms'] = round((time.perf_counter() - started) * 1000.0, 1)
+            else:
+                time.sleep(0.01)
+        while time.perf_counter() < deadline and result['first_reading_ms'] is None:
+            reading = get_json(f"{api}/api/temperature")
+            if reading and 'value' in reading:
+                result['first_reading_ms'] = round((time.perf_counter() - started) * 1000.0, 1)
+            else:
+                time.sleep(0.01)
+    finally:
+        process.kill()
+        process.wait()
+    return result
+
+
+def run(args) -> Dict:
+    serve: List[float] = []
+    reading: List[float] = []
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.runs):
+            result = measure_start(args, os.path.join(tmp, f"history-{i}.db"))
+            if result['serve_ms'] is None or result['first_reading_ms'] is None:
+                failures += 1
+            if result['serve_ms'] is not None:
+                serve.append(result['serve_ms'])
+            if result['first_reading_ms'] is not None:
+                reading.append(result['first_reading_ms'])
+    return {
+        'runs': args.runs,
+        'failures': failures,
+        'broker_down': args.broker_down,
+        'target_ms': args.target_ms,
+        'serve': summarize(serve),
+        'first_reading': summarize(reading),
+    }
+
+
+def print_report(report: Dict):
+    print("=" * 60)
+    print("🚀 BACKEND COLD START")
+    print("=" * 60)
+    print(f"{report['runs']} runs, broker {'down' if report['broker_down'] else 'up'}, "
+          f"{report['failures']} failed")
+    print(f"serve   : p50 {report['serve']['p50_ms']} ms / max {report['serve']['max_ms']} ms "
+          f"(target {report['target_ms']} ms)")
+    print(f"reading : p50 {report['first_reading']['p50_ms']} ms / max {report['first_reading']['max_ms']} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure backend cold start against simulated hardware")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--target-ms', type=float, default=1500.0, help="fail if median time to serve exceeds this")
+    parser.add_argument('--broker-down', action='store_true', help="start without a reachable MQTT broker")
+    parser.add_argument('--timeout', type=float, default=30.0, help="seconds to wait per run")
+    parser.add_argument('--masters', type=int, default=1)
+    parser.add_argument('--ports', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.5)
+    parser.add_argument('--fault-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--thermal', action='store_true',
+                        help="back each master with a simulated heater (bench/thermal.py) driven by pdout")
+    parser.add_argument('--time-scale', type=float, default=1.0, help="simulated heater seconds per second")
+    parser.add_argument('--base-port', type=int, default=20000)
+    parser.add_argument('--mqtt-port', type=int, default=18830)
+    parser.add_argument('--api-port', type=int, default=18050)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="write the report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    simulators = Simulators(args)
+    simulators.start()
+    try:
+        report = run(args)
+    finally:
+        simulators.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    ok = report['failures'] == 0 and report['serve']['p50_ms'] <= args.target_ms
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
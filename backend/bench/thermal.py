@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Vectorized thermal model of the heater plant for the simulated IO-Link masters.
+
+Each heater is first order plus dead time (FOPDT): its sections add heat in
+proportion to their gain, delayed by the heater's dead time, and it loses heat
+to ambient with time constant tau:
+
+    tau dT/dt = -(T - ambient) + sum(gain_s * on_s(t - dead_time))
+
+The state of every heater lives in NumPy arrays and one step advances them all
+with the exact discretisation T' = Tss + (T - Tss) exp(-dt/tau), so thousands of
+heaters cost about as much per step as one. Parameters are drawn per heater
+around the given values (`spread`), which gives a plant to tune against.
+
+Timing check, from the backend directory:
+    python -m bench.thermal --heaters 10000 --steps 1000
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ThermalPlant:
+    """`heaters` FOPDT heaters with `sections` on/off sections each, in °F and seconds"""
+
+    def __init__(self, heaters: int, sections: int = 4, ambient_f: float = 70.0, gain_f: float = 720.0,
+                 tau_s: float = 600.0, dead_time_s: float = 20.0, step_s: float = 1.0, spread: float = 0.1,
+                 noise_f: float = 0.2, time_scale: float = 1.0, seed: Optional[int] = None):
+        self.heaters = heaters
+        self.sections = sections
+        self.step_s = step_s
+        self.noise_f = noise_f
+        self.time_scale = time_scale
+        self.rng = np.random.default_rng(seed)
+
+        def draw(value: float) -> np.ndarray:
+            return value * (1 + spread * self.rng.uniform(-1, 1, heaters))
+
+        self.ambient = np.full(heaters, ambient_f)
+        self.tau = draw(tau_s)
+        self.dead_time = np.maximum(draw(dead_time_s), 0.0)
+        # Steady-state rise of each section at full power; gain_f is the whole heater's
+        self.section_gain = np.outer(draw(gain_f), np.full(sections, 1.0 / sections))
+        self.decay = np.exp(-step_s / self.tau)
+
+        self.delay_steps = np.rint(self.dead_time / step_s).astype(np.intp)
+        self.history = np.zeros((int(self.delay_steps.max()) + 1, heaters))
+        self.head = 0
+        self.rows = np.arange(heaters)
+
+        self.on = np.zeros((heaters, sections), dtype=bool)
+        self.temperature = self.ambient.copy()
+        self.sim_time = 0.0
+        self.step_ms: deque = deque(maxlen=10000)
+        self.stats = {'steps': 0, 'behind': 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def set_section(self, heater: int, section: int, state: bool):
+        self.on[heater, section] = state
+
+    def read(self, heater: int) -> float:
+        """Sensor reading for one heater (temperature plus noise)"""
+        if self.noise_f:
+            return float(self.temperature[heater] + self.rng.normal(0.0, self.noise_f))
+        return float(self.temperature[heater])
+
+    def step(self, count: int = 1):
+        """Advance every heater by `count` steps of `step_s`"""
+        started = time.perf_counter()
+        heat = (self.on * self.section_gain).sum(axis=1)
+        for _ in range(count):
+            self.head = (self.head + 1) % len(self.history)
+            self.history[self.head] = heat
+            delayed = self.history[(self.head - self.delay_steps) % len(self.history), self.rows]
+            steady = self.ambient + delayed
+            self.temperature = steady + (self.temperature - steady) * self.decay
+        self.sim_time += count * self.step_s
+        self.stats['steps'] += count
+        self.step_ms.append((time.perf_counter() - started) * 1000.0 / count)
+
+    async def run(self, interval: float = 0.1, max_catch_up: int = 100):
+        """Keep simulated time at wall time x time_scale"""
+        last = time.monotonic()
+        owed = 0.0
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            owed += (now - last) * self.time_scale / self.step_s
+            last = now
+            count = int(owed)
+            if count > max_catch_up:
+                # Too slow for this time scale; drop the backlog rather than spiral
+                self.stats['behind'] += count - max_catch_up
+                count = max_catch_up
+                owed = 0.0
+            else:
+                owed -= count
+            if count:
+                self.step(count)
+
+    def start(self, interval: float = 0.1):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict:
+        step_ms = sorted(self.step_ms)
+        return {
+            'heaters': self.heaters,
+            'sections': self.sections,
+            'sim_seconds': round(self.sim_time, 1),
+            **self.stats,
+            'step_ms_p50': round(step_ms[len(step_ms) // 2], 4) if step_ms else None,
+            'step_ms_max': round(step_ms[-1], 4) if step_ms else None,
+            'temperature_f': {
+                'min': round(float(self.temperature.min()), 1),
+                'mean': round(float(self.temperature.mean()), 1),
+                'max': round(float(self.temperature.max()), 1),
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the vectorized heater model")
+    parser.add_argument('--heaters', type=int, default=10000)
+    parser.add_argument('--sections', type=int, default=4)
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    plant = ThermalPlant(args.heaters, args.sections, seed=args.seed)
+    plant.on[:, :args.sections // 2] = True
+    started = time.perf_counter()
+    for _ in range(args.steps):
+        plant.step()
+    elapsed = time.perf_counter() - started
+    print(f"{args.heaters} heaters x {args.steps} steps: {elapsed * 1000 / args.steps:.3f} ms/step, "
+          f"{args.heaters * args.steps / elapsed / 1e6:.1f} M heater-steps/s")
+    print(plant.snapshot())
+
+
+if __name__ == "__main__":
+    main()
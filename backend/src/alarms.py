@@ -0,0 +1,233 @@
+"""
+Alarm evaluation on the ingest stream.
+
+Rules from the `alarms` section of iolink_config.yml are compiled once per
+signal (unit/heater) into a flat list, so each sample costs one pass over
+that signal's rules with O(1) state per rule:
+
+- threshold: high and/or low limit; clears only once the value is back
+  inside the limit by `deadband` (hysteresis)
+- rate: change per minute measured against a reference sample at least
+  `window` seconds old, with the same deadband on clearing
+- stale: no sample for `after` seconds, checked from the poll loop
+
+Only transitions (raise/clear) produce events. Rules missing the fields their
+type needs are logged and skipped when the config is loaded.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RULE_TYPES = ('threshold', 'rate', 'stale')
+
+
+@dataclass(frozen=True)
+class AlarmRule:
+    name: str
+    type: str
+    high: Optional[float] = None
+    low: Optional[float] = None
+    max_rate: Optional[float] = None  # units per minute
+    window: float = 10.0
+    after: float = 10.0
+    deadband: float = 0.0
+    severity: str = 'warning'
+    heaters: Tuple[str, ...] = ()  # empty means every heater
+
+    def applies_to(self, heater: str) -> bool:
+        return not self.heaters or heater in self.heaters
+
+
+@dataclass
+class RuleState:
+    active: bool = False
+    ref_time: Optional[float] = None
+    ref_value: Optional[float] = None
+
+
+@dataclass
+class SignalState:
+    rules: List[Tuple[AlarmRule, RuleState]]
+    last_sample: Optional[float] = None
+    last_value: Optional[float] = None
+    active: Dict[str, Dict] = field(default_factory=dict)
+
+
+def rule_problem(rule: AlarmRule) -> Optional[str]:
+    """Why a rule cannot be evaluated, or None if it is usable"""
+    if rule.type == 'threshold':
+        if rule.high is None and rule.low is None:
+            return "threshold rule needs high and/or low"
+        if rule.high is not None and rule.low is not None and rule.low >= rule.high:
+            return f"low {rule.low:g} is not below high {rule.high:g}"
+    elif rule.type == 'rate':
+        if rule.max_rate is None or rule.max_rate <= 0:
+            return "rate rule needs a positive max_rate"
+        if rule.window <= 0:
+            return "rate rule needs a positive window"
+        if rule.deadband >= rule.max_rate:
+            return f"deadband {rule.deadband:g} is not below max_rate {rule.max_rate:g}"
+    elif rule.type == 'stale' and rule.after <= 0:
+        return "stale rule needs a positive after"
+    if rule.deadband < 0:
+        return "deadband must not be negative"
+    return None
+
+
+def rules_from_config(iolink_config: Dict) -> List[AlarmRule]:
+    """Build rules from iolink_config.yml; the sensor range is always checked"""
+    alarm_config = iolink_config.get('alarms') or {}
+    rules = []
+    for cfg in alarm_config.get('rules') or []:
+        if not isinstance(cfg, dict):
+            logger.error(f"Skipping alarm rule {cfg!r}: not a mapping")
+            continue
+        if cfg.get('type') not in RULE_TYPES:
+            logger.error(f"Skipping alarm rule {cfg.get('name')}: unknown type {cfg.get('type')}")
+            continue
+        try:
+            heaters = cfg.get('heaters') or ()
+            rule = AlarmRule(
+                name=cfg.get('name') or cfg['type'],
+                type=cfg['type'],
+                high=None if cfg.get('high') is None else float(cfg['high']),
+                low=None if cfg.get('low') is None else float(cfg['low']),
+                max_rate=None if cfg.get('max_rate') is None else float(cfg['max_rate']),
+                window=float(cfg.get('window', 10)),
+                after=float(cfg.get('after', 10)),
+                deadband=float(cfg.get('deadband', 0)),
+                severity=cfg.get('severity', 'warning'),
+                heaters=(heaters,) if isinstance(heaters, str) else tuple(heaters),
+            )
+        except (TypeError, ValueError) as e:
+            logger.error(f"Skipping alarm rule {cfg.get('name') or cfg['type']}: {e}")
+            continue
+        problem = rule_problem(rule)
+        if problem:
+            logger.error(f"Skipping alarm rule {rule.name}: {problem}")
+            continue
+        rules.append(rule)
+
+    sensor_range = ((iolink_config.get('devices') or {}).get('temperature_sensor') or {}).get('range')
+    if sensor_range and not any(rule.name == 'sensor_range' for rule in rules):
+        rules.append(AlarmRule(name='sensor_range', type='threshold', low=float(sensor_range[0]),
+                               high=float(sensor_range[1]), severity='critical'))
+    return rules
+
+
+class AlarmEngine:
+    """Per-signal alarm state; evaluate() is called for every ingested sample"""
+
+    def __init__(self, rules: List[AlarmRule]):
+        self.rules = rules
+        self.by_name = {rule.name: rule for rule in rules}
+        self.signals: Dict[Tuple[str, str], SignalState] = {}
+
+    def _signal(self, unit: str, heater: str) -> SignalState:
+        state = self.signals.get((unit, heater))
+        if state is None:
+            # Compile the applicable rules once per signal
+            state = SignalState(rules=[(rule, RuleState()) for rule in self.rules
+                                       if rule.type != 'stale' and rule.applies_to(heater)])
+            self.signals[(unit, heater)] = state
+        return state
+
+    def _event(self, unit: str, heater: str, rule: AlarmRule, active: bool, value, limit, message: str) -> Dict:
+        return {
+            'alarm': rule.name,
+            'type': rule.type,
+            'unit': unit,
+            'heater': heater,
+            'state': 'active' if active else 'cleared',
+            'severity': rule.severity,
+            'value': value,
+            'limit': limit,
+            'message': message,
+            'timestamp': datetime.now().isoformat(),
+        }
+
+    def _transition(self, signal: SignalState, event: Dict) -> Dict:
+        if event['state'] == 'active':
+            signal.active[event['alarm']] = event
+        else:
+            signal.active.pop(event['alarm'], None)
+        return event
+
+    def evaluate(self, unit: str, heater: str, value: float, now: Optional[float] = None) -> List[Dict]:
+        """Apply one sample; returns the alarm events it raised or cleared"""
+        now = time.monotonic() if now is None else now
+        signal = self._signal(unit, heater)
+        events = []
+
+        for name, active in list(signal.active.items()):
+            if active['type'] == 'stale':
+                events.append(self._transition(signal, self._event(
+                    unit, heater, self.by_name[name], False, value, None, "Readings resumed")))
+        signal.last_sample = now
+        signal.last_value = value
+
+        for rule, state in signal.rules:
+            if rule.type == 'threshold':
+                if not state.active:
+                    if rule.high is not None and value > rule.high:
+                        state.active = True
+                        events.append(self._transition(signal, self._event(
+                            unit, heater, rule, True, value, rule.high, f"{value:.1f} above {rule.high:g}")))
+                    elif rule.low is not None and value < rule.low:
+                        state.active = True
+                        events.append(self._transition(signal, self._event(
+                            unit, heater, rule, True, value, rule.low, f"{value:.1f} below {rule.low:g}")))
+                elif (rule.high is None or value <= rule.high - rule.deadband) and \
+                        (rule.low is None or value >= rule.low + rule.deadband):
+                    state.active = False
+                    events.append(self._transition(signal, self._event(
+                        unit, heater, rule, False, value, None, f"{value:.1f} back within limits")))
+
+            elif rule.type == 'rate':
+                if state.ref_time is None:
+                    state.ref_time, state.ref_value = now, value
+                    continue
+                elapsed = now - state.ref_time
+                if elapsed < rule.window:
+                    continue
+                rate = (value - state.ref_value) / elapsed * 60.0
+                state.ref_time, state.ref_value = now, value
+                if not state.active and abs(rate) > rule.max_rate:
+                    state.active = True
+                    events.append(self._transition(signal, self._event(
+                        unit, heater, rule, True, round(rate, 2), rule.max_rate,
+                        f"Changing {rate:+.1f}/min, limit {rule.max_rate:g}/min")))
+                elif state.active and abs(rate) <= rule.max_rate - rule.deadband:
+                    state.active = False
+                    events.append(self._transition(signal, self._event(
+                        unit, heater, rule, False, round(rate, 2), None, f"Rate back to {rate:+.1f}/min")))
+        return events
+
+    def check_stale(self, unit: str, heaters: List[str], now: Optional[float] = None) -> List[Dict]:
+        """Raise stale alarms for heaters whose samples stopped; call about once a second"""
+        now = time.monotonic() if now is None else now
+        events = []
+        for rule in self.rules:
+            if rule.type != 'stale':
+                continue
+            for heater in heaters:
+                if not rule.applies_to(heater):
+                    continue
+                signal = self._signal(unit, heater)
+                if signal.last_sample is None:
+                    # Start the clock at the first check so a heater that never reports still alarms
+                    signal.last_sample = now
+                    continue
+                age = now - signal.last_sample
+                if age > rule.after and rule.name not in signal.active:
+                    events.append(self._transition(signal, self._event(
+                        unit, heater, rule, True, signal.last_value, rule.after, f"No reading for {age:.0f}s")))
+        return events
+
+    def active(self) -> List[Dict]:
+        return [event for signal in self.signals.values() for event in signal.active.values()]
@@ -0,0 +1,284 @@
+"""
+Incremental heater analytics.
+
+Per section (output port) this tracks on-time, ON switches and estimated
+energy (on-time x rated power); per heater, the time spent in each
+temperature band. Every state change or reading accrues the time elapsed
+since the previous one, so nothing ever rescans history:
+
+- totals since the backend started are plain counters
+- rolling windows (e.g. last hour / day) are rings of fixed-width buckets
+  with a running sum; an update touches the current bucket and clears the
+  buckets that fell out of the window
+
+Reports are built from these sums and cost O(sections x windows).
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .snapshot import parse_unit_topic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOWS = (3600, 86400)
+DEFAULT_BANDS = (200, 400, 600, 700)
+
+
+class RollingSum:
+    """Sum of amounts added over the last `window` seconds, kept in fixed buckets"""
+
+    def __init__(self, window: float, buckets: int = 60):
+        self.window = window
+        self.width = window / buckets
+        self.buckets = [0.0] * buckets
+        self.index: Optional[int] = None
+        self.sum = 0.0
+
+    def _advance(self, now: float):
+        current = int(now // self.width)
+        if self.index is None:
+            self.index = current
+            return
+        if current <= self.index:
+            return
+        size = len(self.buckets)
+        for step in range(1, min(current - self.index, size) + 1):
+            slot = (self.index + step) % size
+            self.sum -= self.buckets[slot]
+            self.buckets[slot] = 0.0
+        self.index = current
+        if self.sum < 1e-9:
+            self.sum = 0.0
+
+    def add(self, now: float, amount: float):
+        self._advance(now)
+        self.buckets[self.index % len(self.buckets)] += amount
+        self.sum += amount
+
+    def add_interval(self, start: float, end: float):
+        """Spread the duration [start, end) over the buckets it covers"""
+        t = max(start, end - self.window)
+        while t < end:
+            stop = min((int(t // self.width) + 1) * self.width, end)
+            self.add(t, stop - t)
+            t = stop
+
+    def total(self, now: float) -> float:
+        self._advance(now)
+        return self.sum
+
+    def span(self, now: float) -> float:
+        """Seconds the buckets currently cover (the oldest full bucket up to now)"""
+        return (len(self.buckets) - 1) * self.width + (now - int(now // self.width) * self.width)
+
+
+@dataclass
+class SectionStats:
+    first_seen: float
+    since: float
+    on: bool = False
+    on_seconds: float = 0.0
+    switches: int = 0
+    on_windows: List[RollingSum] = field(default_factory=list)
+    switch_windows: List[RollingSum] = field(default_factory=list)
+
+
+@dataclass
+class HeaterStats:
+    first_seen: float
+    sections: Dict[int, SectionStats] = field(default_factory=dict)
+    temperature: Optional[float] = None
+    temperature_since: float = 0.0
+    band_seconds: List[float] = field(default_factory=list)
+    band_windows: List[List[RollingSum]] = field(default_factory=list)
+
+
+class HeaterAnalytics:
+    """Duty cycle, switch counts, energy and time-at-temperature per unit/heater"""
+
+    def __init__(self, windows=DEFAULT_WINDOWS, section_power_kw=None, bands=DEFAULT_BANDS,
+                 buckets: int = 60, default_power_kw: Optional[float] = None):
+        self.windows = [float(w) for w in windows]
+        self.section_power_kw = [float(p) for p in (section_power_kw or [])]
+        self.default_power_kw = default_power_kw
+        self.bands = sorted(float(b) for b in bands)
+        self.buckets = buckets
+        self.heaters: Dict[Tuple[str, str], HeaterStats] = {}
+
+    # State ------------------------------------------------------------------
+
+    def _heater(self, unit: str, heater: str, now: float) -> HeaterStats:
+        stats = self.heaters.get((unit, heater))
+        if stats is None:
+            stats = HeaterStats(first_seen=now, temperature_since=now,
+                                band_seconds=[0.0] * (len(self.bands) + 1),
+                                band_windows=[[RollingSum(w, self.buckets) for w in self.windows]
+                                              for _ in range(len(self.bands) + 1)])
+            self.heaters[(unit, heater)] = stats
+        return stats
+
+    def _section(self, heater: HeaterStats, port: int, now: float) -> SectionStats:
+        section = heater.sections.get(port)
+        if section is None:
+            section = SectionStats(first_seen=now, since=now,
+                                   on_windows=[RollingSum(w, self.buckets) for w in self.windows],
+                                   switch_windows=[RollingSum(w, self.buckets) for w in self.windows])
+            heater.sections[port] = section
+        return section
+
+    def _accrue_section(self, section: SectionStats, now: float):
+        if section.on and now > section.since:
+            section.on_seconds += now - section.since
+            for rolling in section.on_windows:
+                rolling.add_interval(section.since, now)
+        section.since = max(section.since, now)
+
+    def _band(self, value: float) -> int:
+        for index, edge in enumerate(self.bands):
+            if value < edge:
+                return index
+        return len(self.bands)
+
+    def _accrue_temperature(self, heater: HeaterStats, now: float):
+        if heater.temperature is not None and now > heater.temperature_since:
+            band = self._band(heater.temperature)
+            heater.band_seconds[band] += now - heater.temperature_since
+            for rolling in heater.band_windows[band]:
+                rolling.add_interval(heater.temperature_since, now)
+        heater.temperature_since = max(heater.temperature_since, now)
+
+    def set_section(self, unit: str, heater: str, port: int, state: bool, now: Optional[float] = None):
+        """Apply a section ON/OFF state; repeated states only accrue time"""
+        now = time.monotonic() if now is None else now
+        section = self._section(self._heater(unit, heater, now), int(port), now)
+        self._accrue_section(section, now)
+        if state and not section.on:
+            section.switches += 1
+            for rolling in section.switch_windows:
+                rolling.add(now, 1)
+        section.on = bool(state)
+
+    def set_sections(self, unit: str, heater: str, states, now: Optional[float] = None):
+        for port, state in enumerate(states, start=1):
+            self.set_section(unit, heater, port, bool(state), now)
+
+    def record_temperature(self, unit: str, heater: str, value: float, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        stats = self._heater(unit, heater, now)
+        self._accrue_temperature(stats, now)
+        stats.temperature = value
+
+    def apply_unit_message(self, topic: str, payload, now: Optional[float] = None):
+        """Fold a temperature or sections message from any unit (as snapshot.apply_unit_message)"""
+        parsed = parse_unit_topic(topic)
+        if parsed is None or not isinstance(payload, dict):
+            return
+        unit, heater, kind = parsed
+        if kind == 'sections' and isinstance(payload.get('sections'), list):
+            self.set_sections(unit, heater, payload['sections'], now)
+        elif kind == 'temperature':
+            entry = ((payload.get('data') or {}).get('payload') or {}).get('/processdatamaster/temperature') or {}
+            value = entry.get('data') if isinstance(entry, dict) else None
+            if isinstance(value, (int, float)):
+                self.record_temperature(unit, heater, float(value), now)
+
+    # Reports ----------------------------------------------------------------
+
+    def power_kw(self, port: int) -> Optional[float]:
+        if 0 < port <= len(self.section_power_kw):
+            return self.section_power_kw[port - 1]
+        return self.default_power_kw
+
+    def _energy(self, port: int, seconds: float) -> Optional[float]:
+        power = self.power_kw(port)
+        return None if power is None else round(power * seconds / 3600.0, 4)
+
+    def _band_labels(self) -> List[str]:
+        edges = [f"{edge:g}" for edge in self.bands]
+        return [f"<{edges[0]}"] + [f"{a}-{b}" for a, b in zip(edges, edges[1:])] + [f">={edges[-1]}"]
+
+    def heater_report(self, unit: str, heater: str, now: Optional[float] = None) -> Optional[Dict]:
+        now = time.monotonic() if now is None else now
+        stats = self.heaters.get((unit, heater))
+        if stats is None:
+            return None
+        self._accrue_temperature(stats, now)
+
+        sections = {}
+        window_totals = {str(int(w)): {'on_seconds': 0.0, 'energy_kwh': 0.0, 'switches': 0} for w in self.windows}
+        energy_total = 0.0
+        for port, section in sorted(stats.sections.items()):
+            self._accrue_section(section, now)
+            observed = now - section.first_seen
+            windows = {}
+            for window, on_rolling, switch_rolling in zip(self.windows, section.on_windows, section.switch_windows):
+                on = on_rolling.total(now)
+                span = min(on_rolling.span(now), observed)
+                key = str(int(window))
+                windows[key] = {
+                    'duty_cycle': round(on / span, 4) if span > 0 else None,
+                    'on_seconds': round(on, 1),
+                    'switches': int(switch_rolling.total(now)),
+                    'energy_kwh': self._energy(port, on),
+                }
+                window_totals[key]['on_seconds'] += on
+                window_totals[key]['switches'] += windows[key]['switches']
+                window_totals[key]['energy_kwh'] += windows[key]['energy_kwh'] or 0.0
+            energy = self._energy(port, section.on_seconds)
+            energy_total += energy or 0.0
+            sections[str(port)] = {
+                'state': section.on,
+                'on_seconds': round(section.on_seconds, 1),
+                'duty_cycle': round(section.on_seconds / observed, 4) if observed > 0 else None,
+                'switches': section.switches,
+                'energy_kwh': energy,
+                'windows': windows,
+            }
+
+        labels = self._band_labels()
+        return {
+            'unit': unit,
+            'heater': heater,
+            'observed_seconds': round(now - stats.first_seen, 1),
+            'temperature': stats.temperature,
+            'sections': sections,
+            'energy_kwh': round(energy_total, 4),
+            'windows': {key: dict(totals, energy_kwh=round(totals['energy_kwh'], 4),
+                                  on_seconds=round(totals['on_seconds'], 1))
+                        for key, totals in window_totals.items()},
+            'time_at_temperature': {
+                'total': {label: round(seconds, 1) for label, seconds in zip(labels, stats.band_seconds)},
+                **{str(int(w)): {label: round(rollings[i].total(now), 1) for label, rollings in zip(labels, stats.band_windows)}
+                   for i, w in enumerate(self.windows)},
+            },
+        }
+
+    def report(self, unit: Optional[str] = None, now: Optional[float] = None) -> Dict:
+        """Every heater (optionally of one unit) with unit and plant energy totals"""
+        now = time.monotonic() if now is None else now
+        units: Dict[str, Dict] = {}
+        for unit_name, heater in sorted(self.heaters):
+            if unit is not None and unit_name != unit:
+                continue
+            entry = units.setdefault(unit_name, {'heaters': {}, 'energy_kwh': 0.0})
+            heater_report = self.heater_report(unit_name, heater, now)
+            entry['heaters'][heater] = heater_report
+            entry['energy_kwh'] = round(entry['energy_kwh'] + heater_report['energy_kwh'], 4)
+        return {
+            'windows': [int(w) for w in self.windows],
+            'units': units,
+            'energy_kwh': round(sum(u['energy_kwh'] for u in units.values()), 4),
+        }
+
+
+def analytics_from_config(iolink_config: Dict) -> HeaterAnalytics:
+    config = iolink_config.get('analytics') or {}
+    return HeaterAnalytics(
+        windows=config.get('windows') or DEFAULT_WINDOWS,
+        section_power_kw=config.get('section_power_kw'),
+        bands=config.get('temperature_bands') or DEFAULT_BANDS,
+        buckets=int(config.get('buckets', 60)),
+    )
@@ -0,0 +1,258 @@
+"""
+PID autotuning by relay feedback (Åström–Hägglund).
+
+The heater's section outputs are driven as an on/off relay around the
+setpoint (with hysteresis), which makes the temperature settle into a limit
+cycle. Its amplitude `a` and period `Pu` give the ultimate gain
+
+    Ku = 4 d / (pi * sqrt(a^2 - h^2))
+
+where `d` is half the relay's output swing (in % of full heater power) and
+`h` the hysteresis. Standard rules turn (Ku, Pu) into PID gains; they are
+returned in the form the frontend controller uses (output % per °F, with
+integral and derivative taken per temperature sample).
+
+Tuned gains are stored per heater in `heater_config`.
+"""
+
+import logging
+import math
+import statistics
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Continuous Kp (x Ku), Ti (x Pu), Td (x Pu)
+TUNING_RULES = {
+    'ziegler_nichols': (0.6, 0.5, 0.125),
+    'some_overshoot': (1 / 3, 0.5, 1 / 3),
+    'no_overshoot': (0.2, 0.5, 1 / 3),
+    'tyreus_luyben': (1 / 2.2, 2.2, 1 / 6.3),
+}
+DEFAULT_RULE = 'tyreus_luyben'
+
+
+def tuning_rules(ku: float, pu: float, sample_period: float) -> Dict[str, Dict]:
+    """PID gains from every rule, per sample of `sample_period` seconds"""
+    gains = {}
+    for rule, (kp_factor, ti_factor, td_factor) in TUNING_RULES.items():
+        kp = kp_factor * ku
+        ti = ti_factor * pu
+        td = td_factor * pu
+        gains[rule] = {
+            'kp': round(kp, 4),
+            'ki': round(kp * sample_period / ti, 5),
+            'kd': round(kp * td / sample_period, 4),
+            'ti_seconds': round(ti, 1),
+            'td_seconds': round(td, 1),
+        }
+    return gains
+
+
+class RelayExperiment:
+    """Relay feedback state machine: feed temperatures, apply the returned relay state"""
+
+    def __init__(self, setpoint: float, hysteresis: float = 2.0, output_swing: float = 100.0,
+                 cycles: int = 3, max_seconds: float = 3600.0, max_temperature: Optional[float] = None,
+                 sample_period: float = 1.0, rule: str = DEFAULT_RULE):
+        if rule not in TUNING_RULES:
+            raise ValueError(f"Unknown tuning rule {rule}; use one of {', '.join(TUNING_RULES)}")
+        self.setpoint = setpoint
+        self.hysteresis = hysteresis
+        self.output_swing = output_swing
+        self.cycles = max(1, cycles)
+        self.max_seconds = max_seconds
+        self.max_temperature = max_temperature
+        self.sample_period = sample_period
+        self.rule = rule
+        self.state = 'running'
+        self.message = None
+        self.result: Optional[Dict] = None
+        self.relay: Optional[bool] = None
+        self.started: Optional[float] = None
+        self.samples = 0
+        self.on_times: List[float] = []
+        self.highs: List[float] = []
+        self.lows: List[float] = []
+        self.extreme: Optional[float] = None
+
+    def abort(self, message: str):
+        if self.state == 'running':
+            self._stop('failed', message)
+
+    def _stop(self, state: str, message: str) -> bool:
+        self.state = state
+        self.message = message
+        self.relay = False
+        return False
+
+    def update(self, temperature: float, now: float) -> Optional[bool]:
+        """Take one sample; returns the new relay state when it changes (False once finished)"""
+        if self.state != 'running':
+            return None
+        if self.started is None:
+            self.started = now
+        self.samples += 1
+        if self.max_temperature is not None and temperature >= self.max_temperature:
+            return self._stop('failed', f"Temperature {temperature:.1f} reached the limit {self.max_temperature:.1f}")
+        if now - self.started > self.max_seconds:
+            return self._stop('failed', f"No stable oscillation after {self.max_seconds:.0f} s "
+                                        f"({len(self.on_times)} cycles)")
+
+        if self.relay is None:
+            self.relay = temperature < self.setpoint
+            self.extreme = temperature
+            if self.relay:
+                self.on_times.append(now)
+            return self.relay
+
+        # Track the overshoot above the band while off and the dip below it while on
+        self.extreme = max(self.extreme, temperature) if not self.relay else min(self.extreme, temperature)
+        if self.relay and temperature > self.setpoint + self.hysteresis:
+            self.lows.append(self.extreme)
+            self.relay, self.extreme = False, temperature
+            return False
+        if not self.relay and temperature < self.setpoint - self.hysteresis:
+            self.highs.append(self.extreme)
+            self.relay, self.extreme = True, temperature
+            self.on_times.append(now)
+            if len(self.on_times) >= self.cycles + 2:
+                self._finish()
+                return False
+            return True
+        return None
+
+    def _finish(self):
+        # The first cycle includes the approach to the setpoint; use the ones after it
+        periods = [b - a for a, b in zip(self.on_times[1:], self.on_times[2:])]
+        highs = self.highs[1:]
+        lows = self.lows[1:]
+        amplitude = (statistics.mean(highs) - statistics.mean(lows)) / 2
+        pu = statistics.mean(periods)
+        if amplitude <= self.hysteresis or pu <= 0:
+            self._stop('failed', f"Oscillation amplitude {amplitude:.2f} is within the hysteresis; increase the setpoint band")
+            return
+        ku = 4 * (self.output_swing / 2) / (math.pi * math.sqrt(amplitude ** 2 - self.hysteresis ** 2))
+        gains = tuning_rules(ku, pu, self.sample_period)
+        self.result = {
+            'ultimate_gain': round(ku, 4),
+            'ultimate_period': round(pu, 2),
+            'amplitude': round(amplitude, 2),
+            'period_spread': round(statistics.pstdev(periods) / pu, 3) if len(periods) > 1 else 0.0,
+            'cycles': len(periods),
+            'rule': self.rule,
+            **{k: gains[self.rule][k] for k in ('kp', 'ki', 'kd')},
+            'rules': gains,
+        }
+        self._stop('done', f"Ku {ku:.3f}, Pu {pu:.1f} s from {len(periods)} cycles")
+
+    def report(self, now: Optional[float] = None) -> Dict:
+        return {
+            'state': self.state,
+            'message': self.message,
+            'setpoint': self.setpoint,
+            'hysteresis': self.hysteresis,
+            'relay': self.relay,
+            'samples': self.samples,
+            'cycles_completed': max(0, len(self.on_times) - 1),
+            'cycles_needed': self.cycles + 1,
+            'elapsed_seconds': round(now - self.started, 1) if now is not None and self.started is not None else None,
+            'result': self.result,
+        }
+
+
+_heater_config = None
+TUNING_COLUMNS = ('pid_kp', 'pid_ki', 'pid_kd', 'ultimate_gain', 'ultimate_period', 'tuning_rule', 'tuned_at')
+
+
+def heater_config_table():
+    """The tuning columns of heater_config (the table itself comes from database-schema-v1.02.sql)"""
+    global _heater_config
+    if _heater_config is None:
+        from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table
+
+        _heater_config = Table(
+            'heater_config', MetaData(),
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('unit_number', Integer, nullable=False),
+            Column('heater_type', String(10), nullable=False),
+            Column('pid_kp', Float),
+            Column('pid_ki', Float),
+            Column('pid_kd', Float),
+            Column('ultimate_gain', Float),
+            Column('ultimate_period', Float),
+            Column('tuning_rule', String(30)),
+            Column('tuned_at', DateTime(timezone=True)),
+        )
+    return _heater_config
+
+
+class TuningStore:
+    """Reads and writes tuned gains in heater_config; blocking, call from a worker thread"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = None
+
+    def open(self):
+        from sqlalchemy import create_engine, inspect, text
+
+        table = heater_config_table()
+        engine = create_engine(self.url)
+        inspector = inspect(engine)
+        if not inspector.has_table('heater_config'):
+            table.metadata.create_all(engine, tables=[table])
+        else:
+            existing = {column['name'] for column in inspector.get_columns('heater_config')}
+            with engine.begin() as conn:
+                for column in table.columns:
+                    if column.name in TUNING_COLUMNS and column.name not in existing:
+                        conn.execute(text(f"ALTER TABLE heater_config ADD COLUMN {column.name} "
+                                          f"{column.type.compile(engine.dialect)}"))
+        self.engine = engine
+
+    def save(self, unit_number: int, heater_type: str, result: Dict) -> bool:
+        """Store gains on the heater's row; False if heater_config has no row for it"""
+        if self.engine is None:
+            self.open()
+        table = heater_config_table()
+        values = {
+            'pid_kp': result['kp'], 'pid_ki': result['ki'], 'pid_kd': result['kd'],
+            'ultimate_gain': result['ultimate_gain'], 'ultimate_period': result['ultimate_period'],
+            'tuning_rule': result['rule'], 'tuned_at': datetime.now(timezone.utc),
+        }
+        where = (table.c.unit_number == unit_number) & (table.c.heater_type == heater_type)
+        with self.engine.begin() as conn:
+            if conn.execute(table.update().where(where).values(**values)).rowcount:
+                return True
+            try:
+                with conn.begin_nested():
+                    conn.execute(table.insert().values(unit_number=unit_number, heater_type=heater_type, **values))
+                return True
+            except Exception as e:
+                # The full schema needs device details (MAC, IP) the backend does not own
+                logger.warning(f"No heater_config row for unit {unit_number} heater {heater_type}: "
+                               f"{str(e).splitlines()[0]}")
+                return False
+
+    def load(self, unit_number: int, heater_type: str) -> Optional[Dict]:
+        if self.engine is None:
+            self.open()
+        table = heater_config_table()
+        where = (table.c.unit_number == unit_number) & (table.c.heater_type == heater_type)
+        with self.engine.connect() as conn:
+            row = conn.execute(table.select().where(where)).mappings().first()
+        if row is None or row['pid_kp'] is None:
+            return None
+        return {
+            'kp': row['pid_kp'], 'ki': row['pid_ki'], 'kd': row['pid_kd'],
+            'ultimate_gain': row['ultimate_gain'], 'ultimate_period': row['ultimate_period'],
+            'rule': row['tuning_rule'], 'tuned_at': row['tuned_at'].isoformat() if row['tuned_at'] else None,
+        }
+
+
+def heater_type(heater_name: str) -> str:
+    """heater_config.heater_type for a heater name (htr_a -> A)"""
+    return heater_name.split('_')[-1].upper()
+
@@ -0,0 +1,92 @@
+"""
+Multi-worker coordination.
+
+With `uvicorn --workers N` every worker runs its own copy of main.py, so
+without coordination every worker would poll every master. In cluster mode
+each worker competes for a per-master lease (an exclusive flock on a file in
+a shared directory); only the holder polls and subscribes that master. The
+OS drops the lock when a worker dies, so another worker takes over on its
+next cycle.
+
+State is shared over the local MQTT broker: whichever worker ingests a
+reading or relays a command broadcasts it on the cluster topic, and the
+other workers apply it to their in-memory state without re-publishing.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import re
+import socket
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class MasterLeases:
+    """Per-master leadership via non-blocking exclusive file locks"""
+
+    def __init__(self, lock_dir: str):
+        self.lock_dir = lock_dir
+        self.files: Dict[str, int] = {}
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.lock_dir, f"master-{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.lock")
+
+    def try_acquire(self, key: str) -> bool:
+        """True if this process leads `key`, acquiring the lease if it is free"""
+        if key in self.files:
+            return True
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, worker_id().encode())
+        self.files[key] = fd
+        logger.info(f"Worker {worker_id()} is now leader for master {key}")
+        return True
+
+    def holder(self, key: str) -> Optional[str]:
+        """Worker ID recorded by the current (or last) leader of `key`"""
+        try:
+            with open(self._path(key)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def release_all(self):
+        for key, fd in self.files.items():
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+            except OSError as e:
+                logger.error(f"Error releasing lease for {key}: {e}")
+        self.files.clear()
+
+
+class ClusterChannel:
+    """State broadcast between workers over MQTT"""
+
+    def __init__(self, client, topic: str):
+        self.client = client
+        self.topic = topic
+        self.worker = worker_id()
+
+    def publish(self, kind: str, **fields):
+        message = dict(fields, type=kind, worker=self.worker)
+        self.client.publish(self.topic, json.dumps(message, separators=(',', ':')), qos=0)
+
+    def decode(self, payload) -> Optional[Dict]:
+        """The message if it came from another worker, else None"""
+        if not isinstance(payload, dict) or payload.get('worker') == self.worker:
+            return None
+        return payload
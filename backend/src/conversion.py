@@ -0,0 +1,163 @@
+"""
+Bulk decoding of IO-Link process data.
+
+A poll cycle's worth of pdin payloads is packed into one byte matrix and
+every configured signal is extracted, sign-extended and scaled with NumPy in
+a single pass, instead of converting each reading by hand.
+
+Bit offsets follow the IO-Link/IODD convention: the payload is read as one
+big-endian integer and `bit_offset` counts from its least significant bit.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Payload = Union[str, bytes, bytearray]
+
+
+@dataclass(frozen=True)
+class SignalSpec:
+    """Layout and scaling of one value inside a process data payload"""
+    name: str
+    bit_offset: int = 0
+    bit_length: int = 16
+    signed: bool = False
+    scale: float = 1.0
+    offset: float = 0.0
+
+
+class ProcessDataDecoder:
+    """Decodes batches of fixed-length process data payloads"""
+
+    def __init__(self, signals: Sequence[SignalSpec], length: int):
+        if length < 1 or length > 32:
+            raise ValueError(f"Process data length must be 1-32 bytes, got {length}")
+        for spec in signals:
+            if spec.bit_length < 1 or spec.bit_length > 56:
+                raise ValueError(f"Signal {spec.name}: bit_length must be 1-56")
+            if spec.bit_offset < 0 or spec.bit_offset + spec.bit_length > length * 8:
+                raise ValueError(f"Signal {spec.name} does not fit in {length} bytes of process data")
+
+        self.signals = list(signals)
+        self.length = length
+        self.names = [spec.name for spec in self.signals]
+        self.scales = np.array([spec.scale for spec in self.signals], dtype=np.float64)
+        self.offsets = np.array([spec.offset for spec in self.signals], dtype=np.float64)
+
+        # Precompute the byte window, shift and mask for each signal
+        self._fields = []
+        for spec in self.signals:
+            first = length - 1 - (spec.bit_offset + spec.bit_length - 1) // 8
+            last = length - spec.bit_offset // 8
+            self._fields.append((first, last, np.uint64(spec.bit_offset % 8),
+                                 np.uint64((1 << spec.bit_length) - 1), spec.signed, spec.bit_length))
+
+    def normalize(self, payload: Payload) -> bytes:
+        """Return the payload as exactly `length` bytes, left-padded like zfill"""
+        if isinstance(payload, str):
+            width = self.length * 2
+            payload = bytes.fromhex(payload.strip().replace('0x', '').replace(' ', '').zfill(width)[-width:])
+        payload = bytes(payload)
+        if len(payload) >= self.length:
+            return payload[-self.length:]
+        return payload.rjust(self.length, b'\x00')
+
+    def to_matrix(self, payloads: Sequence[Payload]) -> Tuple[np.ndarray, np.ndarray]:
+        """Pack payloads into an (n, length) uint8 matrix plus a validity mask"""
+        n = len(payloads)
+        valid = np.ones(n, dtype=bool)
+        width = self.length * 2
+        try:
+            # Fast path: one join and one fromhex for the whole batch
+            text = ''.join(p.replace('0x', '').zfill(width)[-width:] for p in payloads)
+            buffer = bytes.fromhex(text)
+        except (TypeError, ValueError):
+            chunks = []
+            for i, payload in enumerate(payloads):
+                try:
+                    chunks.append(self.normalize(payload))
+                except (TypeError, ValueError):
+                    valid[i] = False
+                    chunks.append(bytes(self.length))
+            buffer = b''.join(chunks)
+        return np.frombuffer(buffer, dtype=np.uint8).reshape(n, self.length), valid
+
+    def decode_matrix(self, matrix: np.ndarray) -> np.ndarray:
+        """Extract every signal from an (n, length) byte matrix as raw integers"""
+        n = matrix.shape[0]
+        raw = np.empty((n, len(self.signals)), dtype=np.int64)
+        window = np.zeros((n, 8), dtype=np.uint8)
+        for column, (first, last, shift, mask, signed, bit_length) in enumerate(self._fields):
+            size = last - first
+            window[:, :8 - size] = 0
+            window[:, 8 - size:] = matrix[:, first:last]
+            words = (window.view('>u8').ravel() >> shift) & mask
+            values = words.astype(np.int64)
+            if signed:
+                sign_bit = np.int64(1) << np.int64(bit_length - 1)
+                values = np.where(values & sign_bit, values - (sign_bit << np.int64(1)), values)
+            raw[:, column] = values
+        return raw
+
+    def decode(self, payloads: Sequence[Payload]) -> np.ndarray:
+        """Decode payloads to scaled values, shape (n, signals).
+
+        Rows for payloads that cannot be parsed are NaN.
+        """
+        if not len(payloads):
+            return np.empty((0, len(self.signals)), dtype=np.float64)
+        matrix, valid = self.to_matrix(payloads)
+        values = self.decode_matrix(matrix) * self.scales + self.offsets
+        if not valid.all():
+            values[~valid] = np.nan
+        return values
+
+    def decode_dicts(self, payloads: Sequence[Payload]) -> List[Dict[str, float]]:
+        """Decode payloads to one {signal name: value} dict per payload"""
+        return [dict(zip(self.names, row)) for row in self.decode(payloads).tolist()]
+
+
+def decoder_from_config(device_config: Dict, default_name: str = 'value') -> ProcessDataDecoder:
+    """Build a decoder from a device entry in iolink_config.yml.
+
+    Devices without a `process_data` section are treated as a single
+    unsigned 16-bit value scaled by `scaling_factor`.
+    """
+    default_scale = float(device_config.get('scaling_factor', 1.0))
+    process_data = device_config.get('process_data') or {}
+    length = int(process_data.get('length', 2))
+    signal_configs = process_data.get('signals') or {default_name: {'bit_length': length * 8}}
+
+    signals = []
+    for name, cfg in signal_configs.items():
+        cfg = cfg or {}
+        signals.append(SignalSpec(
+            name=name,
+            bit_offset=int(cfg.get('bit_offset', 0)),
+            bit_length=int(cfg.get('bit_length', 16)),
+            signed=bool(cfg.get('signed', False)),
+            scale=float(cfg.get('scale', default_scale)),
+            offset=float(cfg.get('offset', 0.0)),
+        ))
+    return ProcessDataDecoder(signals, length)
+
+
+def decoders_from_config(iolink_config: Dict) -> Dict[str, ProcessDataDecoder]:
+    """Build a decoder for every device in the IO-Link configuration that has process data"""
+    decoders = {}
+    for device_name, device_config in (iolink_config.get('devices') or {}).items():
+        if not isinstance(device_config, dict):
+            continue
+        if 'process_data' not in device_config and 'scaling_factor' not in device_config:
+            continue
+        try:
+            decoders[device_name] = decoder_from_config(device_config, default_name=device_config.get('data_type', 'value'))
+        except (TypeError, ValueError) as e:
+            logger.error(f"Invalid process data configuration for {device_name}: {e}")
+    return decoders
+
@@ -0,0 +1,170 @@
+"""
+Event-loop health and on-demand profiling.
+
+LoopMonitor wakes every `interval` seconds on the event loop and records how
+late it woke (loop lag). A watchdog thread checks the loop's heartbeat; when
+the loop has been silent for longer than `stall_threshold` it captures the
+loop thread's stack, i.e. the callback that is blocking it, and the stall is
+reported with that stack once the loop wakes up again.
+
+SamplingProfiler samples thread stacks from a background thread for a bounded
+time and returns them in collapsed form (`frame;frame;frame count` per line),
+ready for flamegraph.pl, speedscope or inferno. The sampler needs the GIL to
+take a sample, so CPU-bound stretches show up as they should, while very
+short slices between blocking calls are under-sampled.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def format_stack(frame, limit: int = 30) -> List[str]:
+    return [line.rstrip() for line in traceback.format_stack(frame, limit=limit)]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+class LoopMonitor:
+    """Loop lag statistics and stalls (with the blocking stack) for one event loop"""
+
+    def __init__(self, interval: float = 0.1, stall_threshold: float = 0.25, history: int = 50, window: int = 600):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.lags: Deque[float] = collections.deque(maxlen=window)
+        self.stalls: Deque[Dict] = collections.deque(maxlen=history)
+        self.stats = {'samples': 0, 'stalls': 0, 'max_lag_ms': 0.0}
+        self.heartbeat = time.monotonic()
+        self.thread_id: Optional[int] = None
+        self.captured: Optional[Dict] = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    async def run(self):
+        self.thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(0.0, now - expected)
+                with self.lock:
+                    self.heartbeat = now
+                    captured, self.captured = self.captured, None
+                self.lags.append(lag)
+                self.stats['samples'] += 1
+                self.stats['max_lag_ms'] = max(self.stats['max_lag_ms'], round(lag * 1000, 1))
+                if lag >= self.stall_threshold:
+                    self._record_stall(lag, captured)
+        finally:
+            self.stopped.set()
+
+    def _watch(self):
+        period = max(0.01, self.stall_threshold / 2)
+        while not self.stopped.wait(period):
+            with self.lock:
+                silent = time.monotonic() - self.heartbeat
+                if self.captured is not None or silent < self.interval + self.stall_threshold:
+                    continue
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    self.captured = {'after_ms': round(silent * 1000, 1), 'stack': format_stack(frame)}
+
+    def _record_stall(self, lag: float, captured: Optional[Dict]):
+        stall = {
+            'at': time.time(),
+            'lag_ms': round(lag * 1000, 1),
+            'stack': captured['stack'] if captured else None,
+        }
+        self.stalls.append(stall)
+        self.stats['stalls'] += 1
+        where = captured['stack'][-1].splitlines()[0].strip() if captured else "stack not captured"
+        logger.warning(f"Event loop blocked for {stall['lag_ms']:.0f} ms: {where}")
+
+    def stop(self):
+        self.stopped.set()
+
+    def report(self, stacks: bool = True) -> Dict:
+        lags = [lag * 1000 for lag in self.lags]
+        return {
+            'interval_ms': round(self.interval * 1000),
+            'stall_threshold_ms': round(self.stall_threshold * 1000),
+            **self.stats,
+            'lag_ms': {
+                'p50': round(percentile(lags, 50), 2) if lags else None,
+                'p99': round(percentile(lags, 99), 2) if lags else None,
+                'max': round(max(lags), 2) if lags else None,
+                'window': len(lags),
+            },
+            'recent_stalls': [stall if stacks else dict(stall, stack=None) for stall in reversed(self.stalls)],
+        }
+
+
+class SamplingProfiler:
+    """Time-bounded stack sampling of the running process, one profile at a time"""
+
+    def __init__(self, max_seconds: float = 60.0):
+        self.max_seconds = max_seconds
+        self.lock = threading.Lock()
+        self.labels: Dict = {}
+
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    def _label(self, code) -> str:
+        label = self.labels.get(code)
+        if label is None:
+            label = f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(';', ':').replace(' ', '_')
+            self.labels[code] = label
+        return label
+
+    def profile(self, seconds: float, interval: float = 0.005, thread_ids: Optional[List[int]] = None) -> Dict:
+        """Sample for `seconds` every `interval`; returns collapsed stacks and sampling stats"""
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            seconds = min(max(seconds, 0.1), self.max_seconds)
+            interval = max(interval, 0.001)
+            own = threading.get_ident()
+            names = {t.ident: t.name.replace(';', ':').replace(' ', '_') for t in threading.enumerate()}
+            counts: Dict[str, int] = collections.Counter()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own or (thread_ids is not None and thread_id not in thread_ids):
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                    counts[';'.join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(interval)
+            elapsed = time.perf_counter() - started
+        finally:
+            self.lock.release()
+        return {
+            'collapsed': ''.join(f"{stack} {count}\n" for stack, count in counts.most_common()),
+            'samples': samples,
+            'seconds': round(elapsed, 3),
+            'rate_hz': round(samples / elapsed, 1) if elapsed > 0 else None,
+        }
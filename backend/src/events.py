@@ -0,0 +1,168 @@
+"""
+IO-Link master event subscriptions.
+
+Instead of polling pdin every second, the backend can ask each master to
+push its own `datachanged` (or `timer[1]/counter`) notifications to a
+callback. The callback is either this backend's HTTP endpoint or an MQTT
+topic (`mqtt://host:port/topic`), both of which feed the same ingest
+pipeline as polling.
+"""
+
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+PDIN_KEY = re.compile(r'^/?iolinkmaster/port\[(\d+)\]/iolinkdevice/pdin$')
+
+
+def pdin_path(port) -> str:
+    return f"/iolinkmaster/port[{port}]/iolinkdevice/pdin"
+
+
+def subscription_address(port, source: str = 'datachanged') -> str:
+    """Data point the master watches for a subscription"""
+    if source == 'timer':
+        return "/timer[1]/counter/datachanged"
+    return f"{pdin_path(port)}/datachanged"
+
+
+def subscribe_request(ports: List, callback: str, source: str = 'datachanged', cid: int = 4711) -> List[Dict]:
+    """Build the master's JSON subscribe requests for a set of ports.
+
+    A timer subscription carries every port's pdin in one event, so it needs
+    a single request; datachanged needs one per port.
+    """
+    datatosend = [pdin_path(p) for p in ports]
+    if source == 'timer':
+        return [{
+            'code': 'request',
+            'cid': cid,
+            'adr': f"{subscription_address(None, 'timer')}/subscribe",
+            'data': {'callback': callback, 'datatosend': datatosend, 'duration': 'lifetime'},
+        }]
+    return [{
+        'code': 'request',
+        'cid': cid + i,
+        'adr': f"{subscription_address(port)}/subscribe",
+        'data': {'callback': callback, 'datatosend': [pdin_path(port)], 'duration': 'lifetime'},
+    } for i, port in enumerate(ports)]
+
+
+def heater_key(heater: Dict) -> Tuple[str, str, int]:
+    return heater['name'], heater['ip'], int(heater['port'])
+
+
+def parse_event(event: Dict) -> Tuple[Optional[str], List[Tuple[int, str]]]:
+    """Extract the source device ID and (port, raw pdin hex) pairs from a pushed event"""
+    if not isinstance(event, dict) or event.get('code') != 'event':
+        return None, []
+    data = event.get('data') or {}
+    srcurl = data.get('srcurl') or ''
+    device_id = srcurl.split('/', 1)[0].upper() or None
+
+    readings = []
+    for key, entry in (data.get('payload') or {}).items():
+        match = PDIN_KEY.match(key)
+        if not match or not isinstance(entry, dict) or entry.get('code') != 200:
+            continue
+        value = entry.get('data')
+        if isinstance(value, str):
+            readings.append((int(match.group(1)), value.replace('0x', '').zfill(4).upper()))
+    return device_id, readings
+
+
+class EventSubscriptions:
+    """Tracks pushed-event freshness per heater and (re)subscribes masters"""
+
+    def __init__(self, callback: str, source: str = 'datachanged', stale_after: float = 5.0,
+                 resubscribe_every: float = 300.0, timer_interval_ms: int = 1000):
+        self.callback = callback
+        self.source = source
+        self.stale_after = stale_after
+        self.resubscribe_every = resubscribe_every
+        self.timer_interval_ms = timer_interval_ms
+        self.heaters: Dict[Tuple[str, int], List[Dict]] = {}
+        self.last_event: Dict[Tuple[str, str, int], float] = {}
+        self.last_subscribe: Dict[Tuple[str, int], float] = {}
+
+    def register(self, heater: Dict):
+        """Route events for a heater's (device ID, port) to that heater"""
+        key = (heater['device_id'].upper(), int(heater['port']))
+        heaters = self.heaters.setdefault(key, [])
+        if heater not in heaters:
+            heaters.append(heater)
+
+    def match(self, device_id: Optional[str], port: int) -> List[Dict]:
+        if device_id is None:
+            return []
+        return self.heaters.get((device_id, port), [])
+
+    def mark(self, heater: Dict):
+        self.last_event[heater_key(heater)] = time.monotonic()
+
+    def is_fresh(self, heater: Dict) -> bool:
+        """True while events keep arriving for the heater, so it need not be polled"""
+        last = self.last_event.get(heater_key(heater))
+        return last is not None and time.monotonic() - last < self.stale_after
+
+    def needs_subscribe(self, heater: Dict) -> bool:
+        last = self.last_subscribe.get((heater['ip'], int(heater['port'])))
+        if last is None:
+            return True
+        age = time.monotonic() - last
+        return age > self.resubscribe_every or (not self.is_fresh(heater) and age > self.stale_after)
+
+    async def subscribe(self, session: aiohttp.ClientSession, master_ip: str, ports: List) -> bool:
+        """Register this backend's callback with a master; returns True if all requests succeeded"""
+        url = f"http://{master_ip}/"
+        ok = True
+        try:
+            if self.source == 'timer':
+                interval = {'code': 'request', 'cid': 4710, 'adr': '/timer[1]/interval/setdata',
+                            'data': {'newvalue': self.timer_interval_ms}}
+                async with session.post(url, json=interval, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                    await resp.read()
+
+            for request in subscribe_request(ports, self.callback, self.source):
+                async with session.post(url, json=request, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                    data = await resp.json(content_type=None)
+                    if resp.status != 200 or data.get('code') != 200:
+                        logger.error(f"Event subscription {request['adr']} on {master_ip} failed: {data}")
+                        ok = False
+        except Exception as e:
+            logger.error(f"Error subscribing to events on {master_ip}: {e}")
+            ok = False
+
+        now = time.monotonic()
+        for port in ports:
+            self.last_subscribe[(master_ip, int(port))] = now
+        if ok:
+            logger.info(f"Subscribed to {self.source} events on {master_ip} ports {ports} -> {self.callback}")
+        return ok
+
+    async def unsubscribe(self, session: aiohttp.ClientSession, master_ip: str, ports: List):
+        url = f"http://{master_ip}/"
+        addresses = {subscription_address(p, self.source) for p in ports}
+        for cid, address in enumerate(sorted(addresses), start=4800):
+            request = {'code': 'request', 'cid': cid, 'adr': f"{address}/unsubscribe",
+                       'data': {'callback': self.callback}}
+            try:
+                async with session.post(url, json=request, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                    await resp.read()
+            except Exception as e:
+                logger.error(f"Error unsubscribing {address} on {master_ip}: {e}")
+        for port in ports:
+            self.last_subscribe.pop((master_ip, int(port)), None)
+
+
+def mqtt_callback_topic(callback: str) -> Optional[str]:
+    """Topic to subscribe to when the master publishes events over MQTT"""
+    if callback.startswith('mqtt://'):
+        parts = callback[len('mqtt://'):].split('/', 1)
+        return parts[1] if len(parts) > 1 and parts[1] else None
+    return None
@@ -0,0 +1,310 @@
+"""
+Temperature history storage and streaming export.
+
+Readings are buffered in memory and written in batches from a worker
+thread. Exports page through the table with keyset pagination (one bounded
+query per page, run off the event loop), so a month of 1 Hz data streams
+out in constant memory without holding up the live endpoints. Rows older
+than the retention period are deleted periodically in small chunks.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_temperature_history = None
+
+
+def history_table():
+    """The temperature_history table; SQLAlchemy is imported on first use to keep it off the startup path"""
+    global _temperature_history
+    if _temperature_history is None:
+        from sqlalchemy import BigInteger, Column, DateTime, Float, Index, Integer, MetaData, String, Table
+
+        _temperature_history = Table(
+            'temperature_history', MetaData(),
+            Column('id', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True),
+            Column('unit', String(50), nullable=False),
+            Column('heater', String(10), nullable=False),
+            Column('recorded_at', DateTime(timezone=True), nullable=False),
+            Column('value', Float, nullable=False),
+            Column('raw_value', String(64)),
+            Index('idx_temperature_history_unit_time', 'unit', 'recorded_at', 'id'),
+            Index('idx_temperature_history_heater_time', 'unit', 'heater', 'recorded_at', 'id'),
+        )
+    return _temperature_history
+
+EXPORT_COLUMNS = ['unit', 'heater', 'timestamp', 'value', 'raw_value']
+
+EXPORT_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def history_database_url(default: Optional[str] = "sqlite:///history.db") -> Optional[str]:
+    return os.getenv("HISTORY_DATABASE_URL") or os.getenv("DATABASE_URL") or default
+
+
+class HistoryStore:
+    """Batched writer and paged reader for the temperature_history table"""
+
+    def __init__(self, url: str, batch_size: int = 500, flush_interval: float = 2.0,
+                 max_buffer: int = 100000, export_concurrency: int = 2):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.engine = None
+        self.buffer: List[Dict] = []
+        self.dropped = 0
+        self.export_slots = asyncio.Semaphore(export_concurrency)
+
+    def open(self):
+        """Connect and create the history table if it does not exist"""
+        from sqlalchemy import create_engine
+
+        table = history_table()
+        engine = create_engine(self.url, pool_pre_ping=True, pool_size=4, max_overflow=2) \
+            if not self.url.startswith('sqlite') else create_engine(self.url)
+        table.metadata.create_all(engine, tables=[table])
+        self.engine = engine
+        logger.info(f"History store ready ({self.engine.url.render_as_string(hide_password=True)})")
+
+    @property
+    def enabled(self) -> bool:
+        return self.engine is not None
+
+    def record(self, unit: str, heater: str, value: float, raw_value: Optional[str] = None,
+               recorded_at: Optional[datetime] = None):
+        """Queue one reading for the next batch write"""
+        if not self.enabled:
+            return
+        if len(self.buffer) >= self.max_buffer:
+            # Database unreachable for a long time; drop the oldest rather than grow without bound
+            del self.buffer[:self.batch_size]
+            self.dropped += self.batch_size
+        self.buffer.append({
+            'unit': unit,
+            'heater': heater,
+            'recorded_at': recorded_at or datetime.now(timezone.utc),
+            'value': value,
+            'raw_value': raw_value,
+        })
+
+    def _insert(self, rows: List[Dict]):
+        with self.engine.begin() as conn:
+            conn.execute(history_table().insert(), rows)
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        try:
+            await asyncio.to_thread(self._insert, rows)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} history rows: {e}")
+            # Keep them for the next attempt
+            self.buffer[:0] = rows
+
+    def purge(self, older_than: datetime, chunk: int = 10000) -> int:
+        """Delete rows recorded before `older_than`, `chunk` rows per transaction; returns the number deleted"""
+        from sqlalchemy import delete, select
+
+        t = history_table()
+        deleted = 0
+        while True:
+            oldest = select(t.c.id).where(t.c.recorded_at < older_than).limit(chunk)
+            with self.engine.begin() as conn:
+                count = conn.execute(delete(t).where(t.c.id.in_(oldest.scalar_subquery()))).rowcount
+            deleted += count
+            if count < chunk:
+                return deleted
+
+    async def run_retention(self, days: float, interval: float = 3600.0):
+        """Background task deleting rows older than `days`, every `interval` seconds"""
+        while True:
+            if self.enabled:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+                try:
+                    deleted = await asyncio.to_thread(self.purge, cutoff)
+                    if deleted:
+                        logger.info(f"Purged {deleted} history rows older than {days:g} days")
+                except Exception as e:
+                    logger.error(f"Error purging history: {e}")
+            await asyncio.sleep(interval)
+
+    async def run_writer(self):
+        """Background task flushing buffered readings"""
+        while True:
+            started = time.monotonic()
+            while len(self.buffer) < self.batch_size and time.monotonic() - started < self.flush_interval:
+                await asyncio.sleep(0.2)
+            await self.flush()
+
+    def fetch_page(self, unit: str, heaters: Optional[List[str]], start: datetime, end: datetime,
+                   after: Optional[Tuple[datetime, int]], limit: int) -> List[Tuple]:
+        """Return the next page of rows ordered by (recorded_at, id)"""
+        from sqlalchemy import select, tuple_
+
+        t = history_table()
+        query = select(t.c.unit, t.c.heater, t.c.recorded_at, t.c.value, t.c.raw_value, t.c.id) \
+            .where(t.c.unit == unit, t.c.recorded_at >= start, t.c.recorded_at < end)
+        if heaters:
+            query = query.where(t.c.heater.in_(heaters))
+        if after is not None:
+            query = query.where(tuple_(t.c.recorded_at, t.c.id) > tuple_(*after))
+        query = query.order_by(t.c.recorded_at, t.c.id).limit(limit)
+        with self.engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(query)]
+
+    async def iter_pages(self, unit: str, heaters: Optional[List[str]], start: datetime, end: datetime,
+                         page_size: int = 5000) -> AsyncIterator[List[Tuple]]:
+        """Yield pages of (unit, heater, recorded_at, value, raw_value) rows.
+
+        Each page is a separate query in a worker thread; only one page is
+        held in memory at a time.
+        """
+        after = None
+        async with self.export_slots:
+            while True:
+                rows = await asyncio.to_thread(self.fetch_page, unit, heaters, start, end, after, page_size)
+                if not rows:
+                    return
+                last = rows[-1]
+                after = (last[2], last[5])
+                yield [row[:5] for row in rows]
+                if len(rows) < page_size:
+                    return
+
+
+def _timestamp(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.isoformat()
+
+
+def encode_csv(pages: AsyncIterator[List[Tuple]]) -> AsyncIterator[bytes]:
+    async def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        async for rows in pages:
+            for unit, heater, recorded_at, value, raw_value in rows:
+                writer.writerow([unit, heater, _timestamp(recorded_at), value, raw_value or ''])
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+    return generate()
+
+
+def encode_ndjson(pages: AsyncIterator[List[Tuple]]) -> AsyncIterator[bytes]:
+    async def generate():
+        async for rows in pages:
+            yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, (
+                unit, heater, _timestamp(recorded_at), value, raw_value)))) + '\n'
+                for unit, heater, recorded_at, value, raw_value in rows).encode()
+    return generate()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        chunk = bytes(data)
+        self.chunks.append(chunk)
+        self.position += len(chunk)
+        return len(chunk)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def _arrow_table(pa, rows: List[Tuple]):
+    unit, heater, recorded_at, value, raw_value = zip(*rows)
+    return pa.table({
+        'unit': pa.array(unit, pa.string()),
+        'heater': pa.array(heater, pa.string()),
+        'timestamp': pa.array([r if r.tzinfo else r.replace(tzinfo=timezone.utc) for r in recorded_at],
+                              pa.timestamp('ms', tz='UTC')),
+        'value': pa.array(value, pa.float64()),
+        'raw_value': pa.array(raw_value, pa.string()),
+    })
+
+
+def _arrow_schema(pa):
+    return pa.schema([('unit', pa.string()), ('heater', pa.string()),
+                      ('timestamp', pa.timestamp('ms', tz='UTC')), ('value', pa.float64()),
+                      ('raw_value', pa.string())])
+
+
+def encode_arrow(pages: AsyncIterator[List[Tuple]]) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+
+    async def generate():
+        sink = _ChunkSink()
+        with pa.ipc.new_stream(sink, _arrow_schema(pa)) as writer:
+            async for rows in pages:
+                writer.write_table(_arrow_table(pa, rows))
+                yield sink.drain()
+        yield sink.drain()
+    return generate()
+
+
+def encode_parquet(pages: AsyncIterator[List[Tuple]]) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    async def generate():
+        sink = _ChunkSink()
+        # One row group per page; the footer is written when the writer closes
+        with pq.ParquetWriter(sink, _arrow_schema(pa)) as writer:
+            async for rows in pages:
+                writer.write_table(_arrow_table(pa, rows))
+                yield sink.drain()
+        yield sink.drain()
+    return generate()
+
+
+ENCODERS = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson,
+    'arrow': encode_arrow,
+    'parquet': encode_parquet,
+}
+
+
+def parse_time(value: Optional[str], default: datetime) -> datetime:
+    """Parse an ISO 8601 timestamp or epoch seconds; naive values are taken as UTC"""
+    if not value:
+        return default
+    try:
+        parsed = datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
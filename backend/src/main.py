@@ -1,14 +1,37 @@
 from fastapi import FastAPI, WebSocket, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import paho.mqtt.client as mqtt
-from pycomm3 import LogixDriver
 import json
 import os
 import asyncio
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import logging
 import yaml
 import aiohttp
+import hmac
+import math
+import threading
+import time
+from types import SimpleNamespace
+
+from .conversion import decoder_from_config, decoders_from_config
+from .diagnostics import LoopMonitor, SamplingProfiler
+from .events import EventSubscriptions, mqtt_callback_topic, parse_event, pdin_path
+from .alarms import AlarmEngine, rules_from_config
+from .analytics import analytics_from_config
+from .autotune import DEFAULT_RULE, RelayExperiment, TuningStore, heater_type
+from .cluster import ClusterChannel, MasterLeases
+from .parameters import ISDU_NAMES, BatchSupport, ParameterCache, parameter_name
+from .history import EXPORT_MEDIA_TYPES, ENCODERS, HistoryStore, history_database_url, parse_time
+from .readings import SignalRegistry
+from .recorder import COMMAND, EVENT, IOLINK, IOLINK_ERROR, MQTT, SessionRecorder, replay_session
+from .scheduler import TickScheduler
+from .sensors import SensorModel, sensor_key
+from .throttle import ClientRateLimitMiddleware, RateLimiter, SingleFlight, TTLCache
+from .wire import CompactEncoder, SignalTable
+from .spool import SegmentLog, acquire_spool_dir
+from .snapshot import SnapshotStore, apply_unit_message, parse_unit_topic
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,8 +48,14 @@ except Exception as e:
     logger.error(f"Error loading IO-Link configuration: {e}")
     iolink_config = {"devices": {}}
 
-# Store latest temperature readings
-latest_readings = {}
+# Latest readings and a short ring of recent samples per signal (heater temperature)
+reading_signals = SignalRegistry(ring_size=int(os.getenv("READING_RING_SIZE", "64")))
+
+# Versioned view of every unit/heater for /api/snapshot
+snapshot_store = SnapshotStore(stale_after=float(os.getenv("SNAPSHOT_STALE_SECONDS", "10")))
+# Follow other units' temperature/section topics so one backend can serve a plant overview
+snapshot_unit_topics = ["instrument/+/+/temperature", "instrument/+/+/sections"] \
+    if os.getenv("SNAPSHOT_MQTT_UNITS", "true").lower() != "false" else []
 
 # Add temporary logging helper
 def log_important(message: str):
@@ -35,6 +64,32 @@ def log_important(message: str):
     logger.info(f"[{timestamp}] {message}")
     print(f"[{timestamp}] BACKEND: {message}")  # Also print to console for easy viewing
 
+# Per-client request rate on /api/* (429 + Retry-After when exceeded); API_RATE_LIMIT=0 turns it off.
+# Registered before CORS so rejected requests still carry CORS headers.
+api_rate_limit = float(os.getenv("API_RATE_LIMIT", "20"))
+api_limiter = RateLimiter(api_rate_limit, float(os.getenv("API_RATE_BURST", "40")))
+if api_rate_limit > 0:
+    app.add_middleware(
+        ClientRateLimitMiddleware,
+        limiter=api_limiter,
+        exempt=("/api/status", "/api/iolink/events"),
+        # Addresses/CIDRs of the reverse proxies whose X-Real-IP / X-Forwarded-For are believed
+        trusted_proxies=os.getenv("API_TRUSTED_PROXIES", "").split(","),
+    )
+
+# Calls relayed to IO-Link masters: per-master token bucket, identical in-flight reads
+# shared, and read results reused for IOLINK_READ_CACHE_MS
+master_limiter = RateLimiter(float(os.getenv("MASTER_RATE_LIMIT", "10")), float(os.getenv("MASTER_RATE_BURST", "10")))
+master_reads = SingleFlight()
+master_read_cache = TTLCache(float(os.getenv("IOLINK_READ_CACHE_MS", "500")) / 1000.0)
+# Master and port device identification / ISDU parameters, cached until a port's device changes
+device_parameters = ParameterCache(
+    ports=int(os.getenv("IOLINK_PORTS", "8")),
+    concurrency=int(os.getenv("IOLINK_PARAMETER_CONCURRENCY", "4")),
+    limiter=master_limiter,
+    batch_retry_after=float(os.getenv("IOLINK_MULTI_RETRY_SECONDS", "60")),
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -44,14 +99,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def run_on_loop(callback, *args):
+    """Hand work from the MQTT thread to the event loop"""
+    if main_loop is not None:
+        main_loop.call_soon_threadsafe(callback, *args)
+
 # MQTT client setup and callbacks
 def on_mqtt_connect(client, userdata, flags, rc):
     if rc == 0:
         logger.info("Connected to MQTT broker successfully")
+        run_on_loop(snapshot_store.set_health, 'mqtt', True)
+        if event_topic:
+            client.subscribe(event_topic, qos=0)
+            logger.info(f"Subscribed to IO-Link event topic {event_topic}")
+        for topic in snapshot_unit_topics:
+            client.subscribe(topic, qos=0)
+        if cluster_channel is not None:
+            client.subscribe(cluster_channel.topic, qos=0)
     else:
         logger.error(f"Failed to connect to MQTT broker with code: {rc}")
 
 def on_mqtt_disconnect(client, userdata, rc):
+    run_on_loop(snapshot_store.set_health, 'mqtt', False)
     if rc != 0:
         logger.error(f"Unexpected MQTT disconnection. Reconnecting...")
         try:
@@ -65,9 +134,499 @@ mqtt_client.on_connect = on_mqtt_connect
 mqtt_client.on_disconnect = on_mqtt_disconnect
 mqtt_client.reconnect_delay_set(min_delay=1, max_delay=30)
 
+# Store-and-forward: telemetry goes to an on-disk log while the broker is unreachable
+telemetry_spool = None
+if os.getenv("SPOOL_ENABLED", "true").lower() != "false":
+    try:
+        spool_dir, spool_lock = acquire_spool_dir(os.getenv("SPOOL_DIR", "/tmp/iot-control-spool"))
+        telemetry_spool = SegmentLog(
+            spool_dir,
+            segment_bytes=int(float(os.getenv("SPOOL_SEGMENT_MB", "4")) * 1024 * 1024),
+            max_bytes=int(float(os.getenv("SPOOL_MAX_MB", "256")) * 1024 * 1024),
+            max_age=float(os.getenv("SPOOL_MAX_AGE_HOURS", "168")) * 3600,
+        )
+    except Exception as e:
+        logger.error(f"Telemetry spool disabled: {e}")
+
+def publish_telemetry(topic, payload, qos=1, retain=False):
+    """Publish now if the broker is up and nothing is queued ahead; otherwise append to the spool"""
+    if telemetry_spool is None or (mqtt_client.is_connected() and not telemetry_spool.pending()):
+        mqtt_client.publish(topic, payload, qos=qos, retain=retain)
+    else:
+        telemetry_spool.append(topic, payload, qos, retain)
+
+async def forward_spool():
+    """Replay spooled telemetry in order, rate limited, once the broker is reachable"""
+    rate = float(os.getenv("SPOOL_REPLAY_RATE", "200"))  # messages per second
+    batch_size = max(1, int(rate / 10))
+    last_maintenance = 0.0
+    while True:
+        try:
+            if time.monotonic() - last_maintenance > 1.0:
+                telemetry_spool.flush()
+                telemetry_spool.enforce_limits()
+                last_maintenance = time.monotonic()
+            if not (mqtt_client.is_connected() and telemetry_spool.pending()):
+                await asyncio.sleep(0.5)
+                continue
+            
+            batch = telemetry_spool.read_batch(batch_size)
+            if not batch:
+                # Pending bytes that do not parse (a torn record) would otherwise stall the replay
+                telemetry_spool.skip_unreadable()
+                continue
+            infos = [mqtt_client.publish(topic, payload, qos=qos, retain=retain) for _, topic, payload, qos, retain in batch]
+            # Only move the cursor once the broker has acknowledged the batch; otherwise it is replayed
+            deadline = time.monotonic() + 10
+            while not all(info.is_published() for info in infos):
+                if not mqtt_client.is_connected() or time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(0.01)
+            else:
+                telemetry_spool.commit(batch[-1][0], len(batch))
+                if not telemetry_spool.pending():
+                    logger.info(f"Spool drained ({telemetry_spool.stats['replayed']} messages replayed)")
+            await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error replaying spooled telemetry: {e}")
+            await asyncio.sleep(1)
+
 # Store PLC connections
 plc_connections = {}
 
+# Poll schedulers (one per polling task) and masters without (or currently failing) getdatamulti
+poll_schedulers = []
+multi_read_support = BatchSupport(float(os.getenv("IOLINK_MULTI_RETRY_SECONDS", "60")))
+# PLCs connected by any worker (IP -> slot), opened lazily by the others
+plc_targets = {}
+
+# Multi-worker mode: one poller per master via file leases, state shared over MQTT
+cluster_mode = os.getenv("CLUSTER_MODE", "false").lower() == "true"
+backend_role = os.getenv("BACKEND_ROLE", "all").lower()  # all | api | poller
+master_leases = None
+cluster_channel = None
+if cluster_mode:
+    if backend_role != "api":
+        master_leases = MasterLeases(os.getenv("CLUSTER_LOCK_DIR", "/tmp/iot-control-leases"))
+    cluster_channel = ClusterChannel(mqtt_client, os.getenv("CLUSTER_TOPIC", f"iotcs/cluster/{os.getenv('UNIT_NAME', 'unit1')}"))
+
+# Temperature history for exports: on when a database URL is configured (HISTORY_ENABLED=true
+# forces it on with a local SQLite file, false turns it off)
+history_store = None
+history_enabled = os.getenv("HISTORY_ENABLED", "").lower()
+if history_enabled == "true" or (history_enabled != "false" and history_database_url(default=None)):
+    history_store = HistoryStore(
+        history_database_url(),
+        batch_size=int(os.getenv("HISTORY_BATCH_SIZE", "500")),
+        flush_interval=float(os.getenv("HISTORY_FLUSH_SECONDS", "2")),
+        export_concurrency=int(os.getenv("HISTORY_EXPORT_CONCURRENCY", "2")),
+    )
+
+# Process data decoders built from iolink_config.yml
+pd_decoders = decoders_from_config(iolink_config)
+temperature_decoder = pd_decoders.get('temperature_sensor') or decoder_from_config({'scaling_factor': 0.1}, 'temperature')
+
+# Alarm rules evaluated on every ingested sample
+alarm_engine = AlarmEngine(rules_from_config(iolink_config))
+# Physical sensors behind the heaters: shared ports are read once, redundant ones fused
+sensor_model = SensorModel(
+    method=os.getenv("SENSOR_FUSION", "median").lower(),
+    max_spread=float(os.getenv("SENSOR_FUSION_MAX_SPREAD")) if os.getenv("SENSOR_FUSION_MAX_SPREAD") else None,
+)
+# Duty cycle, switch counts, energy and time-at-temperature per section/heater
+heater_analytics = analytics_from_config(iolink_config)
+# Relay-feedback PID autotuning runs per heater; tuned gains go to heater_config
+autotune_runs = {}
+tuning_store = TuningStore(os.getenv("DATABASE_URL") or history_database_url())
+HEATER_SECTIONS = [1, 2, 3, 4]
+# Session recording/replay (RECORD_SESSION=true records from startup)
+recorder_dir = os.getenv("RECORDER_DIR", "/tmp/iot-recordings")
+session_recorder = None
+replay_progress = None
+# Sandboxed pipeline state of the current/last replay
+replay_state = None
+# Per-connection queues for pushing alarm events to /ws clients
+ws_queues = set()
+# Compact binary telemetry (wire.py): /ws?format=compact sessions, and
+# telemetry/<unit>/signals|samples on MQTT with TELEMETRY_COMPACT=true
+signal_table = SignalTable()
+compact_ws_queues = set()
+compact_mqtt = CompactEncoder(signal_table, keyframe_every=float(os.getenv("TELEMETRY_KEYFRAME_SECONDS", "10"))) \
+    if os.getenv("TELEMETRY_COMPACT", "false").lower() == "true" else None
+pending_samples = []
+
+# Event-driven ingestion: masters push datachanged/timer events, polling is the fallback
+ingest_mode = os.getenv("INGEST_MODE", "poll").lower()
+event_subscriptions = None
+if ingest_mode == "event":
+    event_subscriptions = EventSubscriptions(
+        callback=os.getenv("IOLINK_EVENT_CALLBACK", "http://localhost:8000/api/iolink/events"),
+        source=os.getenv("IOLINK_EVENT_SOURCE", "datachanged"),
+        stale_after=float(os.getenv("IOLINK_EVENT_STALE_SECONDS", "5")),
+        resubscribe_every=float(os.getenv("IOLINK_EVENT_RESUBSCRIBE_SECONDS", "300")),
+        timer_interval_ms=int(iolink_config.get('devices', {}).get('temperature_sensor', {}).get('update_rate', 1000)),
+    )
+    if not os.getenv("IOLINK_EVENT_CALLBACK"):
+        logger.warning("INGEST_MODE=event without IOLINK_EVENT_CALLBACK; masters must be able to reach http://localhost:8000")
+event_topic = mqtt_callback_topic(event_subscriptions.callback) if event_subscriptions else None
+main_loop = None
+
+# Loop lag / stall detection (/api/loop) and on-demand profiling (/api/admin/profile)
+loop_monitor = None
+if os.getenv("LOOP_MONITOR", "true").lower() != "false":
+    loop_monitor = LoopMonitor(
+        interval=float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100")) / 1000.0,
+        stall_threshold=float(os.getenv("LOOP_STALL_MS", "250")) / 1000.0,
+    )
+profiler = SamplingProfiler(max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "60")))
+admin_token = os.getenv("ADMIN_TOKEN")
+
+def get_heater_configs():
+    """Build the HTR-A/HTR-B polling configuration from environment variables"""
+    unit_name = os.getenv("UNIT_NAME", "unit1")
+    update_rate = iolink_config.get('devices', {}).get('temperature_sensor', {}).get('update_rate', 1000)
+    return [
+        {
+            'name': 'htr_a',
+            'label': 'HTR-A',
+            'ip': os.getenv("HTR_A_IP", "192.168.30.29"),
+            # Read from the master's deviceinfo unless set explicitly
+            'device_id': os.getenv("HTR_A_DEVICE_ID") or device_parameters.device_id(os.getenv("HTR_A_IP", "192.168.30.29"))
+            or "00-02-01-6D-55-8A",
+            'port': os.getenv("HTR_A_TEMP_PORT", "6"),
+            'topic': os.getenv("HTR_A_TEMP_TOPIC", f"instrument/{unit_name}/htr_a/temperature"),
+            'reading_key': 'temperature',
+            'update_rate': int(os.getenv("HTR_A_UPDATE_RATE", update_rate)),  # milliseconds
+            'redundant_ports': [p.strip() for p in os.getenv("HTR_A_REDUNDANT_PORTS", "").split(",") if p.strip()],
+        },
+        {
+            'name': 'htr_b',
+            'label': 'HTR-B',
+            'ip': os.getenv("HTR_B_IP", "192.168.30.33"),
+            'device_id': os.getenv("HTR_B_DEVICE_ID") or device_parameters.device_id(os.getenv("HTR_B_IP", "192.168.30.33"))
+            or "00-02-01-6D-55-86",
+            'port': os.getenv("HTR_B_TEMP_PORT", "6"),
+            'topic': os.getenv("HTR_B_TEMP_TOPIC", f"instrument/{unit_name}/htr_a/temperature"),  # Shared topic
+            'reading_key': 'temperature_htr_b',
+            'update_rate': int(os.getenv("HTR_B_UPDATE_RATE", update_rate)),  # milliseconds
+            'redundant_ports': [p.strip() for p in os.getenv("HTR_B_REDUNDANT_PORTS", "").split(",") if p.strip()],
+        },
+    ]
+
+async def read_pdin(session, heater):
+    """Read the raw pdin hex value for a heater's temperature port, or None"""
+    url = f"http://{heater['ip']}/iolinkmaster/port%5B{heater['port']}%5D/iolinkdevice/pdin/getdata"
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+        if response.status != 200:
+            logger.error(f"Error reading {heater['label']} temperature: HTTP {response.status}")
+            return None
+        data = await response.json()
+        if 'data' in data and 'value' in data['data']:
+            hex_value = data['data']['value'].replace('0x', '').zfill(4).upper()
+            logger.info(f"{heater['label']} received hex value: {hex_value}")
+            return hex_value
+        return None
+
+def remember_reading(heater, unit_name, hex_value, temp_f, wall=None):
+    """Keep the latest reading in memory for the HTTP API and snapshot"""
+    signal_id = reading_signals.register(heater['reading_key'], device=heater['name'], unit='fahrenheit', ip=heater['ip'])
+    reading_signals.update(signal_id, temp_f, hex_value, wall=wall)
+    snapshot_store.record_reading(unit_name, heater['name'], temp_f, hex_value)
+    run = autotune_runs.get(heater['name'])
+    if run is not None and not run['task'].done() and not run['queue'].full():
+        run['queue'].put_nowait(temp_f)
+
+async def read_master(session, master_ip, heaters):
+    """Read the pdin of several heaters on one master with a single getdatamulti request.
+
+    Returns a raw hex value, None or an Exception per heater. Masters that
+    do not know getdatamulti are remembered and read port by port; after any
+    other failed batch the master is read port by port for a while, then
+    batching is tried again.
+    """
+    if len(heaters) == 1 or not multi_read_support.usable(master_ip):
+        return await asyncio.gather(*(read_pdin(session, h) for h in heaters), return_exceptions=True)
+    
+    request = {'code': 'request', 'cid': 4712, 'adr': '/getdatamulti',
+               'data': {'datatosend': [pdin_path(h['port']) for h in heaters]}}
+    try:
+        async with session.post(f"http://{master_ip}/", json=request, timeout=aiohttp.ClientTimeout(total=5)) as response:
+            data = await response.json(content_type=None)
+            status = response.status
+    except Exception as e:
+        return [e] * len(heaters)
+    
+    if status != 200 or not isinstance(data, dict) or data.get('code') != 200 or not isinstance(data.get('data'), dict):
+        if multi_read_support.failed(master_ip, status, data):
+            logger.warning(f"Master {master_ip} does not support getdatamulti; reading ports individually")
+        else:
+            logger.warning(f"getdatamulti on {master_ip} failed (HTTP {status}: {data}); reading ports individually "
+                           f"for {multi_read_support.retry_after:.0f}s")
+        return await asyncio.gather(*(read_pdin(session, h) for h in heaters), return_exceptions=True)
+    
+    results = []
+    for heater in heaters:
+        entry = data['data'].get(pdin_path(heater['port'])) or {}
+        value = entry.get('data')
+        if entry.get('code') == 200 and isinstance(value, str):
+            results.append(value.replace('0x', '').zfill(4).upper())
+        else:
+            logger.error(f"Error reading {heater['label']} temperature: {entry}")
+            results.append(None)
+    return results
+
+def publish_temperature(heater, unit_name, hex_value, temp_f, source='poll', publish_shared=True):
+    """Publish a converted temperature reading and keep it for the HTTP API.
+
+    publish_shared=False skips the instruments_ti message when another heater
+    on the same physical sensor already sent it.
+    """
+    name = heater['name']
+    timestamp = datetime.now().isoformat()
+    counter = int(datetime.now().timestamp())
+
+    temp_reading = {
+        'code': 'event',
+        'cid': 123,
+        'adr': '/instruments_ti',
+        'data': {
+            'eventno': str(counter),
+            'srcurl': f"{heater['device_id']}/timer[1]/counter/datachanged",
+            'payload': {
+                '/timer[1]/counter': {'code': 200, 'data': counter},
+                '/processdatamaster/temperature': {'code': 200, 'data': temp_f}
+            }
+        }
+    }
+
+    hex_reading = {
+        'code': 'event',
+        'cid': 123,
+        'adr': f'/instrument/{name}',
+        'data': {
+            'eventno': str(counter),
+            'srcurl': f"{heater['device_id']}/timer[1]/counter/datachanged",
+            'payload': {
+                '/timer[1]/counter': {'code': 200, 'data': counter},
+                f"/iolinkmaster/port[{heater['port']}]/iolinkdevice/pdin": {'code': 200, 'data': hex_value}
+            }
+        }
+    }
+
+    if publish_shared:
+        publish_telemetry('instruments_ti', json.dumps(temp_reading), qos=1)
+    publish_telemetry(f'instrument/{name}', json.dumps(hex_reading), qos=1)
+    # Also publish to device-specific topic
+    publish_telemetry(f'instrument/{unit_name}/{name}/temperature', json.dumps(temp_reading), qos=1)
+    logger.info(f"Published {heater['label']} temperature: {temp_f:.1f}°F (raw hex: {hex_value})")
+    queue_samples(unit_name, name, temp_f, hex_value)
+
+    if history_store is not None:
+        history_store.record(unit_name, name, temp_f, hex_value)
+
+    # Keep latest reading in memory for HTTP API compatibility
+    remember_reading(heater, unit_name, hex_value, temp_f)
+    if cluster_channel is not None:
+        cluster_channel.publish('reading', heater=name, value=temp_f, raw=hex_value, timestamp=timestamp, source=source)
+
+def queue_samples(unit_name, heater_name, temp_f, hex_value):
+    """Batch a reading for the compact streams; everything queued in one loop iteration goes in one frame"""
+    if compact_mqtt is None and not compact_ws_queues:
+        return
+    if not pending_samples and main_loop is not None:
+        main_loop.call_soon(flush_samples)
+    pending_samples.append((signal_table.get(f"{unit_name}/{heater_name}/temperature", 2), temp_f))
+    try:
+        pending_samples.append((signal_table.get(f"{unit_name}/{heater_name}/pdin"), int(hex_value, 16)))
+    except (TypeError, ValueError):
+        pass
+    if main_loop is None:
+        flush_samples()
+
+def flush_samples():
+    if not pending_samples:
+        return
+    samples = pending_samples[:]
+    pending_samples.clear()
+    timestamp = time.time()
+    if compact_mqtt is not None:
+        unit_name = os.getenv("UNIT_NAME", "unit1")
+        if compact_mqtt.new_signals(samples) is not None:
+            # Retained full table, so subscribers joining later can name every signal
+            publish_telemetry(f"telemetry/{unit_name}/signals", signal_table.encode(range(len(signal_table.names))), qos=1, retain=True)
+        publish_telemetry(f"telemetry/{unit_name}/samples", compact_mqtt.encode(samples, timestamp), qos=1)
+    for queue in compact_ws_queues:
+        if not queue.full():
+            queue.put_nowait(('samples', timestamp, samples))
+
+def decode_readings(model, readings, now):
+    """Decode a batch of (sensor, raw hex) pairs into a sensor model; returns the heaters they feed"""
+    values = temperature_decoder.decode([hex_value for _, hex_value in readings]).tolist()
+    heaters = []
+    for (sensor, hex_value), row in zip(readings, values):
+        temp_f = row[0]
+        if math.isnan(temp_f):
+            logger.error(f"Error converting {sensor['label']} hex value {hex_value}")
+            model.record_error(sensor['name'])
+            continue
+        logger.info(f"{sensor['label']} temperature conversion: hex {hex_value} -> {temp_f}°F")
+        model.record(sensor['name'], temp_f, hex_value, now)
+        for heater in sensor['heaters']:
+            if heater not in heaters:
+                heaters.append(heater)
+    return heaters
+
+def ingest_readings(unit_name, readings, source='poll', now=None):
+    """Decode a batch of (sensor, raw hex) pairs and publish each affected heater once; returns the number published"""
+    if not readings:
+        return 0
+    now = time.monotonic() if now is None else now
+    heaters = decode_readings(sensor_model, readings, now)
+    
+    ingested = 0
+    shared_sent = set()
+    for heater in heaters:
+        fused = sensor_model.fuse(heater, now)
+        if fused is None:
+            continue
+        temp_f, hex_value = fused
+        primary = (heater['ip'], heater['port'])
+        publish_temperature(heater, unit_name, hex_value, temp_f, source, publish_shared=primary not in shared_sent)
+        shared_sent.add(primary)
+        for alarm in alarm_engine.evaluate(unit_name, heater['name'], temp_f, now):
+            publish_alarm(alarm)
+        heater_analytics.record_temperature(unit_name, heater['name'], temp_f, now)
+        ingested += 1
+    return ingested
+
+def publish_alarm(alarm):
+    """Send an alarm transition to MQTT (retained, so late subscribers see current state) and /ws clients"""
+    log_important(f"ALARM {alarm['state'].upper()}: {alarm['unit']}/{alarm['heater']} {alarm['alarm']} - {alarm['message']}")
+    publish_telemetry(f"alarms/{alarm['unit']}/{alarm['heater']}/{alarm['alarm']}", json.dumps(alarm), qos=1, retain=True)
+    message = {'type': 'alarm', 'data': alarm}
+    for queue in ws_queues:
+        if not queue.full():
+            queue.put_nowait(message)
+
+def handle_iolink_event(event):
+    """Feed an event pushed by an IO-Link master into the ingest pipeline"""
+    if event_subscriptions is None:
+        return 0
+    if session_recorder is not None:
+        session_recorder.event(event)
+    device_id, readings = parse_event(event)
+    matched = []
+    for port, hex_value in readings:
+        for sensor in event_subscriptions.match(device_id, port):
+            event_subscriptions.mark(sensor)
+            matched.append((sensor, hex_value))
+    if readings and not matched:
+        logger.warning(f"Ignoring IO-Link event from unknown device {device_id}")
+    return ingest_readings(os.getenv("UNIT_NAME", "unit1"), matched, source='event')
+
+def record_output(heater_name, port_num, state, now=None):
+    """Track a section output in the snapshot and analytics and tell the other workers and units"""
+    unit_name = os.getenv("UNIT_NAME", "unit1")
+    changed = snapshot_store.set_output(unit_name, heater_name, port_num, state)
+    heater_analytics.set_section(unit_name, heater_name, port_num, state, now)
+    if cluster_channel is not None:
+        cluster_channel.publish('output', heater=heater_name, port=port_num, state=state)
+    if changed:
+        publish_sections(unit_name, heater_name)
+
+def publish_sections(unit_name, heater_name):
+    """Retained section states of a heater on instrument/<unit>/<heater>/sections, for other units' snapshots"""
+    outputs = snapshot_store.units.get(unit_name, {}).get(heater_name, {}).get('outputs', {})
+    count = max([len(HEATER_SECTIONS)] + [int(port) for port in outputs])
+    sections = [bool(outputs.get(str(port), False)) for port in range(1, count + 1)]
+    publish_telemetry(f"instrument/{unit_name}/{heater_name}/sections", json.dumps({'sections': sections}), qos=1, retain=True)
+
+def apply_cluster_message(payload):
+    """Apply state broadcast by another worker (no re-publishing or history)"""
+    message = cluster_channel.decode(payload)
+    if message is None:
+        return
+    unit_name = os.getenv("UNIT_NAME", "unit1")
+    kind = message.get('type')
+    if kind == 'reading':
+        for heater in get_heater_configs():
+            if heater['name'] != message.get('heater'):
+                continue
+            wall = datetime.fromisoformat(message['timestamp']).timestamp() if message.get('timestamp') else None
+            remember_reading(heater, unit_name, message.get('raw'), float(message['value']), wall)
+            # Keep stale checks quiet on the leader when another worker ingested the sample
+            alarm_engine.evaluate(unit_name, heater['name'], float(message['value']))
+            heater_analytics.record_temperature(unit_name, heater['name'], float(message['value']))
+            # The leader skips polling while another worker is receiving this heater's events
+            sensor = sensor_model.sensors.get(sensor_key(heater['ip'], heater['port']))
+            if message.get('source') == 'event' and event_subscriptions is not None and sensor is not None:
+                event_subscriptions.mark(sensor)
+    elif kind == 'output':
+        snapshot_store.set_output(unit_name, message['heater'], int(message['port']), bool(message['state']))
+        heater_analytics.set_section(unit_name, message['heater'], int(message['port']), bool(message['state']))
+    elif kind == 'plc':
+        plc_targets[message['ip']] = int(message.get('slot', 0))
+
+def maintain_event_subscriptions(session, sensors, pending):
+    """Subscribe sensors whose masters have not been subscribed recently or stopped sending events.
+
+    Masters are subscribed concurrently in background tasks kept in `pending`
+    (master IP -> task), so an unreachable master never holds up the poll tick
+    and is not subscribed again while its previous attempt is still running.
+    """
+    by_master = {}
+    for sensor in sensors:
+        if sensor['ip'] not in pending and event_subscriptions.needs_subscribe(sensor):
+            by_master.setdefault(sensor['ip'], set()).add(int(sensor['port']))
+    for master_ip, ports in by_master.items():
+        task = asyncio.create_task(event_subscriptions.subscribe(session, master_ip, sorted(ports)))
+        pending[master_ip] = task
+        task.add_done_callback(lambda _, ip=master_ip: pending.pop(ip, None))
+
+async def identify_masters(heaters):
+    """Fill in device IDs not set in the environment from the masters' deviceinfo"""
+    unknown = [h for h in heaters if not os.getenv(f"{h['name'].upper()}_DEVICE_ID")]
+    if not unknown or os.getenv("IOLINK_IDENTIFY", "true").lower() == "false":
+        return
+    async with aiohttp.ClientSession() as session:
+        masters = await asyncio.gather(*(device_parameters.master(session, h['ip']) for h in unknown))
+    for heater, master in zip(unknown, masters):
+        if master is None:
+            logger.warning(f"{heater['label']}: could not identify {heater['ip']}, using device ID {heater['device_id']}")
+        else:
+            heater['device_id'] = master['device_id']
+            logger.info(f"{heater['label']}: device ID {master['device_id']} read from {heater['ip']}")
+
+async def refresh_device_identities():
+    """Re-read port identification of this unit's masters; a swapped device drops its cached parameters"""
+    interval = float(os.getenv("IOLINK_IDENTIFY_SECONDS", "600"))
+    if interval <= 0 or os.getenv("IOLINK_IDENTIFY", "true").lower() == "false":
+        return
+    async with aiohttp.ClientSession() as session:
+        while True:
+            for ip in dict.fromkeys(h['ip'] for h in get_heater_configs()):
+                try:
+                    await device_parameters.identify(session, ip, refresh=True)
+                except Exception as e:
+                    logger.error(f"Error refreshing device identification of {ip}: {e}")
+            await asyncio.sleep(interval)
+
+def register_sensors(heaters):
+    """Add the heaters' sensors to the model and route their pushed events to them"""
+    sensors = sensor_model.add(heaters)
+    if event_subscriptions is not None:
+        for sensor in sensors:
+            event_subscriptions.register(sensor)
+    return sensors
+
+async def register_event_sensors():
+    """Sensor table for a worker that does not poll: the masters' event callbacks can land on any worker"""
+    heaters = get_heater_configs()
+    await identify_masters(heaters)
+    register_sensors(heaters)
+
 # Temperature polling task
 async def poll_temperature():
     """Poll temperature data from IO-Link master and publish to MQTT"""
@@ -75,209 +634,297 @@ async def poll_temperature():
     
     # Get unit-specific configuration from environment variables
     unit_name = os.getenv("UNIT_NAME", "unit1")
+    heaters = get_heater_configs()
+    htr_a, htr_b = heaters
+    await identify_masters(heaters)
     
-    # HTR-A configuration - use IPs directly
-    htr_a_ip = os.getenv("HTR_A_IP", "192.168.30.29")
-    htr_a_device_id = os.getenv("HTR_A_DEVICE_ID", "00-02-01-6D-55-8A")
-    htr_a_port = os.getenv("HTR_A_TEMP_PORT", "6")
-    htr_a_topic = os.getenv("HTR_A_TEMP_TOPIC", f"instrument/{unit_name}/htr_a/temperature")
+    logger.info(f"Unit {unit_name}: Polling HTR-A from {htr_a['ip']}:{htr_a['port']} and HTR-B from {htr_b['ip']}:{htr_b['port']}")
+    logger.info(f"Shared temperature topic: {htr_a['topic']}")
     
-    # HTR-B configuration - use IPs directly  
-    htr_b_ip = os.getenv("HTR_B_IP", "192.168.30.33")
-    htr_b_device_id = os.getenv("HTR_B_DEVICE_ID", "00-02-01-6D-55-86")
-    htr_b_port = os.getenv("HTR_B_TEMP_PORT", "6")
-    htr_b_topic = os.getenv("HTR_B_TEMP_TOPIC", f"instrument/{unit_name}/htr_a/temperature")  # Shared topic
+    # Poll physical sensors, not heaters: each sensor is read once and fanned out to the heaters it feeds
+    sensors = register_sensors(heaters)
     
-    logger.info(f"Unit {unit_name}: Polling HTR-A from {htr_a_ip}:{htr_a_port} and HTR-B from {htr_b_ip}:{htr_b_port}")
-    logger.info(f"Shared temperature topic: {htr_a_topic}")
+    if event_subscriptions is not None:
+        logger.info(f"Event ingestion enabled ({event_subscriptions.source} -> {event_subscriptions.callback}); polling only when events go stale")
     
     # Error tracking for exponential backoff
     consecutive_errors = 0
     max_consecutive_errors = 10
     
+    # In cluster mode only the lease holder polls a master; leases are retried every cycle for failover
+    led = sensors if master_leases is None else []
+    
+    # Each sensor is read at its update_rate on drift-free ticks aligned to the monotonic clock
+    schedule = TickScheduler({s['name']: s['update_rate'] for s in sensors})
+    poll_schedulers.append(schedule)
+    # Event subscriptions in flight, by master IP
+    subscribing = {}
+    logger.info(f"Poll schedule: tick {schedule.tick * 1000:.0f} ms, " +
+                ", ".join(f"{s['label']} every {s['update_rate']} ms" for s in sensors))
+    
     async with aiohttp.ClientSession() as session:
-        while True:
-            try:
-                # Poll HTR-A temperature (shared sensor)
-                try:
-                    url_a = f"http://{htr_a_ip}/iolinkmaster/port%5B{htr_a_port}%5D/iolinkdevice/pdin/getdata"
-                    async with session.get(url_a, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if 'data' in data and 'value' in data['data']:
-                                hex_value = data['data']['value'].replace('0x', '').zfill(4).upper()
-                                logger.info(f"HTR-A received hex value: {hex_value}")
-                                
-                                try:
-                                    decimal_value = int(hex_value, 16)
-                                    temp_f = decimal_value / 10.0
-                                    logger.info(f"HTR-A temperature conversion: hex {hex_value} -> decimal {decimal_value} -> {temp_f}°F")
-                                    
-                                    timestamp = datetime.now().isoformat()
-                                    counter = int(datetime.now().timestamp())
-                                    
-                                    # Publish HTR-A temperature
-                                    temp_reading = {
-                                        'code': 'event',
-                                        'cid': 123,
-                                        'adr': '/instruments_ti',
-                                        'data': {
-                                            'eventno': str(counter),
-                                            'srcurl': f'{htr_a_device_id}/timer[1]/counter/datachanged',
-                                            'payload': {
-                                                '/timer[1]/counter': {'code': 200, 'data': counter},
-                                                '/processdatamaster/temperature': {'code': 200, 'data': temp_f}
-                                            }
-                                        }
-                                    }
-                                    
-                                    hex_reading = {
-                                        'code': 'event',
-                                        'cid': 123,
-                                        'adr': '/instrument/htr_a',
-                                        'data': {
-                                            'eventno': str(counter),
-                                            'srcurl': f'{htr_a_device_id}/timer[1]/counter/datachanged',
-                                            'payload': {
-                                                '/timer[1]/counter': {'code': 200, 'data': counter},
-                                                '/iolinkmaster/port[6]/iolinkdevice/pdin': {'code': 200, 'data': hex_value}
-                                            }
-                                        }
-                                    }
-                                    
-                                    # Publish HTR-A temperature to device-specific topic
-                                    mqtt_client.publish('instruments_ti', json.dumps(temp_reading), qos=1)
-                                    mqtt_client.publish('instrument/htr_a', json.dumps(hex_reading), qos=1)
-                                    # Also publish to device-specific topic
-                                    mqtt_client.publish(f'instrument/{unit_name}/htr_a/temperature', json.dumps(temp_reading), qos=1)
-                                    logger.info(f"Published HTR-A temperature: {temp_f:.1f}°F (raw hex: {hex_value})")
-                                    
-                                    # Keep latest reading in memory for HTTP API compatibility
-                                    latest_readings['temperature'] = {
-                                        'value': temp_f,
-                                        'unit': 'fahrenheit',
-                                        'timestamp': timestamp,
-                                        'raw_value': hex_value,
-                                        'device': 'htr_a',
-                                        'ip': htr_a_ip
-                                    }
-                                    
-                                    # Reset error counter on successful read
-                                    consecutive_errors = 0
-                                except ValueError as e:
-                                    logger.error(f"Error converting HTR-A hex value {hex_value}: {e}")
-                        else:
-                            logger.error(f"Error reading HTR-A temperature: HTTP {response.status}")
-                except Exception as e:
-                    logger.error(f"Error polling HTR-A temperature: {e}")
-                    consecutive_errors += 1
-                
-                # Poll HTR-B temperature
+        try:
+            while True:
                 try:
-                    url_b = f"http://{htr_b_ip}/iolinkmaster/port%5B{htr_b_port}%5D/iolinkdevice/pdin/getdata"
-                    async with session.get(url_b, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            if 'data' in data and 'value' in data['data']:
-                                hex_value = data['data']['value'].replace('0x', '').zfill(4).upper()
-                                logger.info(f"HTR-B received hex value: {hex_value}")
-                                
-                                try:
-                                    decimal_value = int(hex_value, 16)
-                                    temp_f = decimal_value / 10.0
-                                    logger.info(f"HTR-B temperature conversion: hex {hex_value} -> decimal {decimal_value} -> {temp_f}°F")
-                                    
-                                    timestamp = datetime.now().isoformat()
-                                    counter = int(datetime.now().timestamp())
-                                    
-                                    # Publish HTR-B temperature
-                                    temp_reading = {
-                                        'code': 'event',
-                                        'cid': 123,
-                                        'adr': '/instruments_ti',
-                                        'data': {
-                                            'eventno': str(counter),
-                                            'srcurl': f'{htr_b_device_id}/timer[1]/counter/datachanged',
-                                            'payload': {
-                                                '/timer[1]/counter': {'code': 200, 'data': counter},
-                                                '/processdatamaster/temperature': {'code': 200, 'data': temp_f}
-                                            }
-                                        }
-                                    }
-                                    
-                                    hex_reading = {
-                                        'code': 'event',
-                                        'cid': 123,
-                                        'adr': '/instrument/htr_b',
-                                        'data': {
-                                            'eventno': str(counter),
-                                            'srcurl': f'{htr_b_device_id}/timer[1]/counter/datachanged',
-                                            'payload': {
-                                                '/timer[1]/counter': {'code': 200, 'data': counter},
-                                                '/iolinkmaster/port[6]/iolinkdevice/pdin': {'code': 200, 'data': hex_value}
-                                            }
-                                        }
-                                    }
-                                    
-                                    # Publish HTR-B temperature to device-specific topic
-                                    mqtt_client.publish('instruments_ti', json.dumps(temp_reading), qos=1)
-                                    mqtt_client.publish('instrument/htr_b', json.dumps(hex_reading), qos=1)
-                                    # Also publish to device-specific topic
-                                    mqtt_client.publish(f'instrument/{unit_name}/htr_b/temperature', json.dumps(temp_reading), qos=1)
-                                    logger.info(f"Published HTR-B temperature: {temp_f:.1f}°F (raw hex: {hex_value})")
-                                    
-                                    # Keep latest HTR-B reading in memory
-                                    latest_readings['temperature_htr_b'] = {
-                                        'value': temp_f,
-                                        'unit': 'fahrenheit',
-                                        'timestamp': timestamp,
-                                        'raw_value': hex_value,
-                                        'device': 'htr_b',
-                                        'ip': htr_b_ip
-                                    }
-                                    
-                                    # Reset error counter on successful read
-                                    consecutive_errors = 0
-                                except ValueError as e:
-                                    logger.error(f"Error converting HTR-B hex value {hex_value}: {e}")
-                        else:
-                            logger.error(f"Error reading HTR-B temperature: HTTP {response.status}")
+                    due_names = set(await schedule.next_tick())
+                    if master_leases is not None:
+                        led = [s for s in sensors if master_leases.try_acquire(s['ip'])]
+                    due = [s for s in led if s['name'] in due_names]
+                    if event_subscriptions is not None:
+                        maintain_event_subscriptions(session, led, subscribing)
+                        # Sensors with fresh pushed events need no HTTP read this cycle
+                        due = [s for s in due if not event_subscriptions.is_fresh(s)]
+                    
+                    # One request per master for the reads sharing this tick, masters in parallel;
+                    # then decode the whole tick in one batch
+                    by_master = {}
+                    for sensor in due:
+                        by_master.setdefault(sensor['ip'], []).append(sensor)
+                    batches = await asyncio.gather(*(read_master(session, ip, group) for ip, group in by_master.items()))
+                    
+                    polled = []
+                    for group, results in zip(by_master.values(), batches):
+                        for sensor, result in zip(group, results):
+                            if session_recorder is not None:
+                                if isinstance(result, Exception):
+                                    session_recorder.iolink_error(sensor['name'], str(result))
+                                elif result is not None:
+                                    session_recorder.iolink(sensor['name'], result)
+                            if isinstance(result, Exception):
+                                logger.error(f"Error polling {sensor['label']} temperature: {result}")
+                                sensor_model.record_error(sensor['name'])
+                                for heater in sensor['heaters']:
+                                    if sensor_model.fuse(heater) is None:
+                                        snapshot_store.update_heater(unit_name, heater['name'], online=False)
+                                consecutive_errors += 1
+                            elif result is not None:
+                                polled.append((sensor, result))
+                    
+                    if ingest_readings(unit_name, polled):
+                        # Reset error counter on successful read
+                        consecutive_errors = 0
+                    
+                    led_heaters = {h['name'] for s in led for h in s['heaters']}
+                    for alarm in alarm_engine.check_stale(unit_name, [h['name'] for h in heaters if h['name'] in led_heaters]):
+                        publish_alarm(alarm)
+                    
+                    # Back off exponentially on repeated errors, then pick the schedule up again
+                    if consecutive_errors > max_consecutive_errors:
+                        sleep_time = min(30, 2 ** (consecutive_errors - max_consecutive_errors))  # Max 30 seconds
+                        logger.warning(f"Too many consecutive errors ({consecutive_errors}), sleeping for {sleep_time}s")
+                        await asyncio.sleep(sleep_time)
+                        schedule.resync()
+                    
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
-                    logger.error(f"Error polling HTR-B temperature: {e}")
+                    logger.error(f"Critical error in temperature polling loop: {e}")
                     consecutive_errors += 1
-                
-                # Calculate sleep time based on error count (exponential backoff)
-                if consecutive_errors > max_consecutive_errors:
-                    sleep_time = min(30, 2 ** (consecutive_errors - max_consecutive_errors))  # Max 30 seconds
-                    logger.warning(f"Too many consecutive errors ({consecutive_errors}), sleeping for {sleep_time}s")
-                else:
-                    sleep_time = 1  # Normal 1-second polling
-                
-                await asyncio.sleep(sleep_time)
-                
-            except Exception as e:
-                logger.error(f"Critical error in temperature polling loop: {e}")
-                consecutive_errors += 1
-                await asyncio.sleep(5)  # Wait 5 seconds before retrying
+                    await asyncio.sleep(5)  # Wait 5 seconds before retrying
+                    schedule.resync()
+        finally:
+            if event_subscriptions is not None:
+                for task in list(subscribing.values()):
+                    task.cancel()
+                await asyncio.gather(*subscribing.values(), return_exceptions=True)
+                for master_ip in {s['ip'] for s in led}:
+                    ports = sorted({int(s['port']) for s in led if s['ip'] == master_ip})
+                    await event_subscriptions.unsubscribe(session, master_ip, ports)
+            if master_leases is not None:
+                master_leases.release_all()
+
+async def run_history_store():
+    """Open the history database without delaying startup, then write batches"""
+    try:
+        await asyncio.to_thread(history_store.open)
+    except Exception as e:
+        logger.error(f"History store unavailable, exports disabled: {e}")
+        return
+    retention_days = float(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+    if retention_days > 0:
+        asyncio.create_task(history_store.run_retention(
+            retention_days, float(os.getenv("HISTORY_PURGE_INTERVAL_SECONDS", "3600"))))
+    await history_store.run_writer()
+
+def start_recording(name=None):
+    """Start recording everything the backend ingests to RECORDER_DIR"""
+    global session_recorder
+    if session_recorder is not None:
+        session_recorder.close()
+    name = os.path.basename(name) if name else f"session-{datetime.now():%Y%m%d-%H%M%S}.iotrec"
+    session_recorder = SessionRecorder(os.path.join(recorder_dir, name),
+                                       max_bytes=int(float(os.getenv("RECORDER_MAX_MB", "512")) * 1024 * 1024))
+    return session_recorder
+
+def stop_recording():
+    global session_recorder
+    recorder, session_recorder = session_recorder, None
+    return recorder.close() if recorder is not None else None
+
+def replay_sandbox():
+    """Sensor model, alarm engine, analytics and snapshot of their own for a replay"""
+    return SimpleNamespace(
+        sensors=SensorModel(method=sensor_model.method, max_spread=sensor_model.max_spread,
+                            stale_periods=sensor_model.stale_periods),
+        alarms=AlarmEngine(alarm_engine.rules),
+        analytics=analytics_from_config(iolink_config),
+        snapshot=SnapshotStore(stale_after=snapshot_store.stale_after),
+        alarm_transitions=0,
+        now=None,
+    )
+
+def replay_results():
+    """What the last replay's sandbox ended up with (heaters, active alarms, analytics)"""
+    sandbox = replay_state
+    if sandbox is None:
+        return None
+    return {
+        'units': sandbox.snapshot.view()['units'],
+        'alarms': sandbox.alarms.active(),
+        'alarm_transitions': sandbox.alarm_transitions,
+        'analytics': sandbox.analytics.report(now=sandbox.now),
+    }
+
+async def replay_recording(path, speed):
+    """Feed a recording through a sandboxed copy of the ingest pipeline.
+
+    The replay runs on the recording's virtual clock with its own sensor model,
+    alarm engine, analytics and snapshot (see replay_results). Nothing is
+    published to MQTT, written to history, sent to hardware or handed to
+    autotune runs, and the live poller's state is left alone.
+    """
+    global replay_progress, replay_state
+    unit_name = os.getenv("UNIT_NAME", "unit1")
+    heaters = [dict(heater) for heater in get_heater_configs()]
+    sandbox = replay_state = replay_sandbox()
+    sandbox.sensors.add(heaters)
+    replay_progress = {}
+    unmatched = set()
+    
+    def ingest(now, readings):
+        sandbox.now = now
+        for heater in decode_readings(sandbox.sensors, readings, now):
+            fused = sandbox.sensors.fuse(heater, now)
+            if fused is None:
+                continue
+            temp_f, hex_value = fused
+            sandbox.snapshot.record_reading(unit_name, heater['name'], temp_f, hex_value)
+            for alarm in sandbox.alarms.evaluate(unit_name, heater['name'], temp_f, now):
+                sandbox.alarm_transitions += 1
+                logger.info(f"Replay alarm {alarm['state']}: {alarm['heater']} {alarm['alarm']} - {alarm['message']}")
+            sandbox.analytics.record_temperature(unit_name, heater['name'], temp_f, now)
+    
+    def iolink(now, key, hex_value):
+        sensor = sandbox.sensors.sensors.get(key)
+        if sensor is None:
+            unmatched.add(key)
+            return
+        ingest(now, [(sensor, hex_value)])
+    
+    def iolink_error(now, key, message):
+        if key in sandbox.sensors.sensors:
+            sandbox.sensors.record_error(key)
+    
+    def event(now, payload):
+        device_id, readings = parse_event(payload)
+        ingest(now, [(sensor, hex_value) for port, hex_value in readings
+                     for sensor in sandbox.sensors.match(device_id, port)])
+    
+    def mqtt_message(now, topic, payload):
+        try:
+            payload = json.loads(payload.decode())
+        except ValueError:
+            return
+        unit_topic = parse_unit_topic(topic)
+        if event_topic and topic == event_topic:
+            event(now, payload)
+        elif unit_topic and unit_topic[0] != unit_name:
+            apply_unit_message(sandbox.snapshot, topic, payload)
+            sandbox.analytics.apply_unit_message(topic, payload, now)
+    
+    def set_output(now, ip, port, state):
+        sandbox.snapshot.set_output(unit_name, heater_for_ip(ip), port, state)
+        sandbox.analytics.set_section(unit_name, heater_for_ip(ip), port, state, now)
+    
+    def command(now, payload):
+        if payload.get('type') == 'pdout':
+            set_output(now, payload['ip'], payload['port'], bool(payload['state']))
+        elif payload.get('type') == 'pdout_read':
+            set_output(now, payload['ip'], payload['port'], int(payload['value'].replace('0x', '') or '0', 16) != 0)
+    
+    def check_stale(now):
+        sandbox.now = now
+        for alarm in sandbox.alarms.check_stale(unit_name, [h['name'] for h in heaters], now):
+            sandbox.alarm_transitions += 1
+            logger.info(f"Replay alarm {alarm['state']}: {alarm['heater']} {alarm['alarm']} - {alarm['message']}")
+    
+    handlers = {
+        IOLINK: iolink,
+        IOLINK_ERROR: iolink_error,
+        EVENT: event,
+        MQTT: mqtt_message,
+        COMMAND: command,
+    }
+    try:
+        await replay_session(path, handlers, speed=speed, on_second=check_stale, progress=replay_progress)
+    except Exception as e:
+        logger.error(f"Replay of {path} failed: {e}")
+        replay_progress.update({'done': True, 'error': str(e)})
+    replay_progress.update({'alarm_transitions': sandbox.alarm_transitions, 'alarms_active': len(sandbox.alarms.active())})
+    if unmatched:
+        logger.warning(f"Replay skipped readings from sensors not configured here: {', '.join(sorted(unmatched))}")
+        replay_progress['unmatched_sensors'] = sorted(unmatched)
+
+def parse_speed(value):
+    """1, 100, ... or max/0 for as fast as possible"""
+    if value in (None, ''):
+        return 1.0
+    if str(value).lower() == 'max':
+        return 0.0
+    return max(0.0, float(value))
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     """Startup event handler"""
     logger.info("Starting IoT Control Server")
+    global main_loop
+    main_loop = asyncio.get_running_loop()
     try:
-        # Connect to MQTT broker
+        # Connect to MQTT broker in the background; the network loop retries until the broker is up,
+        # so serving and polling start immediately
         logger.info("Attempting to connect to MQTT broker...")
-        mqtt_client.connect(
+        mqtt_client.connect_async(
             os.getenv("MQTT_HOST", "mqtt"),
             int(os.getenv("MQTT_PORT", 1883))
         )
         mqtt_client.loop_start()
         logger.info("MQTT client loop started")
 
-        # Start temperature polling in the background
-        asyncio.create_task(poll_temperature())
-        logger.info("Temperature polling task started")
+        if loop_monitor is not None:
+            asyncio.create_task(loop_monitor.run())
+        if history_store is not None:
+            asyncio.create_task(run_history_store())
+        if telemetry_spool is not None:
+            asyncio.create_task(forward_spool())
+
+        if os.getenv("RECORD_SESSION", "false").lower() == "true":
+            start_recording()
+        
+        # Start temperature polling in the background (API-only workers leave it to the pollers);
+        # REPLAY_SESSION replays a recording instead of talking to hardware
+        if os.getenv("REPLAY_SESSION"):
+            path = os.path.join(recorder_dir, os.path.basename(os.getenv("REPLAY_SESSION")))
+            asyncio.create_task(replay_recording(path, parse_speed(os.getenv("REPLAY_SPEED"))))
+            logger.info(f"REPLAY_SESSION set: replaying {path} instead of polling")
+        elif backend_role == "api":
+            logger.info("BACKEND_ROLE=api: not polling; readings arrive from the poller workers")
+            if event_subscriptions is not None:
+                asyncio.create_task(register_event_sensors())
+        else:
+            asyncio.create_task(poll_temperature())
+            asyncio.create_task(refresh_device_identities())
+            logger.info("Temperature polling task started")
     except Exception as e:
         logger.error(f"Error starting temperature polling: {e}")
         logger.error(f"MQTT connection failed: {e}")
@@ -285,22 +932,38 @@ async def startup_event():
 # MQTT message handler
 def on_mqtt_message(client, userdata, message):
     try:
+        if session_recorder is not None:
+            session_recorder.mqtt(message.topic, message.payload)
         topic = message.topic
         payload = json.loads(message.payload.decode())
+        
+        # Events pushed by IO-Link masters over MQTT go through the ingest pipeline on the event loop
+        if event_topic and topic == event_topic:
+            run_on_loop(handle_iolink_event, payload)
+            return
+        
+        if cluster_channel is not None and topic == cluster_channel.topic:
+            run_on_loop(apply_cluster_message, payload)
+            return
+        
+        unit_topic = parse_unit_topic(topic)
+        if snapshot_unit_topics and unit_topic:
+            # This unit's own readings and sections are already in the snapshot; skip the echo
+            if unit_topic[0] != os.getenv("UNIT_NAME", "unit1"):
+                run_on_loop(apply_unit_message, snapshot_store, topic, payload)
+                run_on_loop(heater_analytics.apply_unit_message, topic, payload)
+            return
+        
         logger.info(f"Received MQTT message on topic {topic}: {payload}")
         
         # Check if this is temperature sensor data from port 6
         if topic == "iolink/master1/port6":
             try:
                 # Extract temperature value (adjust based on your sensor's data format)
-                temp_value = float(payload.get('value', 0)) * iolink_config['devices']['temperature_sensor']['scaling_factor']
-                timestamp = datetime.now().isoformat()
-                
-                latest_readings['temperature'] = {
-                    'value': temp_value,
-                    'unit': iolink_config['devices']['temperature_sensor']['unit'],
-                    'timestamp': timestamp
-                }
+                spec = temperature_decoder.signals[0]
+                temp_value = float(payload.get('value', 0)) * spec.scale + spec.offset
+                signal_id = reading_signals.register('temperature', unit=iolink_config['devices']['temperature_sensor']['unit'])
+                reading_signals.update(signal_id, temp_value)
                 
                 logger.info(f"Updated temperature reading: {temp_value}°C")
             except Exception as e:
@@ -312,25 +975,49 @@ def on_mqtt_message(client, userdata, message):
 mqtt_client.on_message = on_mqtt_message
 
 # API Endpoints
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Finish the session recording so its buffered tail is on disk"""
+    stop_recording()
+    if loop_monitor is not None:
+        loop_monitor.stop()
+
 @app.get("/api/status")
 async def get_status():
     return {"status": "running", "timestamp": datetime.now().isoformat()}
 
+def open_plc(ip_address, slot):
+    """Open a PLC connection; pycomm3 is only imported once a PLC is actually used"""
+    from pycomm3 import LogixDriver
+    plc = LogixDriver(ip_address, slot=slot)
+    plc.open()
+    return plc
+
 @app.post("/api/plc/connect")
 async def connect_plc(ip_address: str, slot: int = 0):
     try:
-        plc = LogixDriver(ip_address, slot=slot)
-        plc.open()
+        plc = open_plc(ip_address, slot)
         plc_connections[ip_address] = plc
+        plc_targets[ip_address] = slot
+        if cluster_channel is not None:
+            cluster_channel.publish('plc', ip=ip_address, slot=slot)
         return {"status": "connected", "ip_address": ip_address}
     except Exception as e:
         logger.error(f"Error connecting to PLC: {e}")
         return {"status": "error", "message": str(e)}
 
+def get_plc(ip_address):
+    """Connection for a PLC, opening it here if another worker connected it"""
+    plc = plc_connections.get(ip_address)
+    if plc is None and ip_address in plc_targets:
+        plc = open_plc(ip_address, plc_targets[ip_address])
+        plc_connections[ip_address] = plc
+    return plc
+
 @app.get("/api/plc/{ip_address}/tags")
 async def read_plc_tags(ip_address: str, tags: str):
     try:
-        plc = plc_connections.get(ip_address)
+        plc = get_plc(ip_address)
         if not plc:
             return {"error": "PLC not connected"}
         
@@ -348,50 +1035,365 @@ async def read_plc_tags(ip_address: str, tags: str):
 @app.post("/api/plc/{ip_address}/write")
 async def write_plc_tag(ip_address: str, tag: str, value: str):
     try:
-        plc = plc_connections.get(ip_address)
+        plc = get_plc(ip_address)
         if not plc:
             return {"error": "PLC not connected"}
         
         result = plc.write(tag, value)
+        if session_recorder is not None:
+            session_recorder.command({'type': 'plc_write', 'ip': ip_address, 'tag': tag, 'value': value})
         return {"status": "success", "result": result}
     except Exception as e:
         logger.error(f"Error writing to PLC: {e}")
         return {"error": str(e)}
 
+def latest_reading(key, error):
+    """Latest reading of a signal for the /api/temperature endpoints, or their error body"""
+    reading = reading_signals.latest(key)
+    return reading if reading is not None else {"error": error}
+
 @app.get("/api/temperature")
 async def get_temperature():
     """Get the latest temperature reading (HTR-A)"""
-    if 'temperature' in latest_readings:
-        return latest_readings['temperature']
-    return {"error": "No temperature readings available"}
+    return latest_reading('temperature', "No temperature readings available")
 
 @app.get("/api/temperature/htr-a")
 async def get_temperature_htr_a():
     """Get the latest HTR-A temperature reading"""
-    if 'temperature' in latest_readings:
-        return latest_readings['temperature']
-    return {"error": "No HTR-A temperature readings available"}
+    return latest_reading('temperature', "No HTR-A temperature readings available")
 
 @app.get("/api/temperature/htr-b")
 async def get_temperature_htr_b():
     """Get the latest HTR-B temperature reading"""
-    if 'temperature_htr_b' in latest_readings:
-        return latest_readings['temperature_htr_b']
-    return {"error": "No HTR-B temperature readings available"}
+    return latest_reading('temperature_htr_b', "No HTR-B temperature readings available")
 
 @app.get("/api/temperature/all")
 async def get_all_temperatures():
     """Get temperature readings from all devices"""
     result = {}
-    if 'temperature' in latest_readings:
-        result['htr_a'] = latest_readings['temperature']
-    if 'temperature_htr_b' in latest_readings:
-        result['htr_b'] = latest_readings['temperature_htr_b']
+    for name, key in (('htr_a', 'temperature'), ('htr_b', 'temperature_htr_b')):
+        reading = reading_signals.latest(key)
+        if reading is not None:
+            result[name] = reading
     
     if result:
         return result
     return {"error": "No temperature readings available"}
 
+@app.get("/api/readings")
+async def get_readings():
+    """Latest sample of every signal, with its ID and how many recent samples are kept"""
+    return reading_signals.report()
+
+@app.get("/api/readings/{key}")
+async def get_reading_history(key: str, limit: int = None):
+    """Recent samples of one signal (up to READING_RING_SIZE), oldest first"""
+    history = reading_signals.history(key, limit)
+    if history is None:
+        return JSONResponse({"error": f"Unknown signal {key}"}, status_code=404)
+    return history
+
+@app.get("/api/snapshot")
+async def get_snapshot(request: Request, since: str = None):
+    """Versioned view of every unit, heater, section output and health flag.
+
+    Send the last ETag as If-None-Match to get a 304 when nothing changed, and
+    the last `version` as `since` to get only the heaters that changed.
+    """
+    snapshot_store.expire()
+    headers = {"ETag": snapshot_store.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == snapshot_store.etag:
+        return Response(status_code=304, headers=headers)
+    body = snapshot_store.render(snapshot_store.parse_version(since))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/scheduler")
+async def get_scheduler_stats():
+    """Poll schedule, missed deadlines and tick lateness for each polling task"""
+    return {"schedulers": [schedule.report() for schedule in poll_schedulers]}
+
+@app.get("/api/sensors")
+async def get_sensors():
+    """Physical sensors, the heaters each one feeds and their fusion health"""
+    return {"method": sensor_model.method, "sensors": sensor_model.report()}
+
+@app.get("/api/recorder")
+async def get_recorder():
+    """Current recording, last replay (with its sandboxed results) and the recordings on disk"""
+    try:
+        files = sorted(name for name in os.listdir(recorder_dir) if name.endswith('.iotrec'))
+    except OSError:
+        files = []
+    return {
+        "recording": session_recorder.report() if session_recorder is not None else None,
+        "replay": replay_progress,
+        "replay_results": replay_results(),
+        "files": files,
+    }
+
+@app.post("/api/recorder/start")
+async def start_recorder(request: Request):
+    """Start recording; optional body {"name": "file.iotrec"}"""
+    try:
+        body = await request.json() if await request.body() else {}
+        if replay_progress is not None and not replay_progress.get('done'):
+            return JSONResponse({"error": "A replay is running"}, status_code=409)
+        recorder = start_recording(body.get('name'))
+        return {"status": "recording", "path": recorder.path}
+    except Exception as e:
+        logger.error(f"Error starting recorder: {e}")
+        return {"status": "error", "message": str(e)}
+
+@app.post("/api/recorder/stop")
+async def stop_recorder():
+    return {"status": "stopped", "recording": stop_recording()}
+
+@app.post("/api/recorder/replay")
+async def start_replay(request: Request):
+    """Replay a recording from RECORDER_DIR: {"file": "...", "speed": 1 | 100 | "max"}"""
+    try:
+        body = await request.json()
+        path = os.path.join(recorder_dir, os.path.basename(body.get('file', '')))
+        if not os.path.isfile(path):
+            return JSONResponse({"error": f"No recording {body.get('file')}"}, status_code=404)
+        if session_recorder is not None:
+            return JSONResponse({"error": "Stop the recorder before replaying"}, status_code=409)
+        if replay_progress is not None and not replay_progress.get('done'):
+            return JSONResponse({"error": "A replay is already running"}, status_code=409)
+        asyncio.create_task(replay_recording(path, parse_speed(body.get('speed'))))
+        return {"status": "replaying", "file": os.path.basename(path)}
+    except Exception as e:
+        logger.error(f"Error starting replay: {e}")
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/analytics")
+async def get_analytics(unit: str = None):
+    """Duty cycle, switches, energy and time-at-temperature for every heater (or one unit), with totals"""
+    return heater_analytics.report(unit)
+
+@app.get("/api/analytics/{unit}/{heater}")
+async def get_heater_analytics(unit: str, heater: str):
+    report = heater_analytics.heater_report(unit, heater)
+    if report is None:
+        return JSONResponse({"error": f"No analytics for {unit}/{heater}"}, status_code=404)
+    return report
+
+@app.get("/api/throttle")
+async def get_throttle_stats():
+    """Client rate limiting and master request dedup/caching counters"""
+    return {
+        "clients": dict(api_limiter.stats, rate=api_limiter.rate, burst=api_limiter.burst, tracked=len(api_limiter.buckets)),
+        "masters": dict(master_limiter.stats, rate=master_limiter.rate, burst=master_limiter.burst),
+        "single_flight": dict(master_reads.stats, in_flight=len(master_reads.calls)),
+        "read_cache": dict(master_read_cache.stats, ttl_ms=round(master_read_cache.ttl * 1000), entries=len(master_read_cache.entries)),
+    }
+
+@app.get("/api/loop")
+async def get_loop_health(stacks: bool = True):
+    """Event loop lag percentiles and recent stalls with the stack that blocked the loop"""
+    if loop_monitor is None:
+        return JSONResponse({"error": "Loop monitor disabled (LOOP_MONITOR=false)"}, status_code=404)
+    return loop_monitor.report(stacks=stacks)
+
+@app.get("/api/admin/profile")
+async def profile_process(request: Request, seconds: float = 10.0, interval_ms: float = 5.0, threads: str = "loop"):
+    """Sample stacks for `seconds` and return them collapsed (flamegraph.pl / speedscope input).
+
+    threads=loop samples the event loop thread only, threads=all every thread.
+    """
+    if not admin_token:
+        return JSONResponse({"error": "Profiling is disabled; set ADMIN_TOKEN to enable it"}, status_code=403)
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), admin_token):
+        return JSONResponse({"error": "Invalid admin token"}, status_code=403)
+    if profiler.busy():
+        return JSONResponse({"error": "A profile is already running"}, status_code=409)
+    thread_ids = None if threads == "all" else [threading.get_ident()]
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, profiler.profile, seconds, interval_ms / 1000.0, thread_ids)
+    except RuntimeError as e:
+        return JSONResponse({"error": str(e)}, status_code=409)
+    filename = f"profile-{datetime.now():%Y%m%dT%H%M%S}.collapsed"
+    return Response(result['collapsed'], media_type="text/plain", headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Profile-Samples": str(result['samples']),
+        "X-Profile-Seconds": str(result['seconds']),
+    })
+
+def autotune_report(name):
+    run = autotune_runs.get(name)
+    if run is None:
+        return None
+    return dict(run['experiment'].report(time.monotonic()), heater=name, sections=run['sections'])
+
+@app.post("/api/autotune/{heater_name}")
+async def start_autotune(heater_name: str, request: Request):
+    """Start a relay-feedback experiment: sections toggle around the setpoint until Ku/Pu are known"""
+    heater = next((h for h in get_heater_configs() if h['name'] == heater_name), None)
+    if heater is None:
+        return JSONResponse({"error": f"Unknown heater {heater_name}"}, status_code=404)
+    run = autotune_runs.get(heater_name)
+    if run is not None and not run['task'].done():
+        return JSONResponse({"error": f"Autotune of {heater_name} already running"}, status_code=409)
+    try:
+        body = await request.json()
+        sections = [int(p) for p in body.get('sections', HEATER_SECTIONS)]
+        experiment = RelayExperiment(
+            setpoint=float(body['setpoint']),
+            hysteresis=float(body.get('hysteresis', 2.0)),
+            output_swing=100.0 * len(sections) / len(HEATER_SECTIONS),
+            cycles=int(body.get('cycles', 3)),
+            max_seconds=float(body.get('max_minutes', 60)) * 60,
+            max_temperature=float(os.getenv("AUTOTUNE_MAX_TEMPERATURE", "750")),
+            sample_period=heater['update_rate'] / 1000.0,
+            rule=body.get('rule', os.getenv("AUTOTUNE_RULE", DEFAULT_RULE)),
+        )
+        if not sections or experiment.setpoint + experiment.hysteresis >= experiment.max_temperature:
+            raise ValueError("Need at least one section and a setpoint band below AUTOTUNE_MAX_TEMPERATURE")
+    except (KeyError, TypeError, ValueError) as e:
+        return JSONResponse({"error": f"Invalid autotune request: {e}"}, status_code=400)
+
+    queue = asyncio.Queue(maxsize=100)
+    autotune_runs[heater_name] = {
+        'experiment': experiment,
+        'sections': sections,
+        'queue': queue,
+        'task': asyncio.create_task(run_autotune(heater, experiment, sections, queue)),
+    }
+    log_important(f"Autotune {heater['label']} started: setpoint {experiment.setpoint}, sections {sections}")
+    return {"status": "started", **autotune_report(heater_name)}
+
+@app.post("/api/autotune/{heater_name}/cancel")
+async def cancel_autotune(heater_name: str):
+    run = autotune_runs.get(heater_name)
+    if run is None or run['task'].done():
+        return JSONResponse({"error": f"No autotune of {heater_name} running"}, status_code=404)
+    run['task'].cancel()
+    try:
+        await run['task']
+    except asyncio.CancelledError:
+        pass
+    return autotune_report(heater_name)
+
+@app.get("/api/autotune")
+async def get_autotune_runs():
+    return {name: autotune_report(name) for name in autotune_runs}
+
+@app.get("/api/autotune/{heater_name}")
+async def get_autotune(heater_name: str):
+    """Current or last experiment and the gains stored in heater_config"""
+    try:
+        stored = await asyncio.to_thread(tuning_store.load, int(os.getenv("UNIT_NUMBER", "1")), heater_type(heater_name))
+    except Exception as e:
+        logger.error(f"Could not load tuned gains for {heater_name}: {e}")
+        stored = None
+    return {"run": autotune_report(heater_name), "stored": stored}
+
+@app.get("/api/alarms")
+async def get_alarms():
+    """Currently active alarms for every heater"""
+    return {"alarms": alarm_engine.active()}
+
+def heater_for_ip(ip):
+    """Name of this unit's heater behind an IO-Link master IP (the IP itself if unknown)"""
+    for heater in get_heater_configs():
+        if heater['ip'] == ip:
+            return heater['name']
+    return ip
+
+@app.get("/api/history/export")
+async def export_history(unit: str = None, heater: str = None, start: str = None, end: str = None,
+                         format: str = "csv", page_size: int = 5000):
+    """Stream stored readings for a unit/heater/time range as CSV, NDJSON, Arrow or Parquet."""
+    if history_store is None or not history_store.enabled:
+        return JSONResponse({"error": "Temperature history is not available"}, status_code=503)
+    if format not in ENCODERS:
+        return JSONResponse({"error": f"Unsupported format {format}; use one of {', '.join(ENCODERS)}"}, status_code=400)
+    try:
+        end_time = parse_time(end, datetime.now(timezone.utc))
+        start_time = parse_time(start, end_time - timedelta(days=1))
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid time range: {e}"}, status_code=400)
+
+    unit = unit or os.getenv("UNIT_NAME", "unit1")
+    heaters = [h.strip().lower().replace('-', '_') for h in heater.split(',')] if heater else None
+    pages = history_store.iter_pages(unit, heaters, start_time, end_time, max(100, min(page_size, 50000)))
+    try:
+        body = ENCODERS[format](pages)
+    except ImportError:
+        return JSONResponse({"error": f"{format} export requires pyarrow"}, status_code=400)
+
+    filename = f"{unit}_{heater or 'all'}_{start_time:%Y%m%dT%H%M%S}_{end_time:%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+async def run_autotune(heater, experiment, sections, queue):
+    """Drive the relay experiment on the heater's sections from its temperature stream"""
+    name = heater['name']
+    stale_after = max(10.0, 10 * heater['update_rate'] / 1000.0)
+    relay = None
+    try:
+        while experiment.state == 'running':
+            try:
+                value = await asyncio.wait_for(queue.get(), timeout=stale_after)
+            except asyncio.TimeoutError:
+                experiment.abort(f"No temperature for {stale_after:.0f} s")
+                break
+            state = experiment.update(value, time.monotonic())
+            if state is not None and state != relay:
+                for port in sections:
+                    data = await write_port_output(heater['ip'], port, state)
+                    if not (isinstance(data, dict) and data.get('code') == 200):
+                        raise RuntimeError(f"Section {port} did not accept the command: {data}")
+                relay = state
+    except asyncio.CancelledError:
+        experiment.abort("Cancelled")
+        raise
+    except Exception as e:
+        logger.error(f"Autotune of {heater['label']} failed: {e}")
+        experiment.abort(str(e))
+    finally:
+        # Never leave the relay on, whatever ended the experiment
+        for port in sections:
+            try:
+                await write_port_output(heater['ip'], port, False)
+            except Exception as e:
+                logger.error(f"Could not switch off section {port} of {heater['label']} after autotune: {e}")
+    log_important(f"Autotune {heater['label']}: {experiment.state} - {experiment.message}")
+    if experiment.result is not None:
+        try:
+            experiment.result['stored'] = await asyncio.to_thread(
+                tuning_store.save, int(os.getenv("UNIT_NUMBER", "1")), heater_type(name), experiment.result)
+        except Exception as e:
+            logger.error(f"Could not store tuned gains for {heater['label']}: {e}")
+            experiment.result['stored'] = False
+
+async def write_port_output(io_link_ip, port_num, state):
+    """Set a section output on a master port (pdout 01/00)"""
+    adr = f"iolinkmaster/port[{port_num}]/iolinkdevice/pdout/setdata"
+    url = f"http://{io_link_ip}/iolinkmaster/port%5B{port_num}%5D/iolinkdevice/pdout/setdata"
+
+    logger.info(f"Sending IO-Link command to {io_link_ip}:{port_num} - State: {state}")
+    log_important(f"Section {port_num} → {'ON' if state else 'OFF'} (IP: {io_link_ip})")
+
+    payload = {
+        "code": "request",
+        "cid": 4711,
+        "adr": adr,
+        "data": {"newvalue": "01" if state else "00"}
+    }
+    await master_limiter.acquire(io_link_ip)
+    master_read_cache.invalidate((io_link_ip, port_num))
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=payload) as resp:
+            data = await resp.json()
+            logger.info(f"IO-Link command response: {data}")
+            if isinstance(data, dict) and data.get('code') == 200:
+                record_output(heater_for_ip(io_link_ip), port_num, bool(state))
+                if session_recorder is not None:
+                    session_recorder.command({'type': 'pdout', 'ip': io_link_ip, 'port': port_num, 'state': bool(state)})
+            return data
+
 @app.post("/api/iolink/port/{port_num}/setdata")
 async def set_iolink_port_output(port_num: int, request: Request):
     """Relay IO-Link output command to the IO-Link master for the given port."""
@@ -421,26 +1423,42 @@ async def set_iolink_port_output(port_num: int, request: Request):
                 # Assume it's just the last octet
                 io_link_ip = f"192.168.{unit_subnet}.{io_link_ip}"
         
-        adr = f"iolinkmaster/port[{port_num}]/iolinkdevice/pdout/setdata"
-        url = f"http://{io_link_ip}/iolinkmaster/port%5B{port_num}%5D/iolinkdevice/pdout/setdata"
-        
-        logger.info(f"Sending IO-Link command to {io_link_ip}:{port_num} - State: {state}")
-        log_important(f"Section {port_num} → {'ON' if state else 'OFF'} (IP: {io_link_ip})")
-        
+        data = await write_port_output(io_link_ip, port_num, state)
+        return {"status": "ok", "response": data}
+    except Exception as e:
+        logger.error(f"Error relaying IO-Link output command: {e}")
+        return {"status": "error", "message": str(e)}
+
+async def read_port_output(io_link_ip, port_num):
+    """pdout of a master port; concurrent and repeated reads within the cache TTL share one request"""
+    key = (io_link_ip, port_num)
+    data = master_read_cache.get(key)
+    if data is not None:
+        return data
+
+    async def fetch():
+        await master_limiter.acquire(io_link_ip)
+        adr = f"iolinkmaster/port[{port_num}]/iolinkdevice/pdout/getdata"
+        url = f"http://{io_link_ip}/iolinkmaster/port%5B{port_num}%5D/iolinkdevice/pdout/getdata"
+        logger.info(f"Reading IO-Link output from {io_link_ip}:{port_num}")
         payload = {
             "code": "request",
             "cid": 4711,
-            "adr": adr,
-            "data": {"newvalue": "01" if state else "00"}
+            "adr": adr
         }
         async with aiohttp.ClientSession() as session:
             async with session.post(url, json=payload) as resp:
                 data = await resp.json()
-                logger.info(f"IO-Link command response: {data}")
-                return {"status": "ok", "response": data}
-    except Exception as e:
-        logger.error(f"Error relaying IO-Link output command: {e}")
-        return {"status": "error", "message": str(e)}
+        logger.info(f"IO-Link read response: {data}")
+        value = (data.get('data') or {}).get('value') if isinstance(data, dict) else None
+        if isinstance(value, str):
+            record_output(heater_for_ip(io_link_ip), port_num, int(value.replace('0x', '') or '0', 16) != 0)
+            if session_recorder is not None:
+                session_recorder.command({'type': 'pdout_read', 'ip': io_link_ip, 'port': port_num, 'value': value})
+            master_read_cache.put(key, data)
+        return data
+
+    return await master_reads.do(key, fetch)
 
 @app.post("/api/iolink/port/{port_num}/getdata")
 async def get_iolink_port_output(port_num: int, request: Request):
@@ -470,34 +1488,115 @@ async def get_iolink_port_output(port_num: int, request: Request):
                 # Assume it's just the last octet
                 io_link_ip = f"192.168.{unit_subnet}.{io_link_ip}"
         
-        adr = f"iolinkmaster/port[{port_num}]/iolinkdevice/pdout/getdata"
-        url = f"http://{io_link_ip}/iolinkmaster/port%5B{port_num}%5D/iolinkdevice/pdout/getdata"
-        
-        logger.info(f"Reading IO-Link output from {io_link_ip}:{port_num}")
-        
-        payload = {
-            "code": "request",
-            "cid": 4711,
-            "adr": adr
-        }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload) as resp:
-                data = await resp.json()
-                logger.info(f"IO-Link read response: {data}")
-                return {"status": "ok", "response": data}
+        data = await read_port_output(io_link_ip, port_num)
+        return {"status": "ok", "response": data}
     except Exception as e:
         logger.error(f"Error reading IO-Link output: {e}")
         return {"status": "error", "message": str(e)}
 
+def parse_isdu_indices(value):
+    """"16,18,0x40/1" -> [(16, 0), (18, 0), (64, 1)]; default: the identification indices"""
+    if not value:
+        return [(index, 0) for index in ISDU_NAMES]
+    indices = []
+    for item in value.split(','):
+        index, _, subindex = item.strip().partition('/')
+        indices.append((int(index, 0), int(subindex or '0', 0)))
+    return indices
+
+@app.get("/api/iolink/parameters")
+async def get_iolink_parameter_cache():
+    """Every cached master identity, port identification and ISDU value"""
+    return device_parameters.report()
+
+@app.get("/api/iolink/{ip_address}/identity")
+async def get_iolink_identity(ip_address: str, refresh: bool = False):
+    """The master's identity and every port's device identification (one bulk read, then cached)"""
+    try:
+        async with aiohttp.ClientSession() as session:
+            master = await device_parameters.master(session, ip_address, refresh=refresh)
+            ports = await device_parameters.identify(session, ip_address, refresh=refresh)
+        if master is None and not ports:
+            return JSONResponse({"error": f"No IO-Link master answering at {ip_address}"}, status_code=502)
+        return {"master": master, "ports": {str(port): identity for port, identity in ports.items()}}
+    except Exception as e:
+        logger.error(f"Error identifying IO-Link master {ip_address}: {e}")
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/iolink/{ip_address}/port/{port_num}/parameters")
+async def get_iolink_parameters(ip_address: str, port_num: int, index: str = None):
+    """ISDU parameters of a port's device, e.g. ?index=16,21,0x40/1 (default: identification)"""
+    try:
+        indices = parse_isdu_indices(index)
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid index list: {e}"}, status_code=400)
+    try:
+        async with aiohttp.ClientSession() as session:
+            values = await device_parameters.read_many(session, ip_address, [(port_num, i, s) for i, s in indices])
+        return {
+            "ip": ip_address,
+            "port": port_num,
+            "parameters": {parameter_name(i, s): value for (_, i, s), value in values.items()},
+        }
+    except Exception as e:
+        logger.error(f"Error reading ISDU parameters from {ip_address}:{port_num}: {e}")
+        return {"status": "error", "message": str(e)}
+
+@app.post("/api/iolink/{ip_address}/invalidate")
+async def invalidate_iolink_parameters(ip_address: str, port: int = None):
+    """Drop cached identification/parameters after replacing a device (all ports if none given)"""
+    device_parameters.invalidate(ip_address, port)
+    return {"status": "ok", "ip": ip_address, "port": port}
+
+@app.post("/api/iolink/events")
+async def receive_iolink_event(request: Request):
+    """Callback for datachanged/timer events pushed by IO-Link masters."""
+    try:
+        event = await request.json()
+        ingested = handle_iolink_event(event)
+        return {"code": 200, "ingested": ingested}
+    except Exception as e:
+        logger.error(f"Error handling IO-Link event: {e}")
+        return {"status": "error", "message": str(e)}
+
 # WebSocket for real-time updates
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, format: str = "json"):
+    """Alarm transitions as JSON; with ?format=compact also every reading as binary frames (see wire.py)"""
     await websocket.accept()
+    queue = asyncio.Queue(maxsize=100)
+    ws_queues.add(queue)
+    compact = format == "compact"
+    if compact:
+        compact_ws_queues.add(queue)
+
+    async def forward():
+        # Send real-time updates (alarm transitions, compact samples) to connected clients.
+        # Samples are encoded here, per session, so dropping them on a full queue keeps deltas consistent.
+        encoder = CompactEncoder(signal_table) if compact else None
+        while True:
+            message = await queue.get()
+            if isinstance(message, tuple):
+                _, timestamp, samples = message
+                signals = encoder.new_signals(samples)
+                if signals is not None:
+                    await websocket.send_bytes(signals)
+                await websocket.send_bytes(encoder.encode(samples, timestamp))
+            else:
+                await websocket.send_json(message)
+
+    sender = asyncio.create_task(forward())
+    message = {}
     try:
         while True:
-            # Send real-time updates to connected clients
-            await asyncio.sleep(1)
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        await websocket.close() 
\ No newline at end of file
+        ws_queues.discard(queue)
+        compact_ws_queues.discard(queue)
+        sender.cancel()
+        if message.get('type') != 'websocket.disconnect':
+            await websocket.close() 
\ No newline at end of file
@@ -0,0 +1,298 @@
+"""
+Identification and ISDU parameters of IO-Link masters and their port devices.
+
+A port's identification (vendor ID, device ID, product name, serial number,
+status) is read for all ports of a master with one getdatamulti request, or
+port by port with a few requests in flight on masters without it. ISDU
+parameters are read with iolreadacyclic. Everything is cached per
+(master, port) and stays valid until the device on the port changes:
+`identify(refresh=True)` re-reads the identification in bulk and drops the
+cached parameters of every port whose vendor/device ID or serial differs.
+
+The master's own identity comes from /iolinkmaster/deviceinfo (as in
+iolink-discovery-v2.py); its MAC, dash separated, is the device ID masters
+put in event srcurls (HTR_x_DEVICE_ID).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from .throttle import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_FIELDS = ('vendorid', 'deviceid', 'productname', 'serial', 'status')
+# Port identity is the same device while these match
+DEVICE_KEY = ('vendorid', 'deviceid', 'serial')
+
+# Identification ISDU indices (IO-Link spec, B.2); their values are strings
+ISDU_NAMES = {
+    0x10: 'vendor_name',
+    0x11: 'vendor_text',
+    0x12: 'product_name',
+    0x13: 'product_id',
+    0x14: 'product_text',
+    0x15: 'serial_number',
+    0x16: 'hardware_revision',
+    0x17: 'firmware_revision',
+    0x18: 'application_tag',
+}
+
+
+# Replies meaning the master does not implement a service at all, rather than a transient failure
+UNKNOWN_SERVICE_CODES = (400, 404, 405, 501)
+
+
+def unknown_service(status: int, data: Any) -> bool:
+    """True if a reply to a JSON service request says the service does not exist"""
+    if status in UNKNOWN_SERVICE_CODES:
+        return True
+    if status != 200 or not isinstance(data, dict):
+        return False
+    try:
+        return int(data.get('code')) in UNKNOWN_SERVICE_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+class BatchSupport:
+    """Which masters take getdatamulti.
+
+    A definitive "unknown service" reply is remembered for good; any other
+    failure (5xx, malformed reply) only pauses batching on that master for
+    `retry_after` seconds.
+    """
+
+    def __init__(self, retry_after: float = 60.0):
+        self.retry_after = retry_after
+        self.unsupported = set()
+        self.paused_until: Dict[str, float] = {}
+
+    def usable(self, ip: str) -> bool:
+        if ip in self.unsupported:
+            return False
+        until = self.paused_until.get(ip)
+        if until is not None and time.monotonic() < until:
+            return False
+        self.paused_until.pop(ip, None)
+        return True
+
+    def failed(self, ip: str, status: int, data: Any) -> bool:
+        """Record a failed batch request; returns True if the master does not support it"""
+        if unknown_service(status, data):
+            self.unsupported.add(ip)
+            return True
+        self.paused_until[ip] = time.monotonic() + self.retry_after
+        return False
+
+
+def identity_path(port, field: str) -> str:
+    return f"/iolinkmaster/port[{port}]/iolinkdevice/{field}"
+
+
+def device_id_from_mac(mac: str) -> str:
+    """00:02:01:6d:55:8a -> 00-02-01-6D-55-8A"""
+    return mac.replace(':', '-').upper()
+
+
+def parameter_name(index: int, subindex: int = 0) -> str:
+    if subindex == 0 and index in ISDU_NAMES:
+        return ISDU_NAMES[index]
+    return f"{index}/{subindex}"
+
+
+def decode_isdu(index: int, value: Any) -> Any:
+    """Identification strings come back as hex; other indices are returned raw"""
+    if index in ISDU_NAMES and isinstance(value, str):
+        try:
+            return bytes.fromhex(value.replace('0x', '')).rstrip(b'\x00').decode('utf-8', 'replace')
+        except ValueError:
+            return value
+    return value
+
+
+class ParameterCache:
+    """Cached identification and ISDU reads, with bounded concurrency per master"""
+
+    def __init__(self, ports: int = 8, concurrency: int = 4, timeout: float = 5.0, limiter=None,
+                 batch_retry_after: float = 60.0):
+        self.ports = ports
+        self.concurrency = max(1, concurrency)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.limiter = limiter
+        self.masters: Dict[str, Dict] = {}
+        self.devices: Dict[Tuple[str, int], Dict] = {}
+        self.parameters: Dict[Tuple[str, int], Dict[Tuple[int, int], Any]] = {}
+        self.batch = BatchSupport(batch_retry_after)
+        self.flights = SingleFlight()
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.stats = {'requests': 0, 'hits': 0, 'misses': 0, 'errors': 0, 'device_changes': 0}
+
+    def _semaphore(self, ip: str) -> asyncio.Semaphore:
+        semaphore = self.semaphores.get(ip)
+        if semaphore is None:
+            semaphore = self.semaphores[ip] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+
+    async def _call(self, session: aiohttp.ClientSession, ip: str, method: str, url: str, body: Optional[Dict] = None):
+        async with self._semaphore(ip):
+            if self.limiter is not None:
+                await self.limiter.acquire(ip)
+            self.stats['requests'] += 1
+            async with session.request(method, url, json=body, timeout=self.timeout) as response:
+                data = await response.json(content_type=None)
+                return response.status, data
+
+    def device_id(self, ip: str) -> Optional[str]:
+        master = self.masters.get(ip)
+        return master['device_id'] if master else None
+
+    async def master(self, session: aiohttp.ClientSession, ip: str, refresh: bool = False) -> Optional[Dict]:
+        """deviceinfo of a master with its MAC and event device ID, or None if it cannot be read"""
+        if not refresh and ip in self.masters:
+            self.stats['hits'] += 1
+            return self.masters[ip]
+        self.stats['misses'] += 1
+
+        async def fetch():
+            try:
+                status, data = await self._call(session, ip, 'GET', f"http://{ip}/iolinkmaster/deviceinfo")
+            except Exception as e:
+                logger.warning(f"Could not read deviceinfo of {ip}: {e}")
+                self.stats['errors'] += 1
+                return None
+            mac = (data.get('mac') or data.get('macAddress')) if status == 200 and isinstance(data, dict) else None
+            if not mac:
+                logger.warning(f"deviceinfo of {ip} has no MAC address: {data}")
+                self.stats['errors'] += 1
+                return None
+            master = {'ip': ip, 'mac': mac.upper(), 'device_id': device_id_from_mac(mac),
+                      'info': data, 'read_at': time.time()}
+            self.masters[ip] = master
+            return master
+
+        return await self.flights.do(('master', ip), fetch)
+
+    async def identify(self, session: aiohttp.ClientSession, ip: str, ports: Optional[Iterable[int]] = None,
+                       refresh: bool = False) -> Dict[int, Dict]:
+        """Identification of each port's device; refresh=True re-reads it and drops stale parameters"""
+        ports = sorted(int(p) for p in (ports or range(1, self.ports + 1)))
+        if not refresh and all((ip, p) in self.devices for p in ports):
+            self.stats['hits'] += 1
+            return {p: self.devices[(ip, p)] for p in ports}
+        self.stats['misses'] += 1
+        fields = await self.flights.do(('identity', ip, tuple(ports)), lambda: self._read_identity(session, ip, ports))
+        if not fields:
+            # Master unreachable: keep what we knew
+            return {p: self.devices[(ip, p)] for p in ports if (ip, p) in self.devices}
+
+        identities = {}
+        for port in ports:
+            identity = {field: fields.get((port, field)) for field in IDENTITY_FIELDS}
+            identity['read_at'] = time.time()
+            previous = self.devices.get((ip, port))
+            if previous is not None and any(previous[k] != identity[k] for k in DEVICE_KEY):
+                self.stats['device_changes'] += 1
+                self.parameters.pop((ip, port), None)
+                logger.info(f"Device on {ip} port {port} changed "
+                            f"({previous['productname']} {previous['serial']} -> {identity['productname']} {identity['serial']})")
+            self.devices[(ip, port)] = identity
+            identities[port] = identity
+        return identities
+
+    async def _read_identity(self, session: aiohttp.ClientSession, ip: str, ports: List[int]) -> Dict[Tuple[int, str], Any]:
+        addresses = {identity_path(p, f): (p, f) for p in ports for f in IDENTITY_FIELDS}
+        if self.batch.usable(ip):
+            request = {'code': 'request', 'cid': 4713, 'adr': '/getdatamulti', 'data': {'datatosend': list(addresses)}}
+            try:
+                status, data = await self._call(session, ip, 'POST', f"http://{ip}/", request)
+            except Exception as e:
+                logger.warning(f"Could not read identification of {ip}: {e}")
+                self.stats['errors'] += 1
+                return {}
+            if status == 200 and isinstance(data, dict) and data.get('code') == 200 and isinstance(data.get('data'), dict):
+                values = {}
+                for address, key in addresses.items():
+                    entry = data['data'].get(address) or {}
+                    values[key] = entry.get('data') if entry.get('code') == 200 else None
+                return values
+            if self.batch.failed(ip, status, data):
+                logger.warning(f"Master {ip} does not support getdatamulti; reading identification per port")
+            else:
+                logger.warning(f"getdatamulti on {ip} failed (HTTP {status}: {data}); reading identification per port "
+                               f"for {self.batch.retry_after:.0f}s")
+
+        async def read_one(address: str):
+            url = f"http://{ip}{address.replace('[', '%5B').replace(']', '%5D')}/getdata"
+            try:
+                status, data = await self._call(session, ip, 'GET', url)
+            except Exception:
+                self.stats['errors'] += 1
+                return None
+            if status != 200 or not isinstance(data, dict) or data.get('code', 200) != 200:
+                return None
+            return (data.get('data') or {}).get('value')
+
+        results = await asyncio.gather(*(read_one(a) for a in addresses))
+        return dict(zip(addresses.values(), results))
+
+    async def read(self, session: aiohttp.ClientSession, ip: str, port: int, index: int, subindex: int = 0) -> Any:
+        """One ISDU parameter of a port's device (None if the read fails)"""
+        cached = self.parameters.get((ip, port), {})
+        if (index, subindex) in cached:
+            self.stats['hits'] += 1
+            return cached[(index, subindex)]
+        self.stats['misses'] += 1
+
+        async def fetch():
+            request = {'code': 'request', 'cid': 4714, 'adr': identity_path(port, 'iolreadacyclic'),
+                       'data': {'index': index, 'subindex': subindex}}
+            try:
+                status, data = await self._call(session, ip, 'POST', f"http://{ip}/", request)
+            except Exception as e:
+                logger.warning(f"ISDU read {index}/{subindex} on {ip} port {port} failed: {e}")
+                self.stats['errors'] += 1
+                return None
+            if status != 200 or not isinstance(data, dict):
+                logger.warning(f"ISDU read {index}/{subindex} on {ip} port {port} failed: HTTP {status}")
+                self.stats['errors'] += 1
+                return None
+            # A refusal from the master (e.g. index not supported by the device) is cached as None too
+            value = decode_isdu(index, (data.get('data') or {}).get('value')) if data.get('code') == 200 else None
+            self.parameters.setdefault((ip, port), {})[(index, subindex)] = value
+            return value
+
+        return await self.flights.do(('isdu', ip, port, index, subindex), fetch)
+
+    async def read_many(self, session: aiohttp.ClientSession, ip: str,
+                        reads: Iterable[Tuple[int, int, int]]) -> Dict[Tuple[int, int, int], Any]:
+        """(port, index, subindex) -> value; uncached reads run concurrently"""
+        reads = list(dict.fromkeys(reads))
+        values = await asyncio.gather(*(self.read(session, ip, *r) for r in reads))
+        return dict(zip(reads, values))
+
+    def invalidate(self, ip: str, port: Optional[int] = None):
+        """Forget a port's (or a whole master's) identification and parameters"""
+        if port is None:
+            self.masters.pop(ip, None)
+        for key in [k for k in list(self.devices) + list(self.parameters) if k[0] == ip and port in (None, k[1])]:
+            self.devices.pop(key, None)
+            self.parameters.pop(key, None)
+
+    def report(self, ip: Optional[str] = None) -> Dict:
+        masters = [m for m in self.masters.values() if ip in (None, m['ip'])]
+        ports = {}
+        for (master_ip, port), identity in sorted(self.devices.items()):
+            if ip in (None, master_ip):
+                parameters = self.parameters.get((master_ip, port), {})
+                ports.setdefault(master_ip, {})[str(port)] = dict(identity, parameters={
+                    parameter_name(i, s): v for (i, s), v in sorted(parameters.items())})
+        return {
+            'masters': [{k: v for k, v in m.items() if k != 'info'} for m in masters],
+            'ports': ports,
+            'stats': dict(self.stats),
+        }
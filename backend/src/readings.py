@@ -0,0 +1,137 @@
+"""
+Latest readings and a short history per signal, for the /api/temperature* and /api/readings endpoints.
+
+Each signal (e.g. a heater's temperature) gets an integer ID when first
+registered. Its static metadata (key, unit, device, IP) is stored once, and
+samples go into a fixed ring: monotonic time and value in preallocated
+arrays, and the raw process data hex string, as received, in a list of the
+same size (so payloads of any length come back unchanged). Updating a signal
+only writes ring slots, so the hot ingest path creates no per-reading dicts
+or timestamp strings. Those are built when an endpoint asks for them.
+"""
+
+import logging
+import math
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SignalMeta:
+    """Static description of a signal, shared by all its samples"""
+
+    __slots__ = ('id', 'key', 'device', 'unit', 'ip')
+
+    def __init__(self, signal_id: int, key: str, device: Optional[str], unit: Optional[str], ip: Optional[str]):
+        self.id = signal_id
+        self.key = key
+        self.device = device
+        self.unit = unit
+        self.ip = ip
+
+
+class Signal:
+    """Ring of the `size` most recent samples of one signal"""
+
+    __slots__ = ('meta', 'times', 'raws', 'values', 'head', 'count', 'wall')
+
+    def __init__(self, meta: SignalMeta, size: int):
+        self.meta = meta
+        self.times = array('d', bytes(8 * size))
+        self.raws: List[Optional[str]] = [None] * size
+        self.values = array('d', bytes(8 * size))
+        self.head = -1
+        self.count = 0
+        self.wall = 0.0
+
+    def add(self, value: float, raw: Optional[str], now: float, wall: float):
+        size = len(self.values)
+        head = self.head + 1
+        if head == size:
+            head = 0
+        self.times[head] = now
+        self.raws[head] = raw
+        self.values[head] = value
+        self.head = head
+        if self.count < size:
+            self.count += 1
+        self.wall = wall
+
+    def samples(self, limit: Optional[int] = None) -> List[tuple]:
+        """(monotonic time, raw or None, value) pairs, oldest first"""
+        count = self.count if limit is None else min(limit, self.count)
+        size = len(self.values)
+        result = []
+        for i in range(count - 1, -1, -1):
+            slot = (self.head - i) % size
+            result.append((self.times[slot], self.raws[slot], self.values[slot]))
+        return result
+
+
+class SignalRegistry:
+    """Signals by integer ID (and by key for lookups)"""
+
+    def __init__(self, ring_size: int = 64):
+        self.ring_size = max(1, ring_size)
+        self.ids: Dict[str, int] = {}
+        self.signals: List[Signal] = []
+
+    def register(self, key: str, device: Optional[str] = None, unit: Optional[str] = None,
+                 ip: Optional[str] = None) -> int:
+        signal_id = self.ids.get(key)
+        if signal_id is None:
+            signal_id = len(self.signals)
+            self.signals.append(Signal(SignalMeta(signal_id, key, device, unit, ip), self.ring_size))
+            self.ids[key] = signal_id
+        return signal_id
+
+    def update(self, signal_id: int, value: float, raw: Optional[str] = None,
+               now: Optional[float] = None, wall: Optional[float] = None):
+        """Add a sample; `raw` is the process data as hex, kept as given"""
+        self.signals[signal_id].add(value, raw or None, time.monotonic() if now is None else now,
+                                    time.time() if wall is None else wall)
+
+    def latest(self, key: str) -> Optional[Dict]:
+        """The latest sample of a signal in the /api/temperature form, or None"""
+        signal_id = self.ids.get(key)
+        if signal_id is None:
+            return None
+        signal = self.signals[signal_id]
+        if signal.count == 0:
+            return None
+        meta = signal.meta
+        value = signal.values[signal.head]
+        return {
+            'value': None if math.isnan(value) else value,
+            'unit': meta.unit,
+            'timestamp': datetime.fromtimestamp(signal.wall).isoformat(),
+            'raw_value': signal.raws[signal.head],
+            'device': meta.device,
+            'ip': meta.ip,
+        }
+
+    def history(self, key: str, limit: Optional[int] = None) -> Optional[Dict]:
+        """Recent samples of a signal with ages in seconds (newest last), or None"""
+        signal_id = self.ids.get(key)
+        if signal_id is None:
+            return None
+        signal = self.signals[signal_id]
+        now = time.monotonic()
+        return {
+            'id': signal_id,
+            'key': key,
+            'latest': self.latest(key),
+            'samples': [{'age_s': round(now - t, 3), 'raw_value': raw, 'value': value}
+                        for t, raw, value in signal.samples(limit)],
+        }
+
+    def report(self) -> Dict:
+        return {
+            'ring_size': self.ring_size,
+            'signals': {signal.meta.key: dict(self.latest(signal.meta.key) or {}, id=signal.meta.id,
+                                              samples=signal.count)
+                        for signal in self.signals},
+        }
@@ -0,0 +1,208 @@
+"""
+Session recording and replay.
+
+The recorder appends everything that enters the backend - IO-Link pdin
+responses (and read errors), pushed IO-Link events, received MQTT messages
+and output commands - to a compact binary log. Replay feeds a log back
+through the same handlers at real time, a multiple of it, or as fast as
+possible, with a virtual clock so alarm rates and staleness behave as they
+did when recorded.
+
+File layout (little endian): magic `IOTREC1\\n`, start time f64 (epoch),
+then records of
+
+    delta_us u32 | kind u8 | length u16 | body
+
+Strings that repeat (sensor keys, MQTT topics) are defined once by a STRING
+record and then referenced by a u16 ID; pdin values are stored as raw bytes,
+so a typical poll result costs 11 bytes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'IOTREC1\n'
+FILE_HEADER = struct.Struct('<d')
+RECORD = struct.Struct('<IBH')
+STRING_ID = struct.Struct('<H')
+MAX_BODY = 0xFFFF
+MAX_DELTA_US = 0xFFFFFFFF
+
+STRING = 0
+IOLINK = 1
+IOLINK_ERROR = 2
+EVENT = 3
+MQTT = 4
+COMMAND = 5
+KIND_NAMES = {IOLINK: 'iolink', IOLINK_ERROR: 'iolink_error', EVENT: 'event', MQTT: 'mqtt', COMMAND: 'command'}
+
+
+class SessionRecorder:
+    """Appends ingested data to a binary session log; safe to call from the paho thread"""
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.strings: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.last = time.monotonic()
+        self.stats = {'records': 0, 'bytes': 0, 'dropped': 0}
+        self.stats.update({name: 0 for name in KIND_NAMES.values()})
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'wb', buffering=256 * 1024)
+        self.file.write(MAGIC + FILE_HEADER.pack(self.started))
+        self.stats['bytes'] = len(MAGIC) + FILE_HEADER.size
+        logger.info(f"Recording session to {path}")
+
+    def _write(self, kind: int, body: bytes):
+        now = time.monotonic()
+        delta = min(MAX_DELTA_US, int((now - self.last) * 1_000_000))
+        self.last = now
+        self.file.write(RECORD.pack(delta, kind, len(body)))
+        self.file.write(body)
+        self.stats['bytes'] += RECORD.size + len(body)
+
+    def _string(self, value: str) -> bytes:
+        string_id = self.strings.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings[value] = string_id
+            self._write(STRING, STRING_ID.pack(string_id) + value.encode())
+        return STRING_ID.pack(string_id)
+
+    def _record(self, kind: int, body: bytes, string: Optional[str] = None):
+        with self.lock:
+            if self.file is None:
+                return
+            if self.stats['bytes'] >= self.max_bytes or len(body) + STRING_ID.size > MAX_BODY:
+                self.stats['dropped'] += 1
+                return
+            if string is not None:
+                body = self._string(string) + body
+            self._write(kind, body)
+            self.stats['records'] += 1
+            self.stats[KIND_NAMES[kind]] += 1
+
+    def iolink(self, key: str, hex_value: str):
+        """A pdin value read from sensor `key` (ip:port); a value that is not hex is recorded as a read error"""
+        hex_value = hex_value if len(hex_value) % 2 == 0 else '0' + hex_value
+        try:
+            body = bytes.fromhex(hex_value)
+        except ValueError:
+            self.iolink_error(key, f"invalid pdin {hex_value!r}")
+            return
+        self._record(IOLINK, body, key)
+
+    def iolink_error(self, key: str, message: str):
+        self._record(IOLINK_ERROR, message.encode(), key)
+
+    def event(self, event: Dict):
+        self._record(EVENT, json.dumps(event, separators=(',', ':')).encode())
+
+    def mqtt(self, topic: str, payload: bytes):
+        self._record(MQTT, bytes(payload), topic)
+
+    def command(self, command: Dict):
+        self._record(COMMAND, json.dumps(command, separators=(',', ':')).encode())
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self) -> Dict:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        logger.info(f"Recorded {self.stats['records']} records ({self.stats['bytes']} bytes) to {self.path}")
+        return self.report()
+
+    def report(self) -> Dict:
+        return dict(self.stats, path=self.path, started=self.started, active=self.file is not None)
+
+
+def read_session(path: str) -> Iterator[Tuple[float, int, Tuple]]:
+    """Yield (seconds since start, kind, fields) for each record of a session log"""
+    strings: Dict[int, str] = {}
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        f.read(FILE_HEADER.size)
+        elapsed_us = 0
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            delta, kind, length = RECORD.unpack(header)
+            body = f.read(length)
+            if len(body) < length:
+                return  # torn final record
+            elapsed_us += delta
+            if kind == STRING:
+                strings[STRING_ID.unpack_from(body)[0]] = body[STRING_ID.size:].decode()
+                continue
+            t = elapsed_us / 1_000_000
+            if kind in (IOLINK, IOLINK_ERROR, MQTT):
+                name = strings.get(STRING_ID.unpack_from(body)[0], '')
+                rest = body[STRING_ID.size:]
+                if kind == IOLINK:
+                    yield t, kind, (name, rest.hex().upper())
+                elif kind == IOLINK_ERROR:
+                    yield t, kind, (name, rest.decode())
+                else:
+                    yield t, kind, (name, rest)
+            elif kind in (EVENT, COMMAND):
+                yield t, kind, (json.loads(body),)
+
+
+async def replay_session(path: str, handlers: Dict[int, Callable], speed: float = 1.0,
+                         on_second: Optional[Callable[[float], None]] = None,
+                         progress: Optional[Dict] = None) -> Dict:
+    """Feed a recording to `handlers[kind](now, *fields)`; speed 0 means as fast as possible.
+
+    `now` is a virtual monotonic time advancing at the recorded pace, and
+    `on_second(now)` is called once per recorded second (e.g. stale checks).
+    """
+    stats = progress if progress is not None else {}
+    stats.update({'file': os.path.basename(path), 'speed': speed or 'max', 'records': 0,
+                  'recorded_seconds': 0.0, 'errors': 0, 'done': False})
+    stats.update({name: 0 for name in KIND_NAMES.values()})
+    origin = time.monotonic()
+    next_second = 1.0
+    started = time.perf_counter()
+    for t, kind, fields in read_session(path):
+        if speed:
+            delay = origin + t / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif stats['records'] % 256 == 0:
+            await asyncio.sleep(0)  # keep serving requests at full speed
+        now = origin + t
+        while on_second is not None and t >= next_second:
+            on_second(origin + next_second)
+            next_second += 1.0
+        handler = handlers.get(kind)
+        if handler is not None:
+            try:
+                handler(now, *fields)
+            except Exception as e:
+                stats['errors'] += 1
+                logger.error(f"Replay of {KIND_NAMES[kind]} record at {t:.3f}s failed: {e}")
+        stats['records'] += 1
+        stats[KIND_NAMES[kind]] += 1
+        stats['recorded_seconds'] = round(t, 3)
+    elapsed = time.perf_counter() - started
+    stats.update({'done': True, 'elapsed_seconds': round(elapsed, 3),
+                  'records_per_second': round(stats['records'] / elapsed) if elapsed > 0 else None})
+    logger.info(f"Replayed {stats['records']} records ({stats['recorded_seconds']}s recorded) in {elapsed:.2f}s")
+    return stats
@@ -0,0 +1,91 @@
+"""
+Poll scheduling on aligned, drift-free ticks.
+
+Every signal has its own interval (`update_rate`). The scheduler ticks at
+the greatest common divisor of those intervals, on deadlines computed as
+`origin + n * tick` from the monotonic clock, so time spent reading never
+accumulates into the period. `origin` is rounded up to a whole tick, which
+keeps signals with the same interval in phase across restarts and workers.
+
+A signal is due when its next aligned deadline has passed. If the loop falls
+behind by whole ticks, the skipped deadlines are counted as missed and the
+signal is read once, on the next tick.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from functools import reduce
+from typing import Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+MIN_TICK_MS = 10
+
+
+class TickScheduler:
+    """Yields the signals due on each tick of a shared aligned clock"""
+
+    def __init__(self, intervals_ms: Dict[Hashable, int]):
+        intervals = {key: max(MIN_TICK_MS, int(ms)) for key, ms in intervals_ms.items()}
+        tick_ms = max(MIN_TICK_MS, reduce(math.gcd, intervals.values())) if intervals else 1000
+        self.tick = tick_ms / 1000.0
+        self.every = {key: max(1, ms // tick_ms) for key, ms in intervals.items()}
+        self.next_index = {key: 0 for key in intervals}
+        self.missed: Dict[Hashable, int] = {key: 0 for key in intervals}
+        self.lateness_ms: deque = deque(maxlen=1000)
+        self.ticks = 0
+        self._last_warning = 0.0
+        self.resync()
+
+    def resync(self):
+        """Restart from the next aligned tick without counting the gap as missed (e.g. after a backoff)"""
+        self.origin = math.ceil(time.monotonic() / self.tick) * self.tick
+        self.index = 0
+        for key in self.next_index:
+            self.next_index[key] = 0
+
+    async def next_tick(self) -> List[Hashable]:
+        """Sleep until the next deadline and return the signals due on it"""
+        deadline = self.origin + self.index * self.tick
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lateness = time.monotonic() - deadline
+        self.lateness_ms.append(lateness * 1000.0)
+
+        if lateness >= self.tick:
+            # Fell behind by whole ticks: jump to the current one
+            self.index += int(lateness // self.tick)
+        due = []
+        for key, every in self.every.items():
+            if self.next_index[key] > self.index:
+                continue
+            missed = (self.index - self.next_index[key]) // every
+            if missed:
+                self.missed[key] += missed
+                self._warn(key, missed, lateness)
+            due.append(key)
+            self.next_index[key] = (self.index // every + 1) * every
+        self.index += 1
+        self.ticks += 1
+        return due
+
+    def _warn(self, key, missed: int, lateness: float):
+        now = time.monotonic()
+        if now - self._last_warning > 10:
+            self._last_warning = now
+            logger.warning(f"Poll schedule behind by {lateness * 1000:.0f} ms: {key} missed {missed} deadline(s)")
+
+    def report(self) -> Dict:
+        samples = sorted(self.lateness_ms)
+        return {
+            'tick_ms': round(self.tick * 1000.0, 3),
+            'intervals_ms': {str(key): round(every * self.tick * 1000.0) for key, every in self.every.items()},
+            'ticks': self.ticks,
+            'missed_deadlines': {str(key): count for key, count in self.missed.items()},
+            'lateness_p50_ms': round(samples[len(samples) // 2], 3) if samples else 0.0,
+            'lateness_max_ms': round(samples[-1], 3) if samples else 0.0,
+        }
@@ -0,0 +1,138 @@
+"""
+Physical sensor model behind the logical heaters.
+
+A heater's temperature comes from one or more pdin ports (its own port plus
+any redundant ones). Heaters configured on the same master port share one
+physical sensor, which is read once per tick and fanned out to all of them.
+Heaters with redundant sensors get a single fused value:
+
+- median: median of the fresh readings
+- weighted: mean weighted by each sensor's health, an exponential average of
+  successful, plausible reads
+
+With `max_spread` set, readings farther than that from the median are
+treated as faults and left out of the fused value.
+"""
+
+import logging
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .events import heater_key
+
+logger = logging.getLogger(__name__)
+
+FUSION_METHODS = ('median', 'weighted')
+HEALTH_ALPHA = 0.2
+MIN_WEIGHT = 0.05
+
+
+def sensor_key(ip: str, port) -> str:
+    return f"{ip}:{int(port)}"
+
+
+class SensorModel:
+    """Maps heaters to physical sensors, dedups shared ones and fuses redundant ones"""
+
+    def __init__(self, method: str = 'median', max_spread: Optional[float] = None, stale_periods: float = 3.0):
+        if method not in FUSION_METHODS:
+            logger.error(f"Unknown sensor fusion method {method}, using median")
+            method = 'median'
+        self.method = method
+        self.max_spread = max_spread
+        self.stale_periods = stale_periods
+        self.sensors: Dict[str, Dict] = {}
+        self.sources: Dict[Tuple, List[str]] = {}
+        self.health: Dict[str, float] = {}
+        self.latest: Dict[str, Tuple[float, str, float]] = {}
+
+    def add(self, heaters: List[Dict]) -> List[Dict]:
+        """Register heaters; returns the distinct sensors they read, each listing the heaters it feeds"""
+        used = []
+        for heater in heaters:
+            keys = []
+            for port in [heater['port']] + list(heater.get('redundant_ports') or []):
+                key = sensor_key(heater['ip'], port)
+                sensor = self.sensors.get(key)
+                if sensor is None:
+                    sensor = {
+                        'name': key,
+                        'label': heater['label'] if port == heater['port'] else f"{heater['label']} port {port}",
+                        'ip': heater['ip'],
+                        'port': str(port),
+                        'device_id': heater['device_id'],
+                        'update_rate': heater['update_rate'],
+                        'heaters': [],
+                    }
+                    self.sensors[key] = sensor
+                    self.health[key] = 1.0
+                if heater not in sensor['heaters']:
+                    sensor['heaters'].append(heater)
+                    if len(sensor['heaters']) > 1:
+                        sensor['label'] = "/".join(h['label'] for h in sensor['heaters'])
+                        logger.info(f"{sensor['label']} share sensor {key}: reading it once for all of them")
+                sensor['update_rate'] = min(sensor['update_rate'], heater['update_rate'])
+                keys.append(key)
+                if sensor not in used:
+                    used.append(sensor)
+            self.sources[heater_key(heater)] = keys
+            if len(keys) > 1:
+                logger.info(f"{heater['label']} fuses {len(keys)} sensors ({self.method}): {', '.join(keys)}")
+        return used
+
+    def match(self, device_id: Optional[str], port: int) -> List[Dict]:
+        """Sensors on a master (by IO-Link device ID) and port"""
+        return [sensor for sensor in self.sensors.values()
+                if device_id is not None and sensor['device_id'].upper() == device_id and int(sensor['port']) == port]
+
+    def _update_health(self, key: str, ok: bool):
+        self.health[key] = (1 - HEALTH_ALPHA) * self.health.get(key, 1.0) + HEALTH_ALPHA * (1.0 if ok else 0.0)
+
+    def record(self, key: str, value: float, hex_value: str, now: Optional[float] = None):
+        self.latest[key] = (value, hex_value, time.monotonic() if now is None else now)
+        self._update_health(key, True)
+
+    def record_error(self, key: str):
+        self._update_health(key, False)
+
+    def fuse(self, heater: Dict, now: Optional[float] = None) -> Optional[Tuple[float, str]]:
+        """Current (value, raw hex) for a heater, or None if none of its sensors has a fresh reading"""
+        now = time.monotonic() if now is None else now
+        keys = self.sources.get(heater_key(heater)) or []
+        fresh = []
+        for key in keys:
+            reading = self.latest.get(key)
+            max_age = self.stale_periods * self.sensors[key]['update_rate'] / 1000.0
+            if reading is not None and now - reading[2] <= max_age:
+                fresh.append((key, reading[0], reading[1]))
+        if not fresh:
+            return None
+        if len(fresh) == 1:
+            return fresh[0][1], fresh[0][2]
+
+        if self.max_spread is not None and len(fresh) > 2:
+            middle = statistics.median(value for _, value, _ in fresh)
+            plausible = [r for r in fresh if abs(r[1] - middle) <= self.max_spread]
+            for key, value, _ in fresh:
+                if abs(value - middle) > self.max_spread:
+                    self._update_health(key, False)
+                    logger.warning(f"{heater['label']}: sensor {key} reads {value:.1f}, {value - middle:+.1f} from the median; ignored")
+            fresh = plausible or fresh
+
+        if self.method == 'weighted':
+            weights = [max(MIN_WEIGHT, self.health.get(key, 1.0)) for key, _, _ in fresh]
+            value = sum(w * v for w, (_, v, _) in zip(weights, fresh)) / sum(weights)
+        else:
+            value = statistics.median(v for _, v, _ in fresh)
+        # Report the primary sensor's raw value when it took part, else the first one that did
+        hex_value = next((h for key, _, h in fresh if key == keys[0]), fresh[0][2])
+        return value, hex_value
+
+    def report(self) -> List[Dict]:
+        return [{
+            'sensor': key,
+            'heaters': [h['name'] for h in sensor['heaters']],
+            'health': round(self.health.get(key, 1.0), 3),
+            'value': self.latest[key][0] if key in self.latest else None,
+        } for key, sensor in self.sensors.items()]
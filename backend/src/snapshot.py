@@ -0,0 +1,163 @@
+"""
+Versioned plant snapshot for dashboards.
+
+Every update (a reading, a section output, a health change) is applied to
+one in-memory view of all units and heaters and bumps a global version only
+if something actually changed. Each heater remembers the version it last
+changed at, so a client holding version N can be sent just the heaters that
+changed since N, and a client that is up to date gets a 304 from its ETag.
+"""
+
+import json
+import logging
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """Incrementally maintained view of every unit/heater with change versions"""
+
+    def __init__(self, stale_after: float = 10.0):
+        self.stale_after = stale_after
+        # Versions restart with the process; the epoch lets clients tell
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.units: Dict[str, Dict[str, Dict]] = {}
+        self.changed_at: Dict[Tuple[str, str], int] = {}
+        self.last_reading: Dict[Tuple[str, str], float] = {}
+        self.health: Dict = {'mqtt': False}
+        self.health_version = 0
+        self._full_body: Optional[bytes] = None
+        self._full_version = -1
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.epoch}-{self.version}"'
+
+    def _heater(self, unit: str, heater: str) -> Dict:
+        heaters = self.units.setdefault(unit, {})
+        state = heaters.get(heater)
+        if state is None:
+            state = heaters[heater] = {'temperature': None, 'raw': None, 'updated': None,
+                                       'outputs': {}, 'online': None, 'stale': True}
+        return state
+
+    def _touch(self, unit: str, heater: str):
+        self.version += 1
+        self.changed_at[(unit, heater)] = self.version
+
+    def update_heater(self, unit: str, heater: str, **fields) -> bool:
+        """Merge fields into a heater's state; returns True if anything changed"""
+        state = self._heater(unit, heater)
+        changed = False
+        for key, value in fields.items():
+            if state.get(key) != value:
+                state[key] = value
+                changed = True
+        if changed:
+            self._touch(unit, heater)
+        return changed
+
+    def record_reading(self, unit: str, heater: str, temperature: float, raw: Optional[str] = None,
+                       timestamp: Optional[float] = None) -> bool:
+        """Apply a reading; an unchanged value does not bump the version"""
+        self.last_reading[(unit, heater)] = time.monotonic()
+        changed = self.update_heater(unit, heater, temperature=round(temperature, 2), raw=raw,
+                                     online=True, stale=False)
+        if changed:
+            # Time of the last change; freshness is carried by the stale flag
+            self._heater(unit, heater)['updated'] = round(timestamp or time.time(), 1)
+        return changed
+
+    def set_output(self, unit: str, heater: str, port: int, state: bool) -> bool:
+        outputs = self._heater(unit, heater)['outputs']
+        if outputs.get(str(port)) == state:
+            return False
+        outputs[str(port)] = state
+        self._touch(unit, heater)
+        return True
+
+    def set_outputs(self, unit: str, heater: str, states) -> bool:
+        """Apply a list of section states (section 1 first)"""
+        changed = False
+        for index, state in enumerate(states, start=1):
+            changed = self.set_output(unit, heater, index, bool(state)) or changed
+        return changed
+
+    def set_health(self, key: str, value) -> bool:
+        if self.health.get(key) == value:
+            return False
+        self.health[key] = value
+        self.version += 1
+        self.health_version = self.version
+        return True
+
+    def expire(self, now: Optional[float] = None):
+        """Flag heaters whose readings stopped arriving as stale"""
+        now = now or time.monotonic()
+        for (unit, heater), last in self.last_reading.items():
+            if now - last > self.stale_after:
+                self.update_heater(unit, heater, stale=True)
+
+    def parse_version(self, token: Optional[str]) -> Optional[int]:
+        """Version number from a `since`/ETag token, or None if it is from another epoch"""
+        if not token:
+            return None
+        token = token.strip()
+        if token.startswith('W/'):
+            token = token[2:]
+        token = token.strip('"')
+        epoch, _, version = token.rpartition('-')
+        if epoch != self.epoch or not version.isdigit() or int(version) > self.version:
+            return None
+        return int(version)
+
+    def view(self, since: Optional[int] = None) -> Dict:
+        """Full snapshot, or only what changed after `since`"""
+        if since is None:
+            units = self.units
+        else:
+            units = {}
+            for (unit, heater), version in self.changed_at.items():
+                if version > since:
+                    units.setdefault(unit, {})[heater] = self.units[unit][heater]
+        result = {'version': f"{self.epoch}-{self.version}", 'full': since is None, 'units': units}
+        if since is None or self.health_version > since:
+            result['health'] = self.health
+        return result
+
+    def render(self, since: Optional[int] = None) -> bytes:
+        """Serialized view; the full snapshot is encoded once per version"""
+        if since is not None:
+            return json.dumps(self.view(since), separators=(',', ':')).encode()
+        if self._full_version != self.version:
+            self._full_body = json.dumps(self.view(), separators=(',', ':')).encode()
+            self._full_version = self.version
+        return self._full_body
+
+
+def parse_unit_topic(topic: str) -> Optional[Tuple[str, str, str]]:
+    """Split `instrument/<unit>/<heater>/<kind>` into its parts"""
+    parts = topic.split('/')
+    if len(parts) != 4 or parts[0] != 'instrument':
+        return None
+    return parts[1], parts[2], parts[3]
+
+
+def apply_unit_message(store: SnapshotStore, topic: str, payload) -> bool:
+    """Fold a temperature or sections message from any unit into the snapshot"""
+    parsed = parse_unit_topic(topic)
+    if parsed is None or not isinstance(payload, dict):
+        return False
+    unit, heater, kind = parsed
+    if kind == 'sections' and isinstance(payload.get('sections'), list):
+        return store.set_outputs(unit, heater, payload['sections'])
+    if kind == 'temperature':
+        entry = ((payload.get('data') or {}).get('payload') or {}).get('/processdatamaster/temperature') or {}
+        value = entry.get('data') if isinstance(entry, dict) else None
+        if isinstance(value, (int, float)):
+            return store.record_reading(unit, heater, float(value))
+    return False
@@ -0,0 +1,253 @@
+"""
+On-disk store-and-forward for outbound MQTT telemetry.
+
+While the broker is unreachable (or a backlog is still draining) messages
+are appended to a log of fixed-size, memory-mapped segment files instead of
+paho's unbounded in-memory queue. After reconnecting they are replayed in
+order at a limited rate, and the read cursor only advances once the broker
+has acknowledged a batch, so a broker restart loses nothing (a message may
+be delivered twice if the connection drops mid-batch).
+
+Record layout (little endian), packed back to back in each segment; a zero
+length marks the end of the written data:
+
+    length u32 | crc32 u32 | timestamp f64 | flags u8 | topic_len u16 | topic | payload
+
+where flags holds the QoS in bits 0-1 and the retain flag in bit 2.
+
+Disk use is bounded by `max_bytes` (oldest segments are dropped first) and
+segments whose newest record is older than `max_age` are evicted.
+"""
+
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('<IIdBH')
+SEGMENT_SUFFIX = '.seg'
+
+Record = Tuple[Tuple[int, int], str, bytes, int, bool]
+RETAIN_FLAG = 0x04
+
+
+def acquire_spool_dir(base_dir: str, slots: int = 16) -> Tuple[str, int]:
+    """Lock the first free `<base>/<n>` slot so concurrent workers never share a log.
+
+    A restarted worker picks up whichever slot is free, including its
+    predecessor's backlog. Returns (directory, lock fd).
+    """
+    for slot in range(slots):
+        directory = os.path.join(base_dir, str(slot))
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, 'lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return directory, fd
+        except OSError:
+            os.close(fd)
+    raise RuntimeError(f"No free spool slot under {base_dir}")
+
+
+class SegmentLog:
+    """Append-only, mmap-backed segment log with a persisted read cursor"""
+
+    def __init__(self, directory: str, segment_bytes: int = 4 * 1024 * 1024,
+                 max_bytes: int = 256 * 1024 * 1024, max_age: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max(max_bytes, 2 * segment_bytes)
+        self.max_age = max_age
+        self.maps: Dict[int, mmap.mmap] = {}
+        self.last_timestamp: Dict[int, float] = {}
+        self.stats = {'appended': 0, 'replayed': 0, 'dropped_segments': 0, 'too_large': 0, 'skipped_bytes': 0}
+        os.makedirs(directory, exist_ok=True)
+
+        segments = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                          if name.endswith(SEGMENT_SUFFIX))
+        self.read_pos = self._load_cursor() or ((segments[0], 0) if segments else (0, 0))
+        for seq in segments:
+            if seq < self.read_pos[0]:
+                # Fully replayed before the last shutdown
+                os.remove(self._path(seq))
+        segments = [seq for seq in segments if seq >= self.read_pos[0]]
+        for seq in segments:
+            self._map(seq)
+            self.last_timestamp[seq] = os.path.getmtime(self._path(seq))
+        if segments:
+            self.write_seq = segments[-1]
+            self.write_offset = self._scan(self.write_seq)
+        else:
+            self.read_pos = (self.read_pos[0], 0)
+            self.write_seq, self.write_offset = self.read_pos[0], 0
+            self._map(self.write_seq, create=True)
+        if self.pending():
+            logger.info(f"Spool {directory} has {self.pending_bytes()} bytes of unsent telemetry")
+
+    # Files ------------------------------------------------------------------
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:010d}{SEGMENT_SUFFIX}")
+
+    def _map(self, seq: int, create: bool = False) -> mmap.mmap:
+        if seq in self.maps:
+            return self.maps[seq]
+        fd = os.open(self._path(seq), os.O_RDWR | (os.O_CREAT if create else 0), 0o644)
+        try:
+            if os.fstat(fd).st_size < self.segment_bytes:
+                os.ftruncate(fd, self.segment_bytes)
+            self.maps[seq] = mmap.mmap(fd, self.segment_bytes)
+        finally:
+            os.close(fd)
+        return self.maps[seq]
+
+    def _drop(self, seq: int):
+        segment = self.maps.pop(seq, None)
+        if segment is not None:
+            segment.close()
+        self.last_timestamp.pop(seq, None)
+        try:
+            os.remove(self._path(seq))
+        except FileNotFoundError:
+            pass
+
+    def _scan(self, seq: int) -> int:
+        """Offset just past the last intact record of a segment (stops at a torn write)"""
+        offset = 0
+        for (_, end), _, _, _, _ in self._records(seq, 0):
+            offset = end
+        return offset
+
+    def _load_cursor(self) -> Optional[Tuple[int, int]]:
+        try:
+            with open(os.path.join(self.directory, 'cursor')) as f:
+                seq, offset = f.read().split()
+                return int(seq), int(offset)
+        except (OSError, ValueError):
+            return None
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, 'cursor')
+        with open(path + '.tmp', 'w') as f:
+            f.write(f"{self.read_pos[0]} {self.read_pos[1]}")
+        os.replace(path + '.tmp', path)
+
+    # Records ----------------------------------------------------------------
+
+    def _records(self, seq: int, offset: int):
+        segment = self.maps.get(seq)
+        if segment is None:
+            return
+        while offset + HEADER.size <= self.segment_bytes:
+            length, crc, timestamp, flags, topic_len = HEADER.unpack_from(segment, offset)
+            if length < HEADER.size or offset + length > self.segment_bytes:
+                return
+            body = segment[offset + 8:offset + length]
+            if zlib.crc32(body) != crc:
+                return
+            start = offset + HEADER.size
+            topic = segment[start:start + topic_len].decode()
+            payload = segment[start + topic_len:offset + length]
+            self.last_timestamp[seq] = timestamp
+            offset += length
+            yield (seq, offset), topic, payload, flags & 0x03, bool(flags & RETAIN_FLAG)
+
+    def append(self, topic: str, payload, qos: int = 0, retain: bool = False) -> bool:
+        """Write one message at the end of the log"""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        topic_bytes = topic.encode()
+        length = HEADER.size + len(topic_bytes) + len(payload)
+        if length > self.segment_bytes:
+            self.stats['too_large'] += 1
+            logger.error(f"Dropping {length} byte message for {topic}: larger than a spool segment")
+            return False
+        if self.write_offset + length > self.segment_bytes:
+            self.write_seq += 1
+            self.write_offset = 0
+            self._map(self.write_seq, create=True)
+            self.enforce_limits()
+
+        timestamp = time.time()
+        record = bytearray(length)
+        HEADER.pack_into(record, 0, length, 0, timestamp, (qos & 0x03) | (RETAIN_FLAG if retain else 0), len(topic_bytes))
+        record[HEADER.size:] = topic_bytes + payload
+        struct.pack_into('<I', record, 4, zlib.crc32(memoryview(record)[8:]))
+        segment = self.maps[self.write_seq]
+        segment[self.write_offset:self.write_offset + length] = record
+        self.write_offset += length
+        self.last_timestamp[self.write_seq] = timestamp
+        self.stats['appended'] += 1
+        return True
+
+    def pending(self) -> bool:
+        return self.read_pos < (self.write_seq, self.write_offset)
+
+    def pending_bytes(self) -> int:
+        if self.read_pos[0] == self.write_seq:
+            return self.write_offset - self.read_pos[1]
+        return (self.write_seq - self.read_pos[0]) * self.segment_bytes - self.read_pos[1] + self.write_offset
+
+    def read_batch(self, max_records: int) -> List[Record]:
+        """Next records after the cursor, without advancing it"""
+        batch: List[Record] = []
+        seq, offset = self.read_pos
+        while len(batch) < max_records and (seq, offset) < (self.write_seq, self.write_offset):
+            for record in self._records(seq, offset):
+                batch.append(record)
+                if len(batch) >= max_records:
+                    return batch
+            # End of this segment's data: continue with the next one still on disk
+            following = [s for s in self.maps if s > seq]
+            if not following:
+                break
+            seq, offset = min(following), 0
+        return batch
+
+    def commit(self, position: Tuple[int, int], count: int = 0):
+        """Advance the cursor past acknowledged records and delete finished segments"""
+        self.read_pos = position
+        self.stats['replayed'] += count
+        for seq in [s for s in self.maps if s < position[0]]:
+            self._drop(seq)
+        self._save_cursor()
+
+    def skip_unreadable(self):
+        """Move the cursor to the write position when nothing after it can be read (torn or overwritten data)"""
+        logger.warning(f"Spool skipping {self.pending_bytes()} unreadable bytes after {self.read_pos}")
+        self.stats['skipped_bytes'] += self.pending_bytes()
+        self.commit((self.write_seq, self.write_offset))
+
+    def enforce_limits(self, now: Optional[float] = None):
+        """Drop the oldest segments over the disk quota or past the maximum age"""
+        now = now or time.time()
+        for seq in sorted(self.maps):
+            if seq == self.write_seq:
+                break
+            over_quota = len(self.maps) * self.segment_bytes > self.max_bytes
+            expired = now - self.last_timestamp.get(seq, now) > self.max_age
+            if not (over_quota or expired):
+                break
+            logger.warning(f"Spool evicting segment {seq} ({'disk quota' if over_quota else 'age limit'})")
+            self._drop(seq)
+            self.stats['dropped_segments'] += 1
+            if self.read_pos[0] <= seq:
+                self.read_pos = (min(self.maps), 0)
+                self._save_cursor()
+
+    def flush(self):
+        """msync the segment being written"""
+        self.maps[self.write_seq].flush()
+
+    def close(self):
+        for segment in self.maps.values():
+            segment.flush()
+            segment.close()
+        self.maps.clear()
+        self._save_cursor()
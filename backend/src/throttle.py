@@ -0,0 +1,217 @@
+"""
+Load shedding for the HTTP API and the IO-Link masters behind it.
+
+- RateLimiter: token buckets per key (client address, master IP), created on
+  demand and dropped once idle. `check` answers immediately (for rejecting a
+  client with 429); `acquire` waits for a token (for queueing calls to a
+  master so its load stays bounded).
+- SingleFlight: concurrent calls with the same key share one upstream call.
+- TTLCache: results that stay valid for a short time (a few hundred ms), so
+  many tabs polling the same port cost one hardware read.
+- ClientRateLimitMiddleware: ASGI middleware applying a RateLimiter per client;
+  forwarding headers only count from the configured proxy addresses.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per key"""
+
+    def __init__(self, rate: float, burst: float, idle_after: float = 300.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.idle_after = idle_after
+        self.buckets: Dict[Hashable, TokenBucket] = {}
+        self.stats = {'allowed': 0, 'limited': 0, 'waited': 0}
+        self._next_prune = time.monotonic() + idle_after
+
+    def _prune(self, now: float):
+        self._next_prune = now + self.idle_after
+        for key in [k for k, b in self.buckets.items() if now - b.updated > self.idle_after]:
+            del self.buckets[key]
+
+    def check(self, key: Hashable) -> float:
+        """0 if `key` may proceed now, else the seconds to wait; a rate of 0 means unlimited"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        if now > self._next_prune:
+            self._prune(now)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+        wait = bucket.take(now)
+        self.stats['allowed' if wait == 0 else 'limited'] += 1
+        return wait
+
+    async def acquire(self, key: Hashable):
+        """Wait until `key` has a token"""
+        waited = False
+        while True:
+            wait = self.check(key)
+            if wait == 0:
+                if waited:
+                    self.stats['waited'] += 1
+                return
+            waited = True
+            await asyncio.sleep(wait)
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share the first caller's result"""
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {'calls': 0, 'shared': 0}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        future = self.calls.get(key)
+        if future is not None:
+            self.stats['shared'] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting; retrieve the exception so it is not reported as unhandled
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.calls[key] = future
+        self.stats['calls'] += 1
+        try:
+            result = await call()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self.calls[key]
+
+
+class TTLCache:
+    """Values that expire `ttl` seconds after being stored"""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.stats['hits'] += 1
+            return entry[1]
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.ttl <= 0:
+            return
+        now = time.monotonic()
+        if len(self.entries) >= self.max_entries:
+            self.entries = {k: e for k, e in self.entries.items() if e[0] > now}
+            if len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (now + self.ttl, value)
+
+    def invalidate(self, key: Hashable):
+        self.entries.pop(key, None)
+
+
+def parse_networks(values: Iterable[str]) -> List[IPNetwork]:
+    """Addresses or CIDR ranges ("10.0.0.5", "10.42.0.0/16"); invalid entries are logged and skipped"""
+    networks = []
+    for value in values:
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(value, strict=False))
+        except ValueError:
+            logger.error(f"Ignoring invalid trusted proxy {value!r}")
+    return networks
+
+
+class ClientRateLimitMiddleware:
+    """Answer 429 to clients over their request rate on paths under `prefix`"""
+
+    def __init__(self, app, limiter: RateLimiter, prefix: str = '/api/', exempt: Iterable[str] = (),
+                 trusted_proxies: Iterable[str] = ()):
+        self.app = app
+        self.limiter = limiter
+        self.prefix = prefix
+        self.exempt = set(exempt)
+        self.trusted_proxies = parse_networks(trusted_proxies)
+
+    def trusts(self, peer: Optional[str]) -> bool:
+        """True if forwarding headers from this peer address are believed"""
+        if not peer or not self.trusted_proxies:
+            return False
+        try:
+            address = ipaddress.ip_address(peer)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    def client_id(self, scope) -> str:
+        client = scope.get('client')
+        peer = client[0] if client else None
+        if self.trusts(peer):
+            # Behind nginx every request comes from the proxy; use the address the proxy saw. Only the
+            # proxy's own entries count: X-Real-IP ($remote_addr), else the last X-Forwarded-For hop,
+            # since $proxy_add_x_forwarded_for appends to whatever the client sent. Headers from any
+            # other peer (e.g. a client reaching the NodePort directly) are ignored.
+            forwarded = None
+            for name, value in scope.get('headers') or ():
+                if name == b'x-real-ip' and value.strip():
+                    return value.decode('latin-1').strip()
+                if name == b'x-forwarded-for':
+                    forwarded = value.decode('latin-1').split(',')[-1].strip()
+            if forwarded:
+                return forwarded
+        return peer or 'unknown'
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '')
+        if scope['type'] != 'http' or not path.startswith(self.prefix) or path in self.exempt \
+                or scope.get('method') == 'OPTIONS':
+            await self.app(scope, receive, send)
+            return
+        wait = self.limiter.check(self.client_id(scope))
+        if wait:
+            response = JSONResponse({"error": "Too many requests", "retry_after": round(wait, 3)},
+                                    status_code=429, headers={'Retry-After': str(math.ceil(wait))})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,193 @@
+"""
+Compact binary telemetry frames for /ws?format=compact and telemetry/<unit>/* MQTT topics.
+
+A reading in the legacy JSON envelope costs ~300 bytes per topic; here a tick
+of several heaters fits in a couple of dozen bytes. Signals (e.g.
+`unit1/htr_a/temperature`) get small integer IDs, announced once per stream
+by a SIGNALS frame; samples then carry only IDs and fixed-point values, as
+deltas from the previous frame. Integers are LEB128 varints, signed ones
+zigzag encoded.
+
+    SIGNALS   u8 type=1 | varint count | count x (varint id | u8 decimals | varint len | utf-8 name)
+    KEYFRAME  u8 type=2 | varint seq | varint epoch ms   | varint count | count x (varint id | zigzag value)
+    DELTA     u8 type=3 | varint seq | varint ms elapsed | varint count | count x (varint id | zigzag value)
+
+A value is round(reading * 10^decimals). In a DELTA frame it is the
+difference from the signal's previous value in the stream, taken as 0 for a
+signal not seen since the last KEYFRAME. `seq` increments per samples frame;
+a decoder that joins mid-stream or misses a frame waits for the next KEYFRAME.
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SIGNALS = 1
+KEYFRAME = 2
+DELTA = 3
+SEQ_MODULO = 1 << 32
+
+
+def write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+
+class SignalTable:
+    """Process-wide signal name -> (id, decimals); IDs never change once assigned"""
+
+    def __init__(self):
+        self.signals: Dict[str, Tuple[int, int]] = {}
+        self.names: List[str] = []
+        self.lock = threading.Lock()
+
+    def get(self, name: str, decimals: int = 0) -> int:
+        signal = self.signals.get(name)
+        if signal is None:
+            with self.lock:
+                signal = self.signals.get(name)
+                if signal is None:
+                    signal = (len(self.names), decimals)
+                    self.signals[name] = signal
+                    self.names.append(name)
+        return signal[0]
+
+    def decimals(self, signal_id: int) -> int:
+        return self.signals[self.names[signal_id]][1]
+
+    def encode(self, ids: Iterable[int]) -> bytes:
+        ids = list(ids)
+        out = bytearray([SIGNALS])
+        write_varint(out, len(ids))
+        for signal_id in ids:
+            name = self.names[signal_id].encode()
+            write_varint(out, signal_id)
+            out.append(self.signals[self.names[signal_id]][1])
+            write_varint(out, len(name))
+            out += name
+        return bytes(out)
+
+
+class CompactEncoder:
+    """One stream of frames (a WebSocket session or an MQTT topic)"""
+
+    def __init__(self, table: SignalTable, keyframe_every: Optional[float] = None):
+        self.table = table
+        self.keyframe_every = keyframe_every
+        self.announced = set()
+        self.previous: Dict[int, int] = {}
+        self.seq = 0
+        self.last_ms: Optional[int] = None
+        self.last_keyframe = 0.0
+        self.stats = {'frames': 0, 'keyframes': 0, 'samples': 0, 'bytes': 0}
+
+    def new_signals(self, samples: List[Tuple[int, float]]) -> Optional[bytes]:
+        """SIGNALS frame for IDs this stream has not announced yet"""
+        fresh = [signal_id for signal_id, _ in samples if signal_id not in self.announced]
+        if not fresh:
+            return None
+        self.announced.update(fresh)
+        frame = self.table.encode(dict.fromkeys(fresh))
+        self.stats['bytes'] += len(frame)
+        return frame
+
+    def encode(self, samples: List[Tuple[int, float]], timestamp: float) -> bytes:
+        """Samples frame for (signal id, value) pairs taken at `timestamp` (epoch seconds)"""
+        now_ms = int(timestamp * 1000)
+        keyframe = self.last_ms is None or now_ms < self.last_ms or (
+            self.keyframe_every is not None and timestamp - self.last_keyframe >= self.keyframe_every)
+        if keyframe:
+            self.previous.clear()
+            self.last_keyframe = timestamp
+            self.stats['keyframes'] += 1
+
+        out = bytearray([KEYFRAME if keyframe else DELTA])
+        write_varint(out, self.seq)
+        write_varint(out, now_ms if keyframe else now_ms - self.last_ms)
+        write_varint(out, len(samples))
+        for signal_id, value in samples:
+            scaled = round(value * 10 ** self.table.decimals(signal_id))
+            write_varint(out, signal_id)
+            write_varint(out, zigzag(scaled - self.previous.get(signal_id, 0)))
+            self.previous[signal_id] = scaled
+        self.seq = (self.seq + 1) % SEQ_MODULO
+        self.last_ms = now_ms
+        self.stats['frames'] += 1
+        self.stats['samples'] += len(samples)
+        self.stats['bytes'] += len(out)
+        return bytes(out)
+
+
+class CompactDecoder:
+    """Turns a stream of frames back into (name, epoch seconds, value) samples"""
+
+    def __init__(self):
+        self.signals: Dict[int, Tuple[str, int]] = {}
+        self.previous: Dict[int, int] = {}
+        self.expected: Optional[int] = None
+        self.last_ms = 0
+        self.stats = {'frames': 0, 'skipped': 0}
+
+    def feed(self, frame: bytes) -> List[Tuple[str, float, float]]:
+        kind = frame[0]
+        if kind == SIGNALS:
+            count, offset = read_varint(frame, 1)
+            for _ in range(count):
+                signal_id, offset = read_varint(frame, offset)
+                decimals = frame[offset]
+                length, offset = read_varint(frame, offset + 1)
+                self.signals[signal_id] = (frame[offset:offset + length].decode(), decimals)
+                offset += length
+            return []
+        if kind not in (KEYFRAME, DELTA):
+            raise ValueError(f"Unknown frame type {kind}")
+
+        seq, offset = read_varint(frame, 1)
+        if kind == DELTA and seq != self.expected:
+            # Joined mid-stream, lost or duplicated a frame: wait for a keyframe
+            if self.expected is not None and seq != (self.expected - 1) % SEQ_MODULO:
+                self.expected = None
+            self.stats['skipped'] += 1
+            return []
+        time_ms, offset = read_varint(frame, offset)
+        if kind == KEYFRAME:
+            self.previous.clear()
+            self.last_ms = time_ms
+        else:
+            self.last_ms += time_ms
+        self.expected = (seq + 1) % SEQ_MODULO
+
+        count, offset = read_varint(frame, offset)
+        samples = []
+        for _ in range(count):
+            signal_id, offset = read_varint(frame, offset)
+            raw, offset = read_varint(frame, offset)
+            value = self.previous.get(signal_id, 0) + unzigzag(raw)
+            self.previous[signal_id] = value
+            name, decimals = self.signals.get(signal_id, (str(signal_id), 0))
+            samples.append((name, self.last_ms / 1000.0, value / 10 ** decimals))
+        self.stats['frames'] += 1
+        return samples
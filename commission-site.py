@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Site Commissioning Orchestrator
+Discovers, validates and configures every unit of a site in parallel
+For IoT Control Server v1.02 Installation
+
+Each unit in the site manifest becomes a chain of steps (discover ->
+validate -> render) in one dependency graph, run concurrently with a limit
+on simultaneous steps. Step results are cached by a hash of their inputs,
+so a re-run only repeats what changed (or discovery older than
+--discovery-max-age).
+
+Usage:
+    python3 commission-site.py site.yml --output site-build --jobs 16
+"""
+
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import yaml
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_discovery():
+    """Import IoLinkDiscovery from iolink-discovery-v2.py"""
+    spec = importlib.util.spec_from_file_location("iolink_discovery_v2", os.path.join(SCRIPT_DIR, "iolink-discovery-v2.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+discovery_module = load_discovery()
+IoLinkDiscovery = discovery_module.IoLinkDiscovery
+logger = discovery_module.logger
+
+HEATERS = {'htr_a': 'A', 'htr_b': 'B'}
+DEFAULT_HOSTS = {'htr_a': 29, 'htr_b': 33}
+
+
+def normalize_mac(mac: Optional[str]) -> Optional[str]:
+    """AA:BB:CC:DD:EE:FF form of a MAC or IO-Link device ID, or None"""
+    if not mac:
+        return None
+    digits = re.sub(r'[^0-9A-Fa-f]', '', str(mac)).upper()
+    if len(digits) != 12:
+        return None
+    return ':'.join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+@dataclass
+class UnitSpec:
+    """One unit from the site manifest"""
+    number: int
+    subnet: int
+    heaters: Dict[str, Dict] = field(default_factory=dict)  # htr_a/htr_b -> {'ip', 'mac'}
+
+
+def load_manifest(path: str) -> List[UnitSpec]:
+    """Read the site manifest; IPs default to the 192.168.<subnet>.29/.33 layout"""
+    with open(path) as f:
+        manifest = yaml.safe_load(f) or {}
+    units = []
+    for entry in manifest.get('units') or []:
+        number = int(entry['unit'])
+        subnet = int(entry.get('subnet', 20 + (number - 1) * 10))
+        heaters = {}
+        for name, host in DEFAULT_HOSTS.items():
+            heater = entry.get(name) or {}
+            heaters[name] = {
+                'ip': str(heater.get('ip') or f"192.168.{subnet}.{host}"),
+                'mac': normalize_mac(heater.get('mac')),
+            }
+        units.append(UnitSpec(number=number, subnet=subnet, heaters=heaters))
+    numbers = [unit.number for unit in units]
+    if len(numbers) != len(set(numbers)):
+        raise ValueError("Duplicate unit numbers in site manifest")
+    return units
+
+
+@dataclass
+class Step:
+    """A node in the commissioning graph"""
+    name: str
+    run: Callable[[Dict], Awaitable[Dict]]
+    deps: List[str] = field(default_factory=list)
+    inputs: Dict = field(default_factory=dict)
+    outputs: List[str] = field(default_factory=list)
+    cache: bool = True
+    max_age: Optional[float] = None
+    partial: bool = False  # run with whichever dependencies succeeded
+    status: str = 'pending'
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    cached: bool = False
+    elapsed: float = 0.0
+
+
+class StepCache:
+    """Step results on disk, valid while the step's inputs hash is unchanged"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, step: Step) -> str:
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_.-]', '_', step.name) + '.json')
+
+    def key(self, step: Step, dep_results: Dict) -> str:
+        material = json.dumps({'step': step.name, 'inputs': step.inputs, 'deps': dep_results},
+                              sort_keys=True, default=str)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, step: Step, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(step)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        if step.max_age is not None and time.time() - entry.get('saved_at', 0) > step.max_age:
+            return None
+        if not all(os.path.exists(path) for path in step.outputs):
+            return None
+        return entry.get('result')
+
+    def put(self, step: Step, key: str, result: Dict):
+        path = self._path(step)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'key': key, 'saved_at': time.time(), 'result': result}, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+def check_graph(steps: Dict[str, Step]):
+    """Reject unknown dependencies and cycles before anything runs"""
+    for step in steps.values():
+        for dep in step.deps:
+            if dep not in steps:
+                raise ValueError(f"Step {step.name} depends on unknown step {dep}")
+    visiting, done = set(), set()
+
+    def visit(name: str):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through {name}")
+        visiting.add(name)
+        for dep in steps[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in steps:
+        visit(name)
+
+
+async def run_graph(steps: Dict[str, Step], cache: StepCache, jobs: int = 16):
+    """Run every step as soon as its dependencies finish, at most `jobs` at a time"""
+    check_graph(steps)
+    semaphore = asyncio.Semaphore(jobs)
+    finished = {name: asyncio.Event() for name in steps}
+
+    async def run_step(step: Step):
+        try:
+            for dep in step.deps:
+                await finished[dep].wait()
+            failed = [dep for dep in step.deps if steps[dep].status != 'ok']
+            if failed and not step.partial:
+                step.status = 'skipped'
+                step.error = f"needs {', '.join(failed)}"
+                return
+            dep_results = {dep: steps[dep].result for dep in step.deps if steps[dep].status == 'ok'}
+
+            key = cache.key(step, dep_results)
+            if step.cache:
+                result = cache.get(step, key)
+                if result is not None:
+                    step.result, step.cached, step.status = result, True, 'ok'
+                    return
+            async with semaphore:
+                started = time.perf_counter()
+                step.result = await step.run(dep_results)
+                step.elapsed = time.perf_counter() - started
+            step.status = 'ok'
+            if step.cache:
+                cache.put(step, key, step.result)
+        except Exception as e:
+            step.status = 'failed'
+            step.error = str(e)
+            logger.error(f"Step {step.name} failed: {e}")
+        finally:
+            finished[step.name].set()
+
+    await asyncio.gather(*(run_step(step) for step in steps.values()))
+
+
+class SiteCommissioning:
+    """Builds the commissioning graph for a site manifest on top of IoLinkDiscovery"""
+
+    def __init__(self, units: List[UnitSpec], discovery: IoLinkDiscovery, output_dir: str,
+                 template_path: str, discovery_max_age: float = 3600.0, refresh: bool = False):
+        self.units = units
+        self.discovery = discovery
+        self.output_dir = output_dir
+        self.discovery_max_age = discovery_max_age
+        self.refresh = refresh
+        with open(template_path) as f:
+            self.template = f.read()
+
+    # Steps ------------------------------------------------------------------
+
+    async def discover(self, unit: UnitSpec) -> Dict:
+        """Probe the unit's IO-Link masters and read their MACs.
+
+        The MAC comes from the master's deviceinfo (or the kernel ARP table),
+        never from arp/nmap subprocesses, which would block the loop and run
+        the probes one at a time.
+        """
+        names = list(unit.heaters)
+        arp = dict(discovery_module.read_arp_table())
+        devices = await asyncio.gather(*(
+            self.discovery.check_iolink_device(unit.heaters[name]['ip'], unit.subnet,
+                                               arp.get(unit.heaters[name]['ip']), resolve_mac=False)
+            for name in names))
+        found = {}
+        for name, device in zip(names, devices):
+            found[name] = {'ip': unit.heaters[name]['ip'], 'mac': normalize_mac(device.mac_address) if device else None}
+            if device:
+                logger.info(f"Unit {unit.number} {name}: {device.ip_address} (MAC: {device.mac_address})")
+        return found
+
+    async def validate(self, unit: UnitSpec, found: Dict) -> Dict:
+        """Match each discovered MAC against the manifest instead of asking an operator"""
+        problems = []
+        validated = {}
+        for name, expected in unit.heaters.items():
+            actual = found[name]['mac']
+            if actual is None:
+                problems.append(f"{name}: no IO-Link master answering at {expected['ip']}")
+            elif expected['mac'] is None:
+                problems.append(f"{name}: no MAC in manifest for {expected['ip']} (discovered {actual})")
+            elif actual != expected['mac']:
+                problems.append(f"{name}: {expected['ip']} has MAC {actual}, manifest expects {expected['mac']}")
+            else:
+                validated[name] = {'ip': expected['ip'], 'mac': actual, 'device_id': actual.replace(':', '-')}
+        if problems:
+            raise ValueError("; ".join(problems))
+        return validated
+
+    async def render_manifest(self, unit: UnitSpec, devices: Dict) -> Dict:
+        """k8s/unit<N>-dev.yaml from unit-template.yaml, like add-unit.sh"""
+        text = (self.template
+                .replace('{{UNIT_NUMBER_PADDED}}', f"{unit.number:03d}")
+                .replace('{{UNIT_NUMBER}}', str(unit.number))
+                .replace('{{HTR_A_DEVICE_ID}}', devices['htr_a']['device_id'])
+                .replace('{{HTR_B_DEVICE_ID}}', devices['htr_b']['device_id'])
+                .replace('{{UNIT_SUBNET}}.29', devices['htr_a']['ip'])
+                .replace('{{UNIT_SUBNET}}.33', devices['htr_b']['ip'])
+                .replace('{{UNIT_SUBNET}}', str(unit.subnet)))
+        path = os.path.join(self.output_dir, 'k8s', f"unit{unit.number}-dev.yaml")
+        self._write(path, text)
+        return {'path': path}
+
+    async def render_env(self, unit: UnitSpec, devices: Dict) -> Dict:
+        """Backend environment file for docker compose (env_file) or a unit host"""
+        lines = [f"# Unit {unit.number} backend environment (generated by commission-site.py)",
+                 f"UNIT_NAME=unit{unit.number}",
+                 f"UNIT_NUMBER={unit.number}",
+                 f"UNIT_SUBNET={unit.subnet}"]
+        for name, device in devices.items():
+            prefix = name.upper()
+            lines += [f"{prefix}_IP={device['ip']}",
+                      f"{prefix}_DEVICE_ID={device['device_id']}",
+                      f"{prefix}_TEMP_TOPIC=instrument/unit{unit.number}/{name}/temperature"]
+        path = os.path.join(self.output_dir, 'units', f"unit{unit.number}.env")
+        self._write(path, "\n".join(lines) + "\n")
+        return {'path': path}
+
+    async def write_inventory(self, validated: Dict) -> Dict:
+        """discovered_devices.json in the format configure-unit.sh reads"""
+        data = []
+        for unit in self.units:
+            devices = validated.get(f"validate:unit{unit.number}")
+            for name, device in (devices or {}).items():
+                data.append({
+                    'ip_address': device['ip'],
+                    'mac_address': device['mac'],
+                    'subnet': unit.subnet,
+                    'unit_number': unit.number,
+                    'heater_type': HEATERS[name],
+                    'device_name': f"unit{unit.number}-{name}",
+                    'is_validated': True,
+                    'discovered_at': datetime.now().isoformat()
+                })
+        path = os.path.join(self.output_dir, 'discovered_devices.json')
+        self._write(path, json.dumps(data, indent=2))
+        return {'path': path, 'devices': len(data)}
+
+    async def write_kustomization(self, manifests: Dict) -> Dict:
+        """kustomization.yaml listing every rendered unit, for kubectl apply -k"""
+        resources = sorted(os.path.relpath(result['path'], os.path.join(self.output_dir, 'k8s'))
+                           for result in manifests.values())
+        path = os.path.join(self.output_dir, 'k8s', 'kustomization.yaml')
+        self._write(path, yaml.safe_dump({'resources': resources}, sort_keys=False))
+        return {'path': path, 'units': len(resources)}
+
+    def _write(self, path: str, text: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    # Graph ------------------------------------------------------------------
+
+    def build(self) -> Dict[str, Step]:
+        steps: Dict[str, Step] = {}
+
+        def add(step: Step):
+            steps[step.name] = step
+
+        for unit in self.units:
+            n = unit.number
+            add(Step(name=f"discover:unit{n}",
+                     run=lambda deps, unit=unit: self.discover(unit),
+                     inputs={'ips': {name: h['ip'] for name, h in unit.heaters.items()}},
+                     cache=not self.refresh, max_age=self.discovery_max_age))
+            add(Step(name=f"validate:unit{n}",
+                     run=lambda deps, unit=unit: self.validate(unit, deps[f"discover:unit{unit.number}"]),
+                     deps=[f"discover:unit{n}"],
+                     inputs={'expected': unit.heaters}))
+            add(Step(name=f"render-manifest:unit{n}",
+                     run=lambda deps, unit=unit: self.render_manifest(unit, deps[f"validate:unit{unit.number}"]),
+                     deps=[f"validate:unit{n}"],
+                     inputs={'template': hashlib.sha256(self.template.encode()).hexdigest()},
+                     outputs=[os.path.join(self.output_dir, 'k8s', f"unit{n}-dev.yaml")]))
+            add(Step(name=f"render-env:unit{n}",
+                     run=lambda deps, unit=unit: self.render_env(unit, deps[f"validate:unit{unit.number}"]),
+                     deps=[f"validate:unit{n}"],
+                     inputs={'subnet': unit.subnet},
+                     outputs=[os.path.join(self.output_dir, 'units', f"unit{n}.env")]))
+
+        add(Step(name="inventory", run=self.write_inventory, partial=True,
+                 deps=[f"validate:unit{unit.number}" for unit in self.units], cache=False))
+        add(Step(name="kustomization", run=self.write_kustomization, partial=True,
+                 deps=[f"render-manifest:unit{unit.number}" for unit in self.units], cache=False))
+        return steps
+
+
+def print_report(units: List[UnitSpec], steps: Dict[str, Step], elapsed: float):
+    print(f"\n{'='*60}")
+    print(f"🏭 SITE COMMISSIONING")
+    print(f"{'='*60}")
+    for unit in units:
+        unit_steps = [s for s in steps.values() if s.name.endswith(f":unit{unit.number}")]
+        if all(s.status == 'ok' for s in unit_steps):
+            cached = sum(s.cached for s in unit_steps)
+            print(f"✅ Unit {unit.number}: ready ({cached}/{len(unit_steps)} steps cached)")
+        else:
+            for s in unit_steps:
+                if s.status == 'failed':
+                    print(f"❌ Unit {unit.number}: {s.name.split(':')[0]} failed - {s.error}")
+                    break
+    ok = sum(all(s.status == 'ok' for s in steps.values() if s.name.endswith(f":unit{u.number}")) for u in units)
+    print(f"\n{ok}/{len(units)} units commissioned in {elapsed:.1f}s")
+    for name in ('inventory', 'kustomization'):
+        if steps[name].status == 'ok':
+            print(f"📁 {steps[name].result['path']}")
+
+
+async def commission(args) -> int:
+    units = load_manifest(args.manifest)
+    cache = StepCache(os.path.join(args.output, '.cache'))
+    started = time.perf_counter()
+    async with IoLinkDiscovery() as discovery:
+        site = SiteCommissioning(units, discovery, args.output, args.template,
+                                 discovery_max_age=args.discovery_max_age, refresh=args.refresh)
+        steps = site.build()
+        await run_graph(steps, cache, jobs=args.jobs)
+    print_report(units, steps, time.perf_counter() - started)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({name: {'status': s.status, 'cached': s.cached, 'elapsed': round(s.elapsed, 3),
+                              'error': s.error} for name, s in steps.items()}, f, indent=2)
+    return 0 if all(s.status == 'ok' for s in steps.values()) else 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Discover, validate and configure all units of a site in parallel")
+    parser.add_argument('manifest', help="site manifest (see config/site-manifest.example.yml)")
+    parser.add_argument('--output', default='site-build', help="directory for rendered configs and the step cache")
+    parser.add_argument('--template', default=os.path.join(SCRIPT_DIR, 'k8s', 'unit-template.yaml'))
+    parser.add_argument('--jobs', type=int, default=16, help="steps running at once")
+    parser.add_argument('--discovery-max-age', type=float, default=3600.0,
+                        help="seconds before cached discovery results are probed again")
+    parser.add_argument('--refresh', action='store_true', help="probe every master again, ignoring cached discovery")
+    parser.add_argument('--json', help="write per-step status to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(commission(parse_args())))
+    except KeyboardInterrupt:
+        print("\n🛑 Commissioning cancelled by user.")
+        sys.exit(1)
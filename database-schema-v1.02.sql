@@ -62,6 +62,13 @@ CREATE TABLE IF NOT EXISTS heater_config (
     default_setpoint INTEGER DEFAULT 200,
     timer_duration INTEGER DEFAULT 15,
     mqtt_topic VARCHAR(200),
+    pid_kp DOUBLE PRECISION, -- Gains from the last relay autotune (POST /api/autotune/{heater})
+    pid_ki DOUBLE PRECISION,
+    pid_kd DOUBLE PRECISION,
+    ultimate_gain DOUBLE PRECISION,
+    ultimate_period DOUBLE PRECISION, -- seconds
+    tuning_rule VARCHAR(30),
+    tuned_at TIMESTAMP WITH TIME ZONE,
     is_active BOOLEAN DEFAULT TRUE,
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW(),
@@ -69,6 +76,15 @@ CREATE TABLE IF NOT EXISTS heater_config (
     UNIQUE(unit_number, heater_type)
 );
 
+-- Autotune columns for databases created before they were added
+ALTER TABLE heater_config ADD COLUMN IF NOT EXISTS pid_kp DOUBLE PRECISION;
+ALTER TABLE heater_config ADD COLUMN IF NOT EXISTS pid_ki DOUBLE PRECISION;
+ALTER TABLE heater_config ADD COLUMN IF NOT EXISTS pid_kd DOUBLE PRECISION;
+ALTER TABLE heater_config ADD COLUMN IF NOT EXISTS ultimate_gain DOUBLE PRECISION;
+ALTER TABLE heater_config ADD COLUMN IF NOT EXISTS ultimate_period DOUBLE PRECISION;
+ALTER TABLE heater_config ADD COLUMN IF NOT EXISTS tuning_rule VARCHAR(30);
+ALTER TABLE heater_config ADD COLUMN IF NOT EXISTS tuned_at TIMESTAMP WITH TIME ZONE;
+
 -- Port Configuration Table
 -- Stores IO-Link port mappings for each heater
 CREATE TABLE IF NOT EXISTS port_config (
@@ -112,6 +128,17 @@ CREATE TABLE IF NOT EXISTS installation_log (
     created_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Temperature History Table
+-- Readings recorded by the backend, streamed out by /api/history/export
+CREATE TABLE IF NOT EXISTS temperature_history (
+    id BIGSERIAL PRIMARY KEY,
+    unit VARCHAR(50) NOT NULL,
+    heater VARCHAR(10) NOT NULL, -- 'htr_a' or 'htr_b'
+    recorded_at TIMESTAMPTZ NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    raw_value VARCHAR(64)
+);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_device_registry_mac ON device_registry(mac_address);
 CREATE INDEX IF NOT EXISTS idx_device_registry_unit ON device_registry(unit_number);
@@ -122,6 +149,8 @@ CREATE INDEX IF NOT EXISTS idx_port_config_heater ON port_config(heater_id);
 CREATE INDEX IF NOT EXISTS idx_mqtt_config_unit ON mqtt_config(unit_number);
 CREATE INDEX IF NOT EXISTS idx_installation_log_event ON installation_log(event_type);
 CREATE INDEX IF NOT EXISTS idx_installation_log_device ON installation_log(device_mac);
+CREATE INDEX IF NOT EXISTS idx_temperature_history_unit_time ON temperature_history(unit, recorded_at, id);
+CREATE INDEX IF NOT EXISTS idx_temperature_history_heater_time ON temperature_history(unit, heater, recorded_at, id);
 
 -- Create triggers for updated_at timestamps
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -0,0 +1,88 @@
+// Decoder for the backend's compact telemetry frames (backend/src/wire.py),
+// published on telemetry/<unit>/signals|samples and sent on /ws?format=compact.
+
+const SIGNALS = 1;
+const KEYFRAME = 2;
+const DELTA = 3;
+const SEQ_MODULO = 2 ** 32;
+
+export interface CompactSample {
+  signal: string;
+  timestamp: number; // epoch ms
+  value: number;
+}
+
+export class CompactTelemetryDecoder {
+  private signals: Map<number, { name: string; decimals: number }> = new Map();
+  private previous: Map<number, number> = new Map();
+  private expected: number | null = null;
+  private lastMs = 0;
+  private offset = 0;
+  private data: Uint8Array = new Uint8Array();
+
+  private varint(): number {
+    let value = 0;
+    let scale = 1;
+    for (;;) {
+      const byte = this.data[this.offset++];
+      value += (byte & 0x7f) * scale;
+      if (byte < 0x80) return value;
+      scale *= 128;
+    }
+  }
+
+  private signedVarint(): number {
+    const raw = this.varint();
+    return raw % 2 === 0 ? raw / 2 : -(raw + 1) / 2;
+  }
+
+  public feed(frame: Uint8Array): CompactSample[] {
+    this.data = frame;
+    this.offset = 1;
+    const kind = frame[0];
+
+    if (kind === SIGNALS) {
+      const count = this.varint();
+      for (let i = 0; i < count; i++) {
+        const id = this.varint();
+        const decimals = this.data[this.offset++];
+        const length = this.varint();
+        const name = new TextDecoder().decode(this.data.subarray(this.offset, this.offset + length));
+        this.offset += length;
+        this.signals.set(id, { name, decimals });
+      }
+      return [];
+    }
+    if (kind !== KEYFRAME && kind !== DELTA) return [];
+
+    const seq = this.varint();
+    if (kind === DELTA && seq !== this.expected) {
+      // Joined mid-stream, lost or duplicated a frame: wait for a keyframe
+      if (this.expected !== null && seq !== (this.expected - 1 + SEQ_MODULO) % SEQ_MODULO) {
+        this.expected = null;
+      }
+      return [];
+    }
+    const time = this.varint();
+    if (kind === KEYFRAME) {
+      this.previous.clear();
+      this.lastMs = time;
+    } else {
+      this.lastMs += time;
+    }
+    this.expected = (seq + 1) % SEQ_MODULO;
+
+    const count = this.varint();
+    const samples: CompactSample[] = [];
+    for (let i = 0; i < count; i++) {
+      const id = this.varint();
+      const value = (this.previous.get(id) || 0) + this.signedVarint();
+      this.previous.set(id, value);
+      const signal = this.signals.get(id);
+      if (signal) {
+        samples.push({ signal: signal.name, timestamp: this.lastMs, value: value / 10 ** signal.decimals });
+      }
+    }
+    return samples;
+  }
+}
@@ -1,5 +1,6 @@
 import mqtt, { MqttClient } from 'mqtt';
 import type { IClientOptions } from 'mqtt';
+import { CompactTelemetryDecoder } from './compactTelemetry';
 
 interface TemperatureData {
   device_id: string;
@@ -42,6 +43,10 @@ class MqttService {
   // Store latest data for each heater
   private heaterData: Map<string, HeaterData> = new Map();
 
+  // VITE_TELEMETRY_FORMAT=compact: binary telemetry/<unit>/* frames instead of the JSON topics
+  private readonly compact = import.meta.env.VITE_TELEMETRY_FORMAT === 'compact';
+  private compactDecoder = new CompactTelemetryDecoder();
+
   // MQTT Configuration
   private readonly config = {
     host: window.location.hostname || 'localhost',
@@ -132,7 +137,9 @@ class MqttService {
       this.lastMessageTime = Date.now();
       
       // Subscribe to all relevant topics
-      const topics = [
+      const unit = import.meta.env.VITE_UNIT_NAME || 'unit1';
+      this.compactDecoder = new CompactTelemetryDecoder();
+      const topics = this.compact ? [`telemetry/${unit}/signals`, `telemetry/${unit}/samples`] : [
         'instruments_ti',
         'instrument/htr_a',
         'instrument/htr_b',
@@ -155,6 +162,11 @@ class MqttService {
 
     this.client.on('message', (topic, message) => {
       this.lastMessageTime = Date.now();
+
+      if (topic.startsWith('telemetry/')) {
+        this.handleCompactFrame(message);
+        return;
+      }
       
       try {
         const data: TemperatureData = JSON.parse(message.toString());
@@ -228,6 +240,25 @@ class MqttService {
     });
   }
 
+  private handleCompactFrame(frame: Uint8Array): void {
+    try {
+      for (const sample of this.compactDecoder.feed(frame)) {
+        const deviceType = sample.signal.endsWith('/temperature') ? this.extractDeviceTypeFromTopic(sample.signal) : null;
+        if (deviceType && sample.value > 0) {
+          const heaterData: HeaterData = {
+            temperature: sample.value,
+            timestamp: new Date(sample.timestamp).toISOString(),
+            lastUpdate: new Date()
+          };
+          this.heaterData.set(deviceType, heaterData);
+          this.notifyTemperatureUpdate(deviceType, heaterData);
+        }
+      }
+    } catch (error) {
+      console.error('MQTT Service: Error decoding compact telemetry:', error);
+    }
+  }
+
   private extractDeviceTypeFromTopic(topic: string): string | null {
     if (topic.includes('htr_a') || topic.includes('htr-a')) {
       return 'HTR-A';
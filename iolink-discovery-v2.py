@@ -5,14 +5,18 @@ Enhanced discovery with MAC address extraction and validation
 For IoT Control Server v1.02 Installation
 """
 
+import argparse
 import asyncio
 import aiohttp
 import json
 import ipaddress
+import socket
+import struct
 import subprocess
 import sys
 import os
-from typing import List, Dict, Optional, Tuple
+import time
+from typing import Callable, List, Dict, Optional, Set, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 import logging
@@ -107,8 +111,14 @@ class IoLinkDiscovery:
         
         return devices
     
-    async def check_iolink_device(self, ip: str, subnet: int) -> Optional[IoLinkDevice]:
-        """Check if IP has an IO-Link device and extract MAC address"""
+    async def check_iolink_device(self, ip: str, subnet: int, mac_address: Optional[str] = None,
+                                  resolve_mac: bool = True) -> Optional[IoLinkDevice]:
+        """Check if IP has an IO-Link device and extract MAC address
+
+        Callers that already know the MAC pass it in. With resolve_mac=False
+        a missing MAC is taken from the deviceinfo reply only, without
+        running arp or nmap.
+        """
         try:
             # Try to get device info from IO-Link master
             url = f"http://{ip}/iolinkmaster/deviceinfo"
@@ -118,7 +128,10 @@ class IoLinkDiscovery:
                     data = await response.json()
                     
                     # Extract MAC address
-                    mac_address = await self.extract_mac_address(ip)
+                    if not mac_address and resolve_mac:
+                        mac_address = await self.extract_mac_address(ip)
+                    elif not mac_address and isinstance(data, dict):
+                        mac_address = (data.get('mac') or data.get('macAddress') or '').upper() or None
                     
                     if mac_address:
                         device = IoLinkDevice(
@@ -376,8 +389,341 @@ class IoLinkDiscovery:
         print(f"\nTotal devices: {len(devices)}")
         print(f"Validated devices: {len([d for d in devices if d.is_validated])}")
 
+# Passive discovery --------------------------------------------------------
+
+# Netlink (linux/rtnetlink.h, linux/neighbour.h)
+RTMGRP_NEIGH = 0x4
+RTM_NEWNEIGH = 28
+NDA_DST = 1
+NDA_LLADDR = 2
+NUD_VALID = 0x02 | 0x04 | 0x08 | 0x10 | 0x40 | 0x80  # reachable, stale, delay, probe, noarp, permanent
+ETH_P_LLDP = 0x88CC
+MDNS_GROUP = '224.0.0.251'
+MDNS_PORT = 5353
+
+
+def parse_neighbour_messages(data: bytes) -> List[Tuple[str, str]]:
+    """(ip, mac) of the valid IPv4 neighbours in a batch of rtnetlink messages"""
+    found = []
+    offset = 0
+    while offset + 16 <= len(data):
+        length, kind = struct.unpack_from('=LH', data, offset)
+        if length < 16:
+            break
+        if kind == RTM_NEWNEIGH and length >= 28:
+            family, _, _, _, state, _, _ = struct.unpack_from('=BBHiHBB', data, offset + 16)
+            ip = mac = None
+            attr = offset + 28
+            while attr + 4 <= offset + length:
+                attr_len, attr_type = struct.unpack_from('=HH', data, attr)
+                if attr_len < 4:
+                    break
+                value = data[attr + 4:attr + attr_len]
+                if attr_type == NDA_DST and len(value) == 4:
+                    ip = socket.inet_ntoa(value)
+                elif attr_type == NDA_LLADDR and len(value) == 6:
+                    mac = ':'.join(f"{b:02X}" for b in value)
+                attr += (attr_len + 3) & ~3
+            if family == socket.AF_INET and state & NUD_VALID and ip and mac:
+                found.append((ip, mac))
+        offset += (length + 3) & ~3
+    return found
+
+
+def read_arp_table(path: str = '/proc/net/arp') -> List[Tuple[str, str]]:
+    """(ip, mac) of the complete entries in the kernel ARP table"""
+    entries = []
+    try:
+        with open(path) as f:
+            next(f, None)
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 4 and parts[2] != '0x0' and parts[3] != '00:00:00:00:00:00':
+                    entries.append((parts[0], parts[3].upper()))
+    except OSError as e:
+        logger.debug(f"Cannot read {path}: {e}")
+    return entries
+
+
+def read_dns_name(data: bytes, offset: int) -> Tuple[str, int]:
+    labels = []
+    end = None
+    for _ in range(64):
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('utf-8', 'replace'))
+        offset += length
+    return '.'.join(labels), end if end is not None else offset
+
+
+def parse_mdns_addresses(data: bytes) -> List[Tuple[str, str]]:
+    """(name, ipv4) from the A records of an mDNS response"""
+    if len(data) < 12 or not data[2] & 0x80:
+        return []
+    questions, answers, authority, additional = struct.unpack_from('!HHHH', data, 4)
+    offset = 12
+    records = []
+    try:
+        for _ in range(questions):
+            _, offset = read_dns_name(data, offset)
+            offset += 4
+        for _ in range(answers + authority + additional):
+            name, offset = read_dns_name(data, offset)
+            kind, _, _, length = struct.unpack_from('!HHLH', data, offset)
+            offset += 10
+            if kind == 1 and length == 4:
+                records.append((name, socket.inet_ntoa(data[offset:offset + 4])))
+            offset += length
+    except (IndexError, struct.error):
+        pass
+    return records
+
+
+def parse_lldp_frame(frame: bytes) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """(management ipv4, chassis MAC, system name) announced in an LLDP frame"""
+    ip = name = None
+    mac = ':'.join(f"{b:02X}" for b in frame[6:12]) if len(frame) >= 12 else None
+    offset = 14
+    while offset + 2 <= len(frame):
+        header, = struct.unpack_from('!H', frame, offset)
+        kind, length = header >> 9, header & 0x1FF
+        value = frame[offset + 2:offset + 2 + length]
+        offset += 2 + length
+        if kind == 0:
+            break
+        if kind == 1 and len(value) == 7 and value[0] == 4:
+            mac = ':'.join(f"{b:02X}" for b in value[1:])
+        elif kind == 5:
+            name = value.decode('utf-8', 'replace')
+        elif kind == 8 and len(value) >= 6 and value[0] == 5 and value[1] == 1:
+            ip = socket.inet_ntoa(value[2:6])
+    return ip, mac, name
+
+
+class _MdnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        for name, ip in parse_mdns_addresses(data):
+            self.callback(ip, None, 'mdns', name)
+
+
+class PassiveDiscovery:
+    """Notice IO-Link masters from traffic the host already sees; probe only new addresses.
+
+    Sources: netlink neighbour events (new/changed ARP entries as they happen),
+    the ARP table (/proc/net/arp, re-read every `arp_interval` as a fallback),
+    mDNS announcements and LLDP frames (when the host may open raw sockets).
+    An address is probed over HTTP (check_iolink_device) the first time it is
+    seen or when its MAC changes; a known MAC at a new address is a move.
+    """
+
+    def __init__(self, discovery: 'IoLinkDiscovery', networks: List[ipaddress.IPv4Network],
+                 arp_interval: float = 30.0, retry_after: float = 3600.0,
+                 on_change: Optional[Callable[[str, IoLinkDevice], None]] = None):
+        self.discovery = discovery
+        self.networks = networks
+        self.arp_interval = arp_interval
+        self.retry_after = retry_after
+        self.on_change = on_change
+        self.devices: Dict[str, IoLinkDevice] = {}
+        self.last_seen: Dict[str, float] = {}
+        self.others: Dict[str, Tuple[Optional[str], float]] = {}
+        self.probing = set()
+        self.tasks: Set[asyncio.Task] = set()
+        self.stats = {'seen': 0, 'probes': 0, 'found': 0, 'moved': 0, 'replaced': 0}
+
+    def in_scope(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(address in network for network in self.networks)
+
+    def seen(self, ip: str, mac: Optional[str], source: str, name: Optional[str] = None):
+        """Record a sighting; schedules a probe when the address is new or its MAC changed"""
+        if not self.in_scope(ip):
+            return
+        self.stats['seen'] += 1
+        mac = mac.upper() if mac else None
+        device = self.devices.get(ip)
+        if device is not None and (mac is None or mac == device.mac_address):
+            self.last_seen[ip] = time.time()
+            return
+        other = self.others.get(ip)
+        if device is None and other is not None and (mac is None or mac == other[0]) \
+                and time.time() - other[1] < self.retry_after:
+            return
+        if ip not in self.probing:
+            self.probing.add(ip)
+            task = asyncio.create_task(self.probe(ip, mac, source, name))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def probe(self, ip: str, mac: Optional[str], source: str, name: Optional[str]):
+        try:
+            self.stats['probes'] += 1
+            subnet = int(ip.split('.')[2])
+            # The sources already know the MAC (mDNS does not; the ARP table usually does). Never
+            # shell out to arp/nmap here: that would block the loop serving the other sources.
+            mac = mac or dict(read_arp_table()).get(ip)
+            device = await self.discovery.check_iolink_device(ip, subnet, mac, resolve_mac=False)
+            if device is None:
+                self.others[ip] = (mac, time.time())
+                self.devices.pop(ip, None)
+                return
+            if name and not device.device_name:
+                device.device_name = name
+            previous_ip = next((old_ip for old_ip, old in self.devices.items()
+                                if old.mac_address == device.mac_address and old_ip != ip), None)
+            replaced = self.devices.get(ip)
+            self.devices[ip] = device
+            self.last_seen[ip] = time.time()
+            self.others.pop(ip, None)
+            if previous_ip is not None:
+                del self.devices[previous_ip]
+                self.stats['moved'] += 1
+                self.report('moved', device, f"from {previous_ip}")
+            elif replaced is not None:
+                self.stats['replaced'] += 1
+                self.report('replaced', device, f"was {replaced.mac_address}")
+            else:
+                self.stats['found'] += 1
+                self.report('found', device, f"via {source}")
+        except Exception as e:
+            logger.error(f"Probe of {ip} failed: {e}")
+        finally:
+            self.probing.discard(ip)
+
+    def report(self, change: str, device: IoLinkDevice, detail: str):
+        logger.info(f"IO-Link master {change}: {device.ip_address} ({device.mac_address}) {detail}")
+        if self.on_change is not None:
+            self.on_change(change, device)
+
+    async def watch_netlink(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_NEIGH))
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        logger.info("Watching netlink neighbour events")
+        try:
+            while True:
+                data = await loop.sock_recv(sock, 65536)
+                for ip, mac in parse_neighbour_messages(data):
+                    self.seen(ip, mac, 'netlink')
+        finally:
+            sock.close()
+
+    async def poll_arp_table(self):
+        while True:
+            for ip, mac in read_arp_table():
+                self.seen(ip, mac, 'arp')
+            await asyncio.sleep(self.arp_interval)
+
+    async def listen_mdns(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('', MDNS_PORT))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                        socket.inet_aton(MDNS_GROUP) + socket.inet_aton('0.0.0.0'))
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: _MdnsProtocol(self.seen), sock=sock)
+        logger.info("Listening for mDNS announcements")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            transport.close()
+
+    async def listen_lldp(self):
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_LLDP))
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        logger.info("Listening for LLDP frames")
+        try:
+            while True:
+                ip, mac, name = parse_lldp_frame(await loop.sock_recv(sock, 1518))
+                if ip:
+                    self.seen(ip, mac, 'lldp', name)
+        finally:
+            sock.close()
+
+    async def run(self, duration: Optional[float] = None):
+        """Run every available source (for `duration` seconds, or until cancelled)"""
+        sources = {'netlink': self.watch_netlink, 'arp': self.poll_arp_table,
+                   'mdns': self.listen_mdns, 'lldp': self.listen_lldp}
+
+        async def source(name, start):
+            try:
+                await start()
+            except OSError as e:
+                # Raw sockets need CAP_NET_RAW, mDNS a free port 5353: run with what is left
+                logger.warning(f"Passive source {name} unavailable: {e}")
+
+        running = [asyncio.create_task(source(name, start)) for name, start in sources.items()]
+        try:
+            await asyncio.wait(running, timeout=duration)
+        finally:
+            pending = running + list(self.tasks)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def snapshot(self) -> List[Dict]:
+        return [{
+            'ip_address': device.ip_address,
+            'mac_address': device.mac_address,
+            'subnet': device.subnet,
+            'device_name': device.device_name,
+            'last_seen': datetime.fromtimestamp(self.last_seen[ip]).isoformat(),
+        } for ip, device in sorted(self.devices.items())]
+
+
+async def passive_main(args):
+    """Track IO-Link masters passively until interrupted (or --duration)"""
+    print("👂 IO-Link Passive Discovery")
+    print("=" * 60)
+    async with IoLinkDiscovery() as discovery:
+        if args.network:
+            networks = [ipaddress.ip_network(n, strict=False) for n in args.network]
+        else:
+            networks = [ipaddress.ip_network(f"192.168.{s}.0/24") for s in discovery.get_local_subnets()]
+        print(f"Watching {', '.join(str(n) for n in networks)}")
+
+        def save(change, device):
+            print(f"  • {change}: {device.ip_address} ({device.mac_address})")
+            with open(args.output, 'w') as f:
+                json.dump(passive.snapshot(), f, indent=2)
+
+        passive = PassiveDiscovery(discovery, networks, arp_interval=args.arp_interval, on_change=save)
+        await passive.run(args.duration)
+        print(f"\n📊 {passive.stats}")
+        print(f"📁 Known masters: {args.output}")
+
+
 async def main():
     """Main discovery function"""
+    parser = argparse.ArgumentParser(description="Discover IO-Link masters")
+    parser.add_argument('--passive', action='store_true',
+                        help="watch ARP/netlink, mDNS and LLDP instead of probing subnets; only new addresses are probed")
+    parser.add_argument('--network', action='append', help="network to watch in passive mode (default: local 192.168.x.0/24)")
+    parser.add_argument('--arp-interval', type=float, default=30.0, help="seconds between ARP table reads (passive)")
+    parser.add_argument('--duration', type=float, help="stop passive mode after this many seconds")
+    parser.add_argument('--output', default='passive_devices.json', help="known masters file (passive)")
+    args = parser.parse_args()
+    if args.passive:
+        await passive_main(args)
+        return
+
     print("🔍 IO-Link Discovery System v2.0")
     print("Enhanced discovery with MAC validation")
     print("=" * 60)